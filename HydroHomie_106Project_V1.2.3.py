@@ -15,52 +15,65 @@
 import time
 from machine import Pin, PWM, I2C
 from sm_light import Light
-import hc_sr04_edushields
+from usonic_irq import HCSR04Irq
+from usonic_filter import FilterChain, OutlierReject, MedianFilter
 from lcd_api import LcdApi
 from pico_i2c_lcd import I2cLcd
 
 from eventer import Eventer
-from eventoid_gpio import EventoidGPIONonPolled
-from eventoid_timer  import EventoidTimerPolled
-from eventoid_uson2z import EventoidUsonic2ZonesPolled
+from tracer import TraceRecorder
+from statemachine import StateMachine
+from eventoid_keypad import EventoidKeypadPolled
+from eventoid_timer  import EventoidTimerNonPolled
+from eventoid_flowmeter import EventoidFlowMeter
+from eventoid_lcd import EventoidLcdFramebuffer
+from eventoid_speaker import EventoidSpeaker
+from eventoid_pump import EventoidPumpControl
+from eventoid_usonzones import EventoidUsonicZonesPolled
+from eventoid_settle import EventoidUsonicSettle
 
 
 
 '''
     STATE MACHINE SETUP
 '''
-TRACE_STATES = True
-
-#Pins linked to event triggers
-PIN_BUTTON_D = const(2)
-PIN_BUTTON_AST = const(5)
+TRACE_STATES  = False           # print every dispatch to the console (slow: msecs per event)
+TRACE_RECORDS = const(128)      # the last 128 dispatches are kept in tracer.  After Ctrl-C, save them
+                                #   with  tracer.dump(open("trace.bin", "wb"))  and decode them on the
+                                #   host with  python tools/trace_decode.py trace.bin
+EVENTER_DUAL_CORE = False       # poll the eventoids on the second core, dispatch on this one
+                                #   (except those that handlers change, see Eventer.register())
+EVENTER_ASYNC = False           # run the eventoids and dispatcher as asyncio tasks instead of eventer.loop()
+EVENTER_ROUND_ROBIN = True      # rotate which eventoid is polled first, so none can starve the rest
+EVENTER_STATS = False           # time every poll, handler and queue wait: see eventer.stats() and
+                                #   python tools/stats_report.py
 
 # States of the state machine
 STATE_SLEEP           = const(0)
 STATE_INPUT           = const(1)
 STATE_WAIT_FOR_VESSEL = const(2)
 STATE_FILLING         = const(3)
+STATE_SETTLING        = const(4)
 STATE_STR   = { STATE_SLEEP:              'STATE_SLEEP',
                 STATE_INPUT:              'STATE_INPUT',
                 STATE_WAIT_FOR_VESSEL:    'STATE_WAIT_FOR_VESSEL',
-                STATE_FILLING:            'STATE_FILLING'}
+                STATE_FILLING:            'STATE_FILLING',
+                STATE_SETTLING:           'STATE_SETTLING'}
 
 # Events returned from all of our eventoids
-EVENT_PRESS_D          = const(0)  # occurs when D key is pressed
-EVENT_PRESS_AST        = const(1)  # occurs when * key is pressed
-EVENT_SCAN_TIMER       = const(2)  # timer that checks the status of the keypad or the flowsensor
+EVENT_KEY_PRESS        = const(0)  # occurs when a key on the keypad is pressed, data is the key ('0'-'9','A'-'D','*','#')
+EVENT_LCD_TIMER        = const(1)  # occurs when the LCD has been idle long enough to go to sleep
+EVENT_FLOW_TARGET      = const(2)  # occurs when the pump has been cut, just short of the requested volume
 EVENT_ENTERING_OUTER   = const(3)  # occurs when entering OUTER from FAR
 EVENT_EXITING_OUTER    = const(4)  # occurs when exiting  OUTER into FAR
-EVENT_ENTERING_INNER   = const(5)  # occurs when entering INNER from OUTER: We don't use this, but Eric's eventer has them
-EVENT_EXITING_INNER    = const(6)  # occurs when exiting  INNER into OUTER: We don't use this, but Eric's eventer has them
+EVENT_VESSEL_STABLE    = const(7)  # occurs when the vessel has stopped moving, so it's safe to pump
 
-EVENT_STR   = { EVENT_PRESS_D:        'EVENT_PRESS_D',
-                EVENT_PRESS_AST:      'EVENT_PRESS_AST',
-                EVENT_SCAN_TIMER:     'EVENT_SCAN_TIMER',
+EVENT_STR   = { EVENT_KEY_PRESS:      'EVENT_KEY_PRESS',
+                EVENT_LCD_TIMER:      'EVENT_LCD_TIMER',
+                EVENT_FLOW_TARGET:    'EVENT_FLOW_TARGET',
                 EVENT_ENTERING_OUTER: 'EVENT_ENTERING_OUTER',
                 EVENT_EXITING_OUTER:  'EVENT_EXITING_OUTER',
-                EVENT_ENTERING_INNER: 'EVENT_ENTERING_INNER',
-                EVENT_EXITING_INNER:  'EVENT_EXITING_INNER'}
+                EVENT_VESSEL_STABLE:  'EVENT_VESSEL_STABLE'}
 
 '''
     USON RELATED CODE
@@ -69,34 +82,86 @@ PIN_USON_TRIGGER = const(11)
 PIN_USON_ECHO    = const(10)
 
 DISTANCE_OUTER_MM         = const(150)  # mm to outer/warning zone
-DISTANCE_INNER_MM         = const(-100)  # mm to inner/danger  zone, we don't want 2 zones
-                                         # so we set the inner to a negative number that will never be reached
 DISTANCE_RANGE_CUTOFFS_MM = (0, 10000) # toss all ultrasonic values outside of this range
-DISTANCE_HYSTERESIS_MM    = const(5)    # hysteresis band on each side of inner/outer distance values
+DISTANCE_HYSTERESIS_MM    = const(5)    # hysteresis band on each side of the outer distance
 DISTANCE_DEBUG_MM         = None        # movement threshold in mm to test ranging, or None to turn off
+USONIC_INTERVAL_MS        = const(60)   # time between pings, lets the eventer idle in between
+USONIC_OUTLIER_MM         = const(200)  # ignore readings that jump further than this from the last one...
+USONIC_OUTLIER_MAX        = const(2)    # ...unless they keep doing it (then the vessel really moved)
+USONIC_MEDIAN_WINDOW      = const(3)    # rolling median of readings, to ignore single spurious echoes
+SETTLE_WINDOW_MSECS       = const(300)  # the vessel is still once its readings stay within...
+SETTLE_BAND_MM            = const(10)   # ...this many mm of each other for this long
+SETTLE_MAX_MSECS          = const(3000) # if it hasn't settled after this long...
+SETTLE_MAX_BAND_MM        = const(30)   # ...settle for its readings staying within this many mm
+
+usonic = HCSR04Irq(PIN_USON_TRIGGER, PIN_USON_ECHO, USONIC_INTERVAL_MS)   # non-blocking, echo timed by IRQ
+
+
+
+'''
+    KEYPAD RELATED CODE
+'''
+
+# Key legends, in row-major order, returned as the data of EVENT_KEY_PRESS
+KEYMAP = ('1', '2', '3', 'A',
+          '4', '5', '6', 'B',
+          '7', '8', '9', 'C',
+          '*', '0', '#', 'D')
 
-usonic = hc_sr04_edushields.HCSR04(PIN_USON_TRIGGER, PIN_USON_ECHO)
+# Assign rows and columns to the Pico
+rows = [9, 8, 7, 6]
+cols = [5, 4, 3, 2]
+
+KEYPAD_ROW_MSECS = const(5)       #settling time for each row, a full scan of the keypad takes 4x this
+
+# Init list of from values inputted by keypad
+valuelist = []
+finalvalue = None
+
+
+
+'''
+    FLOWMETER RELATED CODE
+'''
+
+# GP PIN
+FLOW_PIN = const(12)
+FLOW_PULSES_PER_L = const(4920)   # our calibrated value, every rising edge of the flowsensor counted
+ML_PER_OZ_X1000   = const(29574)  # to convert oz to ml in integers
+
+flowPin = Pin(FLOW_PIN, Pin.IN)
 
 
 
 '''
     EVENTER
 '''
-eventer = Eventer(trace=TRACE_STATES, trace_info=(STATE_STR,EVENT_STR))
-
-#                                            (rising,falling) edge event(s)             the GPIO Pin
-eo_btn_d    = EventoidGPIONonPolled(eventer, (EVENT_PRESS_D, None),                     Pin(PIN_BUTTON_D, Pin.IN))
-eo_btn_ast  = EventoidGPIONonPolled(eventer, (EVENT_PRESS_AST, None),                   Pin(PIN_BUTTON_AST, Pin.IN))
-eo_timer    = EventoidTimerPolled(eventer, EVENT_SCAN_TIMER)
-eo_uson2z = EventoidUsonic2ZonesPolled(eventer, usonic, DISTANCE_RANGE_CUTOFFS_MM,
-                    ( (DISTANCE_OUTER_MM, (EVENT_ENTERING_OUTER,EVENT_EXITING_OUTER)),
-                      (DISTANCE_INNER_MM, (EVENT_ENTERING_INNER,EVENT_EXITING_INNER)) ),
+tracer  = TraceRecorder(TRACE_RECORDS)
+eventer = Eventer(trace=TRACE_STATES, trace_info=(STATE_STR,EVENT_STR), tracer=tracer,
+                  dual_core=EVENTER_DUAL_CORE,
+                  poll_policy=Eventer.POLL_ROUND_ROBIN if EVENTER_ROUND_ROBIN else Eventer.POLL_PRIORITY)
+if EVENTER_STATS:
+    eventer.stats_enable()
+
+#                                          (press,release) events     the keypad wiring
+eo_keypad   = EventoidKeypadPolled(eventer, (EVENT_KEY_PRESS, None),   rows, cols, KEYPAD_ROW_MSECS,
+                                   col_pull=Pin.PULL_DOWN, keymap=KEYMAP, debounce=True)
+eo_flow     = EventoidFlowMeter(eventer, EVENT_FLOW_TARGET, flowPin, FLOW_PULSES_PER_L)   # counts pulses by IRQ
+eo_lcd_timer     = EventoidTimerNonPolled(eventer, EVENT_LCD_TIMER)   # a machine.Timer, never polled
+eo_settle = EventoidUsonicSettle(eventer, EVENT_VESSEL_STABLE, SETTLE_WINDOW_MSECS, SETTLE_BAND_MM,
+                                 SETTLE_MAX_MSECS, SETTLE_MAX_BAND_MM, DISTANCE_OUTER_MM)
+eo_usonic = EventoidUsonicZonesPolled(eventer, usonic, DISTANCE_RANGE_CUTOFFS_MM,
+                    ( (DISTANCE_OUTER_MM, (EVENT_ENTERING_OUTER,EVENT_EXITING_OUTER)), ),
                     DISTANCE_HYSTERESIS_MM,
-                    DISTANCE_DEBUG_MM)
-_ = eventer.register(eo_btn_d)
-_ = eventer.register(eo_btn_ast)
-_ = eventer.register(eo_timer)
-_ = eventer.register(eo_uson2z)
+                    DISTANCE_DEBUG_MM,
+                    mm_filter=FilterChain(OutlierReject(USONIC_OUTLIER_MM, USONIC_OUTLIER_MAX),
+                                          MedianFilter(USONIC_MEDIAN_WINDOW),
+                                          eo_settle))        # watches the filtered readings
+_ = eventer.register(eo_keypad)
+_ = eventer.register(eo_flow)
+_ = eventer.register(eo_lcd_timer)
+_ = eventer.register(eo_usonic)
+_ = eventer.register(eo_settle)
 
 
 
@@ -104,7 +169,6 @@ _ = eventer.register(eo_uson2z)
     TIMERS
 '''
 SLEEP_TIME_MSECS = const(5000)    #5s auto shut off timer for LCD screen
-SCAN_MSECS       = const(250)     #0.25s Intervals for checking whether a key has been pressed
 
 
 
@@ -120,75 +184,32 @@ ERROR_NOTE = const(493)  #in Hz
 BUTTON_NOTE = const(440)
 ENTER_NOTE = const(880)
 
-def speaker_press():
-    speaker.freq(BUTTON_NOTE)
-    speaker.duty_u16(PWM_MAX//2)
-    
-def speaker_error():
-    speaker.freq(ERROR_NOTE)
-    speaker.duty_u16(PWM_MAX//2)
-    time.sleep(0.0625)
-    speaker.duty_u16(0)
-    time.sleep(0.0625)
-    speaker.duty_u16(PWM_MAX//2)    #Buzzer plays double beep to inform user of error
-    
-def speaker_double():
-    speaker.freq(ENTER_NOTE)     #Double Beep
-    speaker.duty_u16(PWM_MAX//2)
-    time.sleep(0.0625)
-    speaker.duty_u16(0)
-    time.sleep(0.0625)
-    speaker.duty_u16(PWM_MAX//2)
-    time.sleep(0.125)
-    speaker.duty_u16(0)
-    
+BEEP_MSECS  = const(250)      #0.25s length of a beep
+CHIRP_MSECS = const(62)       #length of each half of a double beep
+DUTY_ON     = const(PWM_MAX//2)
 
+# (freq, duty, msecs) steps of each of our beeps, played by the speaker eventoid while the
+#   state machine carries on
+SPEAKER_PATTERNS = {
+    'press':  ((BUTTON_NOTE, DUTY_ON, BEEP_MSECS),),
+    'enter':  ((ENTER_NOTE,  DUTY_ON, BEEP_MSECS),),
+    'error':  ((ERROR_NOTE,  DUTY_ON, CHIRP_MSECS), (ERROR_NOTE, 0, CHIRP_MSECS),
+               (ERROR_NOTE,  DUTY_ON, BEEP_MSECS)),
+    'double': ((ENTER_NOTE,  DUTY_ON, CHIRP_MSECS), (ENTER_NOTE, 0, CHIRP_MSECS),
+               (ENTER_NOTE,  DUTY_ON, 2*CHIRP_MSECS)),
+}
 
-'''
-    KEYPAD RELATED CODE
-'''
-
-# Define keypad constants
-KEY_UP = const(0)
-KEY_DOWN = const(1)
-
-keys = [['1', '2', '3', 'A'],
-        ['4', '5', '6', 'B'],
-        ['7', '8', '9', 'C'],
-        ['*', '0', '#', 'D']]
-
-# Assign rows and columns to the Pico
-rows = [9, 8, 7, 6]
-cols = [5, 4, 3, 2]
-
-row_pins = [Pin(GP, Pin.OUT) for GP in rows]
-col_pins = [Pin(GP, Pin.IN, Pin.PULL_DOWN) for GP in cols]
+eo_speaker = EventoidSpeaker(eventer, speaker, SPEAKER_PATTERNS)
+_ = eventer.register(eo_speaker, dispatcher=True)   # play()ed by handlers
 
-def keypad_init():
-    for row in range(0,4):
-        for col in range(0,4):
-            row_pins[row].low()
-
-def scan(row,col):
-    # Scan the keypad
+def speaker_press():
+    eo_speaker.play('press')
 
-    #Set current column on
-    row_pins[row].high()
-    key = None
-    
-    #Check if key is pressed
-    if col_pins[col].value() == KEY_DOWN:
-        key = KEY_DOWN
-    if col_pins[col].value() == KEY_UP:
-        key = KEY_UP
-    row_pins[row].low()
-    
-    #Return key pressed
-    return key
+def speaker_error():
+    eo_speaker.play('error')     #Buzzer plays double beep to inform user of error
 
-# Init list of from values inputted by keypad
-valuelist = []
-finalvalue = None
+def speaker_double():
+    eo_speaker.play('double')
 
 
 
@@ -208,9 +229,13 @@ I2C_FREQ    = const(400000)
 I2C_ADDR     = 0x27
 I2C_NUM_ROWS = 4
 I2C_NUM_COLS = 20
+LCD_FLUSH_MSECS = const(50)    #the LCD is brought up to date at most this often
 
 i2c = I2C(I2C_CHANNEL, scl=disp_scl, sda=disp_sda, freq=I2C_FREQ)
-lcd = I2cLcd(i2c, I2C_ADDR, I2C_NUM_ROWS, I2C_NUM_COLS)
+lcd_hw = I2cLcd(i2c, I2C_ADDR, I2C_NUM_ROWS, I2C_NUM_COLS)
+# everything below draws on this framebuffer, and the eventer sends only what changed to the LCD
+lcd = EventoidLcdFramebuffer(eventer, lcd_hw, I2C_NUM_ROWS, I2C_NUM_COLS, LCD_FLUSH_MSECS)
+_ = eventer.register(lcd, dispatcher=True)          # drawn on by handlers
 
 def disp_welcome():
     lcd.putstr("Welcome!")
@@ -219,8 +244,7 @@ def disp_welcome():
     
 # When 'Wake' button is pushed, prompt user to enter amount
 def disp_prompt():
-    speaker.freq(ENTER_NOTE)
-    speaker.duty_u16(PWM_MAX//2)
+    eo_speaker.play('enter')
     lcd.backlight_on()
     lcd.clear()
     lcd.putstr("Enter Amount")
@@ -237,10 +261,7 @@ def disp_confirm(finalval):
     lcd.putstr(str(finalval) + 'oz Confirmed')
     lcd.move_to(0,1)
     lcd.putstr('Place Cup')
-    speaker.freq(ENTER_NOTE)     #Single confirm Beep
-    speaker.duty_u16(PWM_MAX//2)
-    time.sleep(0.25)
-    speaker.duty_u16(0)
+    eo_speaker.play('enter')     #Single confirm Beep
     
 # When 'Enter' button is pushed and inputted value is > limit, display limit
 def disp_limit(finalval):
@@ -250,17 +271,7 @@ def disp_limit(finalval):
     lcd.putstr(str(finalval) + 'oz Limit')
     lcd.move_to(0,1)
     lcd.putstr('Place Cup')
-    speaker.freq(ENTER_NOTE)     #Double Beep
-    speaker.duty_u16(PWM_MAX//2)
-    time.sleep(0.0625)
-    speaker.duty_u16(0)
-    time.sleep(0.0625)
-    speaker.duty_u16(PWM_MAX//2)
-    time.sleep(0.125)
-    speaker.duty_u16(0)
-
-#save timestamp of power on for lcd auto sleep feature
-wake_time = time.ticks_ms()
+    eo_speaker.play('double')    #Double Beep
 
 
 
@@ -268,184 +279,175 @@ wake_time = time.ticks_ms()
     PUMP RELATED CODE
 '''
 PUMP_PIN = const(16)
-pump = Pin(PUMP_PIN, Pin.OUT)
+PUMP_PWM_FREQ = const(1000)
+pump = PWM(Pin(PUMP_PIN))
+pump.freq(PUMP_PWM_FREQ)
 
+# full speed for the bulk of the fill, tapering over the last PUMP_TAPER_ML, and cut early by
+#   the volume still in flight (learned from each fill's overshoot)
+PUMP_TAPER_ML = const(20)
+eo_pump = EventoidPumpControl(eventer, EVENT_FLOW_TARGET, pump, eo_flow, taper_ml=PUMP_TAPER_ML)
+_ = eventer.register(eo_pump, dispatcher=True)      # start()ed and stop()ped by handlers
 
 
 
-'''
-    FLOWMETER RELATED CODE
-'''
 
-# GP PIN
-FLOW_PIN = const(12)
-FLOW_TIME_INC = 250 #MSEC
+# Handlers for the state machine's transitions.  Each one performs the action(s) for one
+#   (state, event) pair; the state to move to afterwards is given by TRANSITIONS below.
+def sleep_key(state, event, event_ms, key):
+    lcd.backlight_on()                  # Any key turns the LCD back on
+    lcd.display_on()
+    if key == '*':
+        eo_lcd_timer.cancel()
+        disp_prompt()
+        return STATE_INPUT
+    eo_lcd_timer.start(SLEEP_TIME_MSECS)
+    return STATE_SLEEP
 
-flowPin = Pin(FLOW_PIN, Pin.IN)
+def sleep_lcd_timer(state, event, event_ms, event_data):
+    lcd.backlight_off()                 #Auto-Sleeps LCD screen if idle for 5 seconds
+    lcd.display_off()
 
-flowTime = 0
-totalFlow = 0
+def input_key(state, event, event_ms, last_key):
+    global finalvalue
+    if last_key == "#":                          #Clears input values
+        valuelist.clear()
+        lcd.move_to(0,1)
+        lcd.putstr("  ")
+        lcd.move_to(0,1)
+        speaker_press()
+    elif last_key == "*":                        #We do not want this as an input
+        pass
+    elif last_key == "A":                        #Press A for 8oz Preset
+        finalvalue = 8
+        disp_confirm(finalvalue)
+    elif last_key == "B":                        #Press B for 16oz Preset
+        finalvalue = 16
+        disp_confirm(finalvalue)
+    elif last_key == "C":                        #Press C for 32oz Preset
+        finalvalue = 32
+        disp_confirm(finalvalue)
+    elif last_key == "D":                        #Press D as Enter Key
+        if valuelist == []:                      #If no input, Set D to 64oz Preset
+            finalvalue = 64
+            disp_confirm(finalvalue)
+        else:                                    #Confirm Input
+            finalvalue = int(''.join(valuelist))
+            if finalvalue >= 64:                 #Max limit is 64oz
+                finalvalue = 64
+                disp_limit(finalvalue)
+            else:
+                disp_confirm(finalvalue)
+        return STATE_WAIT_FOR_VESSEL
+    elif len(valuelist) >= 2:                    #Prevents user from inputting more than 2 digits
+        #print('Digit Limit Reached')
+        speaker_error()
+    else:
+        valuelist.append(last_key)     #Add inputted digit to list of values to later convert to value
+        lcd.putstr(last_key)
+        speaker_press()
+    return STATE_INPUT
 
-def flow(pin): #Adds a count whenever the turbine in flow sensor sends a pulse
-    global count
-    count += 1
+def vessel_placed(state, event, event_ms, event_data):
+    eo_settle.arm()                    # EVENT_VESSEL_STABLE once it has stopped moving
 
-flowPin.irq(trigger=Pin.IRQ_RISING, handler=flow) #IRQ for when the turbine in the flowsensor spins
+def vessel_lifted(state, event, event_ms, event_data):
+    eo_settle.disarm()                 # taken away again before it settled
 
+def vessel_stable(state, event, event_ms, event_data):
+    eo_pump.start((finalvalue * ML_PER_OZ_X1000 + 500) // 1000)   # EVENT_FLOW_TARGET once finalvalue oz are through
+    flowPin.on()
 
+def filling_done(state, event, event_ms, event_data):
+    flowPin.off()                      #eo_pump has already stopped dispensing water
+    #print("dispensed {} ml at {} ml/s".format(eo_flow.volume_ml(), eo_flow.rate_ml_s()))
 
-# Take the current state and the next event, perform the appropriate action(s) and
-#   return the next state.  The cross-product of all states and events should
-#   be completely covered, and unanticipated combinations should result in a
-#   warning/error, as that often indicates a consequential bug in your state machine.
-def event_process(state, event, event_ms, event_data):
-    global wake_time
-    global count
-    global FLOW_TIME_INC
-    global flowTime
-    global totalFlow
+def vessel_removed(state, event, event_ms, event_data):   # Whenever vessel leaves range of ultrasonic sensor
     global finalvalue
+    #Turn off Pump
+    eo_pump.stop()
+    flowPin.off()
+    eo_flow.cancel()                 #don't care about the target any more
+    valuelist.clear()                #clear all saved variables
+    finalvalue = 0
+    lcd.clear()
+    disp_welcome()
+    speaker_double()                 #double beep
+    eo_lcd_timer.start(SLEEP_TIME_MSECS)
+
+# For the (state, event) pairs that should never happen: unanticipated, they often indicate a
+#   consequential bug in the state machine.
+def bad_event(state, event, event_ms, event_data):
     if state == STATE_SLEEP:
-            if event == EVENT_SCAN_TIMER:
-                                if time.ticks_diff(time.ticks_ms(),wake_time) >= SLEEP_TIME_MSECS:     #Auto-Sleeps LCD screen if idle for 5 seconds
-                                    lcd.backlight_off()
-                                    lcd.display_off()
-                                else:
-                                    pass
-                                for row in range(4):
-                                    for col in range(4):                 # If any key is pressed, turn on the LCD
-                                        key = scan(row, col)
-                                        if key == KEY_DOWN:
-                                            lcd.backlight_on()
-                                            lcd.display_on()
-                                            wake_time = time.ticks_ms()
-                                eo_timer.start(SCAN_MSECS)
-                                return STATE_SLEEP
-            elif event == EVENT_PRESS_AST:
-                                disp_prompt()
-                                return STATE_INPUT
-            elif event == EVENT_PRESS_D:
-                                return STATE_SLEEP
-            elif event == EVENT_EXITING_OUTER:
-                                return STATE_SLEEP
-            elif event == EVENT_ENTERING_OUTER:
-                                return STATE_SLEEP
-            else:
-                                eventer.err_unexpected_event(state, event, event_data)
-    elif state == STATE_INPUT:
-            if event == EVENT_SCAN_TIMER:
-                                speaker.duty_u16(0)
-                                for row in range(4):
-                                    for col in range(4):
-                                        key = scan(row, col)
-                                        if key == KEY_DOWN:
-                                            last_key = keys[row][col]
-                                            if last_key == "#":                          #Clears input values
-                                                valuelist.clear()
-                                                lcd.move_to(0,1)
-                                                lcd.putstr("  ")
-                                                lcd.move_to(0,1)
-                                                speaker.freq(BUTTON_NOTE)
-                                                speaker.duty_u16(PWM_MAX//2)
-                                            elif last_key == "*":                        #We do not want this as an input
-                                                pass
-                                            elif last_key == "A":                        #Press A for 8oz Preset
-                                                finalvalue = 8
-                                                disp_confirm(finalvalue)
-                                            elif last_key == "B":                        #Press B for 16oz Preset
-                                                finalvalue = 16
-                                                disp_confirm(finalvalue)
-                                            elif last_key == "C":                        #Press C for 32oz Preset
-                                                finalvalue = 32
-                                                disp_confirm(finalvalue)
-                                            elif last_key == "D":                        #Press D as Enter Key
-                                                if valuelist == []:                      #If no input, Set D to 64oz Preset 
-                                                    finalvalue = 64
-                                                    disp_confirm(finalvalue)
-                                                else:                                    #Confirm Input
-                                                    finalvalue = int(''.join(valuelist))
-                                                    if finalvalue >= 64:                 #Max limit is 64oz
-                                                        finalvalue = 64
-                                                        disp_limit(finalvalue)
-                                                    else:    
-                                                        disp_confirm(finalvalue)
-                                            elif len(valuelist) >= 2:                    #Prevents user from inputting more than 2 digits
-                                                #print('Digit Limit Reached')
-                                                speaker_error()
-                                            else:
-                                                valuelist.append(last_key)     #Add inputted digit to list of values to later convert to value
-                                                lcd.putstr(last_key)
-                                                speaker_press()
-                                eo_timer.start(SCAN_MSECS)
-                                return STATE_INPUT
-            elif event == EVENT_PRESS_D:
-                                eo_timer.cancel()
-                                return STATE_WAIT_FOR_VESSEL     #Change to STATE_WAIT_FOR_VESSEL
-            elif event == EVENT_PRESS_AST:
-                                return STATE_INPUT
-            elif event == EVENT_EXITING_OUTER:
-                                return STATE_INPUT
-            elif event == EVENT_ENTERING_OUTER:
-                                return STATE_INPUT
-            else:
-                                eventer.err_bad_event_in_state(state, event, event_data)
-    elif state == STATE_WAIT_FOR_VESSEL:
-            if event == EVENT_ENTERING_OUTER:
-                                time.sleep(1)
-                                pump.on()
-                                flowPin.on()
-                                eo_timer.start(FLOW_TIME_INC//2)
-                                return STATE_FILLING
-            elif event == EVENT_ENTERING_INNER:
-                                return STATE_WAIT_FOR_VESSEL
-            elif event == EVENT_PRESS_D:  #Key on Keypad tends to accept multiple inputs if there is no delay
-                                return STATE_WAIT_FOR_VESSEL
-            elif event == EVENT_PRESS_AST: #Just in case asterisk is somehow triggered
-                                return STATE_WAIT_FOR_VESSEL
-            else:
-                                eventer.err_bad_event_in_state(state, event, event_data)
-    elif state == STATE_FILLING:
-            if event == EVENT_SCAN_TIMER:
-                                count = 0
-                                time.sleep_ms(FLOW_TIME_INC//2)
-                                # Calculates waterflow within the past .25 seconds from time.sleep
-                                flowRate = (count / 2.46)   # our calibrated value from converting pulses to mL of water
-                                flowTime += FLOW_TIME_INC
-                                totalFlow += flowRate
-                                totalFlowoz = totalFlow/29.574     #convert ml to oz
-                                #print("flowRate is {:.3f} ml/s Time elasped is {:.2f} Total flow is {:.3f} oz".format(flowRate, flowTime, totalFlowoz))
-                                if(totalFlowoz >= finalvalue):     #Stop dispensing water
-                                    pump.off()
-                                    flowPin.off()
-                  
-                                eo_timer.start(FLOW_TIME_INC//2)
-                                return STATE_FILLING
-            if event == EVENT_EXITING_OUTER:                     # Whenever vessel leaves range of ultrasonic sensor
-                                #Turn off Pump
-                                pump.off()
-                                flowPin.off()
-                                flowTime = 0                     #clear all saved variables
-                                totalFlow = 0
-                                valuelist.clear()
-                                finalvalue = 0
-                                lcd.clear()
-                                disp_welcome()
-                                speaker_double()                 #double beep
-                                wake_time = time.ticks_ms()
-                                return STATE_SLEEP
-            else:
-                                eventer.err_bad_event_in_state(state, event, event_data)
+        eventer.err_unexpected_event(state, event, event_data)
     else:
-            eventer.err_bad_state(state)
+        eventer.err_bad_event_in_state(state, event, event_data)
+
+# The complete transition table: (current state, event, handler, next state).  Every
+#   (state, event) pair is listed, so StateMachine checks at start-up that none were missed.
+#   StateDiagram.dot is generated from it by tools/state_diagram.py.
+TRANSITIONS = (
+    (STATE_SLEEP,           EVENT_KEY_PRESS,      sleep_key,       (STATE_INPUT, STATE_SLEEP)),    # '*' wakes us up
+    (STATE_SLEEP,           EVENT_LCD_TIMER,      sleep_lcd_timer, STATE_SLEEP),
+    (STATE_SLEEP,           EVENT_EXITING_OUTER,  None,            STATE_SLEEP),
+    (STATE_SLEEP,           EVENT_ENTERING_OUTER, None,            STATE_SLEEP),
+    (STATE_SLEEP,           EVENT_FLOW_TARGET,    None,            STATE_SLEEP),    # vessel removed just as it filled
+    (STATE_SLEEP,           EVENT_VESSEL_STABLE,  bad_event,       None),
+
+    (STATE_INPUT,           EVENT_KEY_PRESS,      input_key,       (STATE_WAIT_FOR_VESSEL, STATE_INPUT)),   # 'D' confirms
+    (STATE_INPUT,           EVENT_EXITING_OUTER,  None,            STATE_INPUT),
+    (STATE_INPUT,           EVENT_ENTERING_OUTER, None,            STATE_INPUT),
+    (STATE_INPUT,           EVENT_LCD_TIMER,      None,            STATE_INPUT),    # went off just before sleep_key() cancel()ed it
+    (STATE_INPUT,           EVENT_FLOW_TARGET,    bad_event,       None),
+    (STATE_INPUT,           EVENT_VESSEL_STABLE,  bad_event,       None),
+
+    (STATE_WAIT_FOR_VESSEL, EVENT_ENTERING_OUTER, vessel_placed,   STATE_SETTLING),
+    (STATE_WAIT_FOR_VESSEL, EVENT_EXITING_OUTER,  None,            STATE_WAIT_FOR_VESSEL),   # placed and lifted again before 'D'
+    (STATE_WAIT_FOR_VESSEL, EVENT_KEY_PRESS,      None,            STATE_WAIT_FOR_VESSEL),
+    (STATE_WAIT_FOR_VESSEL, EVENT_LCD_TIMER,      None,            STATE_WAIT_FOR_VESSEL),
+    (STATE_WAIT_FOR_VESSEL, EVENT_FLOW_TARGET,    bad_event,       None),
+    (STATE_WAIT_FOR_VESSEL, EVENT_VESSEL_STABLE,  None,            STATE_WAIT_FOR_VESSEL),   # dual-core: settled just before vessel_lifted() disarmed it
+
+    (STATE_SETTLING,        EVENT_VESSEL_STABLE,  vessel_stable,   STATE_FILLING),
+    (STATE_SETTLING,        EVENT_EXITING_OUTER,  vessel_lifted,   STATE_WAIT_FOR_VESSEL),
+    (STATE_SETTLING,        EVENT_KEY_PRESS,      None,            STATE_SETTLING),
+    (STATE_SETTLING,        EVENT_ENTERING_OUTER, bad_event,       None),
+    (STATE_SETTLING,        EVENT_LCD_TIMER,      None,            STATE_SETTLING),
+    (STATE_SETTLING,        EVENT_FLOW_TARGET,    bad_event,       None),
+
+    (STATE_FILLING,         EVENT_FLOW_TARGET,    filling_done,    STATE_FILLING),
+    (STATE_FILLING,         EVENT_EXITING_OUTER,  vessel_removed,  STATE_SLEEP),
+    (STATE_FILLING,         EVENT_KEY_PRESS,      None,            STATE_FILLING),
+    (STATE_FILLING,         EVENT_ENTERING_OUTER, bad_event,       None),
+    (STATE_FILLING,         EVENT_LCD_TIMER,      None,            STATE_FILLING),
+    (STATE_FILLING,         EVENT_VESSEL_STABLE,  bad_event,       None),
+)
+
+state_machine = StateMachine(TRANSITIONS, STATE_STR, EVENT_STR)
+
+# The polled eventoids each state has any use for -- only these are polled while in it.  The
+#   ultrasonic sensor doesn't ping until there's a vessel to wait for, and the keypad isn't
+#   scanned while its keys are ignored.  The LCD, speaker and pump (which may still be coasting
+#   down after a vessel is pulled away mid-fill) always are.
+POLL_ALWAYS = (lcd, eo_speaker, eo_pump)
+POLL_STATES = { STATE_SLEEP:           (eo_keypad,) + POLL_ALWAYS,
+                STATE_INPUT:           (eo_keypad,) + POLL_ALWAYS,
+                STATE_WAIT_FOR_VESSEL: (eo_usonic,) + POLL_ALWAYS,
+                STATE_SETTLING:        (eo_usonic,) + POLL_ALWAYS,
+                STATE_FILLING:         (eo_usonic,) + POLL_ALWAYS }
+eventer.set_poll_states(POLL_STATES)
 
 
 
 #Initial Cond for program
-keypad_init()
 disp_welcome()
-eo_timer.start(SCAN_MSECS)
+eo_lcd_timer.start(SLEEP_TIME_MSECS)
 
 
 
 #Main Function
-eventer.loop(event_process, STATE_SLEEP)
+if EVENTER_ASYNC:
+    import eventer_async
+    eventer_async.loop(eventer, state_machine.process, STATE_SLEEP)
+else:
+    eventer.loop(state_machine.process, STATE_SLEEP)
@@ -0,0 +1,23 @@
+# _host.py -- common set-up for running the benchmarks on the host
+#
+# Installs the simulator's fake machine/micropython/time modules (see sim/) so the lib/
+#   modules can be imported unchanged under CPython.  Benchmark timings themselves are
+#   taken with the host's real clock.
+
+import sys, os, time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def setup():
+    """Install a fresh simulation and return it."""
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    import sim
+    return sim.install(sim.Simulation())
+
+def now_us():
+    return time.perf_counter_ns() // 1000
+
+def sleep_ms(ms):
+    """Sleep in real time (the simulator's time.sleep_ms() only moves the virtual clock)."""
+    time.sleep(ms / 1000)
@@ -0,0 +1,120 @@
+# bench_alloc.py -- heap allocated per event by the Eventer's event path
+#
+# Compares queueing and dispatching an event through the (event, ticks_ms, data) tuple API
+#   (add()/next()) with the slot API the eventoids use (post()/step()), in bytes allocated
+#   per event over ROUNDS events once everything has warmed up.  The slot path has to
+#   allocate nothing: the check fails, and the script exits nonzero, if it does.
+#
+# On the host, allocations are counted with tracemalloc: the peak traced memory is reset
+#   before each event and compared afterwards, and the worst event is reported, less the cost
+#   of the measurement itself.  Event numbers and timestamps are kept below 256 so that
+#   CPython's boxing of larger ints (which MicroPython's small ints don't need) doesn't get
+#   counted.  The loop counters are left to run past 256, and what CPython allocates to box
+#   them is measured by making the same increments on their own, and taken off the slot path.
+# On a Pico, copy lib/ and this file over and run it; gc.mem_alloc() is used instead, with the
+#   collector disabled, and a periodic timer eventoid is dispatched through the loop as well.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_alloc.py
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None          # MicroPython
+
+if tracemalloc is not None:
+    import _host
+    _host.setup()
+
+import gc, sys
+from eventer import Eventer
+
+ROUNDS = 1000
+WARMUP = 300                    # events dispatched first, to get the loop counters past 256
+EVENT  = 3
+DATA   = "k"
+
+def _process(state, event, event_ms, event_data):
+    return state
+
+def _noop(eventer):
+    pass
+
+def _counters(eventer):
+    # the loop counter increments step() makes, and no more
+    busy = eventer.loop_busy
+    eventer.loop_iterations += 1
+    eventer.loop_busy = busy + 1
+
+def _tuple_path(eventer):
+    eventer.add((EVENT, 100, DATA))
+    eventer.next()
+
+def _slot_path(eventer):
+    eventer.post(EVENT, 100, DATA)
+    eventer.step(_process, 0)
+
+def _bytes_per_round_host(body, eventer, rounds=ROUNDS):
+    # (least, most) allocated by any one round
+    least = None
+    most  = 0
+    for _ in range(rounds):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        body(eventer)
+        peak = tracemalloc.get_traced_memory()[1]
+        n = peak - current
+        least = n if least is None else min(least, n)
+        most  = max(most, n)
+    return (least, most)
+
+def _bytes_per_round_device(body, eventer, rounds=ROUNDS):
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    for _ in range(rounds):
+        body(eventer)
+    after = gc.mem_alloc()
+    gc.enable()
+    return (after - before) / rounds
+
+def _timer_round(eventer):
+    eventer.step(_process, 0)
+
+def run():
+    """Return {path: bytes allocated per event} for the tuple and slot event paths."""
+    eventer = Eventer()
+    for body in (_noop, _counters, _tuple_path):        # warm up
+        body(eventer)
+    for _ in range(WARMUP):
+        _slot_path(eventer)
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+        # the worst event of ROUNDS, less what the measurement (and the counters) always cost
+        base   = _bytes_per_round_host(_noop, eventer)[0]
+        boxing = _bytes_per_round_host(_counters, eventer)[0]
+        results = { "tuple": _bytes_per_round_host(_tuple_path, eventer)[1] - base,
+                    "slot":  _bytes_per_round_host(_slot_path, eventer)[1] - boxing }
+        tracemalloc.stop()
+        return results
+
+    base = _bytes_per_round_device(_noop, eventer)
+    results = { "tuple": _bytes_per_round_device(_tuple_path, eventer) - base,
+                "slot":  _bytes_per_round_device(_slot_path, eventer) - base }
+
+    from eventoid_timer import EventoidTimerPolled
+    tmr = EventoidTimerPolled(eventer, EVENT, periodic=True, period_ms=0)
+    eventer.register(tmr)
+    tmr.start()
+    _timer_round(eventer)
+    results["timer"] = _bytes_per_round_device(_timer_round, eventer) - base
+    return results
+
+if __name__ == "__main__":
+    results = run()
+    for (path, n) in results.items():
+        print("%-6s %6.1f bytes/event" % (path, n))
+    ok = all(results[path] == 0 for path in ("slot", "timer") if path in results)
+    print("%d events allocation-free: %s" % (ROUNDS, "ok" if ok else "FAIL"))
+    sys.exit(0 if ok else 1)
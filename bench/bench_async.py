@@ -0,0 +1,68 @@
+# bench_async.py -- Eventer.loop() vs. the asyncio runtime (eventer_async) on a whole dispense
+#
+# Runs the same simulated 16oz dispense with the firmware's eventer.loop() and with
+#   eventer_async.loop() in its place, with the Eventer's stats enabled, and reports how often
+#   the CPU woke from idle, how many eventoid polls were made, and the dispatch latency (from
+#   an event being queued to its handler being called).  Wakeups are the returns from
+#   machine.idle() (which wakes on every 1ms tick) for loop(), and from asyncio's wait for its
+#   next timer or an IRQ for eventer_async.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_async.py [firmware.py]
+
+import _host
+_host.setup()
+
+import sys
+import eventer as eventer_module
+import eventer_async
+from sim import hydrohomie
+
+RUN_MS = 31000
+
+def run_one(use_async, firmware=hydrohomie.FIRMWARE):
+    loop  = eventer_module.Eventer.loop
+    polls = [0]
+    def loop_with_stats(self, process_func, state):
+        self.stats_enable()
+        for eo in self.eventoids.values():
+            poll = eo.poll
+            def counted(poll=poll):
+                polls[0] += 1
+                return poll()
+            eo.poll = counted
+        if use_async:
+            return eventer_async.loop(self, process_func, state)
+        return loop(self, process_func, state)
+    eventer_module.Eventer.loop = loop_with_stats
+    try:
+        t0 = _host.now_us()
+        hh = hydrohomie.fill("16D", vessel_at_ms=6000, remove_at_ms=30000, until_ms=RUN_MS, firmware=firmware)
+        cpu_us = _host.now_us() - t0
+    finally:
+        eventer_module.Eventer.loop = loop
+
+    stats = hh.eventer.stats()
+    count = sum(h["count"] for h in stats["residency"].values())
+    total = sum(h["total_us"] for h in stats["residency"].values())
+    worst = max(h["max_us"] for h in stats["residency"].values())
+    return { "dispensed_oz":   round(hh.dispensed_oz(), 2),
+             "final_state":    hh.state_name(),
+             "wakeups":        hh.sim.idle_calls,
+             "wakeups_per_s":  round(hh.sim.idle_calls * 1000 / RUN_MS),
+             "polls":          polls[0],
+             "events":         count,
+             "latency_mean_us": round(total / count, 1),
+             "latency_max_us": worst,
+             "host_cpu_ms":    cpu_us // 1000 }
+
+def run(firmware=hydrohomie.FIRMWARE):
+    """Return {"loop": results, "async": results}."""
+    return { "loop": run_one(False, firmware), "async": run_one(True, firmware) }
+
+if __name__ == "__main__":
+    firmware = sys.argv[1] if len(sys.argv) > 1 else hydrohomie.FIRMWARE
+    results = run(firmware)
+    print("%-16s %12s %12s" % ("", "loop()", "asyncio"))
+    for key in results["loop"]:
+        print("%-16s %12s %12s" % (key, results["loop"][key], results["async"][key]))
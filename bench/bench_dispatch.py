@@ -0,0 +1,121 @@
+# bench_dispatch.py -- dispatch cost of a table-driven StateMachine vs. an if/elif chain
+#
+# Both dispatchers implement the firmware's TRANSITIONS (5 states x 6 events), taken from the
+#   firmware itself, with its handlers replaced by no-ops, so only the cost of finding the
+#   right handler is measured.  chain() is the same table hand-written as an if/elif chain,
+#   in the same order; run() checks that the two agree on every pair before timing them.  The
+#   events are replayed round-robin over every pair that isn't an error, and each timing is
+#   the best of a few runs, to keep the host's noise out of it.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_dispatch.py
+
+import _host
+_host.setup()
+
+import sys
+from sim import hydrohomie
+from statemachine import StateMachine
+
+def h(state, event, ms, data): return state
+
+def bad(state, event, ms, data): raise Exception("bad event")
+
+# filled in from the firmware by _load()
+S_SLEEP = S_INPUT = S_WAIT = S_SETTLING = S_FILLING = None
+E_KEY = E_TIMER = E_TARGET = E_ENT_OUT = E_EXIT_OUT = E_STABLE = None
+
+def chain(state, event, ms, data):
+    if state == S_SLEEP:
+        if   event == E_KEY:      return h(state, event, ms, data)
+        elif event == E_TIMER:    h(state, event, ms, data); return S_SLEEP
+        elif event == E_EXIT_OUT: return S_SLEEP
+        elif event == E_ENT_OUT:  return S_SLEEP
+        elif event == E_TARGET:   return S_SLEEP
+        else:                     bad(state, event, ms, data)
+    elif state == S_INPUT:
+        if   event == E_KEY:      return h(state, event, ms, data)
+        elif event == E_EXIT_OUT: return S_INPUT
+        elif event == E_ENT_OUT:  return S_INPUT
+        elif event == E_TIMER:    return S_INPUT
+        else:                     bad(state, event, ms, data)
+    elif state == S_WAIT:
+        if   event == E_ENT_OUT:  h(state, event, ms, data); return S_SETTLING
+        elif event == E_EXIT_OUT: return S_WAIT
+        elif event == E_KEY:      return S_WAIT
+        elif event == E_TIMER:    return S_WAIT
+        elif event == E_STABLE:   return S_WAIT
+        else:                     bad(state, event, ms, data)
+    elif state == S_SETTLING:
+        if   event == E_STABLE:   h(state, event, ms, data); return S_FILLING
+        elif event == E_EXIT_OUT: h(state, event, ms, data); return S_WAIT
+        elif event == E_KEY:      return S_SETTLING
+        elif event == E_TIMER:    return S_SETTLING
+        else:                     bad(state, event, ms, data)
+    elif state == S_FILLING:
+        if   event == E_TARGET:   h(state, event, ms, data); return S_FILLING
+        elif event == E_EXIT_OUT: h(state, event, ms, data); return S_SLEEP
+        elif event == E_KEY:      return S_FILLING
+        elif event == E_TIMER:    return S_FILLING
+        else:                     bad(state, event, ms, data)
+    else:
+        bad(state, event, ms, data)
+
+def _load():
+    """Boot the firmware in the simulator, and return its TRANSITIONS with no-op handlers."""
+    global S_SLEEP, S_INPUT, S_WAIT, S_SETTLING, S_FILLING
+    global E_KEY, E_TIMER, E_TARGET, E_ENT_OUT, E_EXIT_OUT, E_STABLE
+    hh = hydrohomie.HydroHomieSim()
+    hh.run(100)                         # booted, and into the loop
+    g = hh.globals
+    (S_SLEEP, S_INPUT, S_WAIT, S_SETTLING, S_FILLING) = (g["STATE_SLEEP"], g["STATE_INPUT"],
+        g["STATE_WAIT_FOR_VESSEL"], g["STATE_SETTLING"], g["STATE_FILLING"])
+    (E_KEY, E_TIMER, E_TARGET, E_ENT_OUT, E_EXIT_OUT, E_STABLE) = (g["EVENT_KEY_PRESS"],
+        g["EVENT_LCD_TIMER"], g["EVENT_FLOW_TARGET"], g["EVENT_ENTERING_OUTER"],
+        g["EVENT_EXITING_OUTER"], g["EVENT_VESSEL_STABLE"])
+    transitions = [(s, e, None if f is None else bad if f is g["bad_event"] else h, n)
+                   for (s, e, f, n) in g["TRANSITIONS"]]
+    return (transitions, g["STATE_STR"], g["EVENT_STR"])
+
+def _outcome(process, state, event):
+    try:
+        return process(state, event, 0, None)
+    except Exception:
+        return "error"
+
+ROUNDS = 20000
+REPEAT = 5
+
+def _bench(process, pairs, rounds=ROUNDS, repeat=REPEAT):
+    n = rounds // len(pairs)
+    best = None
+    for _ in range(repeat):
+        t0 = _host.now_us()
+        for _ in range(n):
+            for (state, event) in pairs:
+                process(state, event, 0, None)
+        ns = (_host.now_us() - t0) * 1000 / (n * len(pairs))
+        best = ns if (best is None) or (ns < best) else best
+    return best
+
+def run():
+    """Return {"chain_ns": ..., "table_ns": ...} per dispatched event, plus the worst pair for each."""
+    (transitions, state_str, event_str) = _load()
+    sm = StateMachine(transitions, state_str, event_str)
+    mismatched = [(s, e) for s in state_str for e in event_str
+                  if _outcome(chain, s, e) != _outcome(sm.process, s, e)]
+    pairs = [(s, e) for (s, e, f, _) in transitions if f is not bad]
+    results = { "mismatched": mismatched,
+                "chain_ns": _bench(chain, pairs), "table_ns": _bench(sm.process, pairs) }
+    # the deepest branch of the chain that isn't an error: the last event of the last state
+    results["chain_worst_ns"] = _bench(chain, [(S_FILLING, E_TIMER)])
+    results["table_worst_ns"] = _bench(sm.process, [(S_FILLING, E_TIMER)])
+    return results
+
+if __name__ == "__main__":
+    results = run()
+    for (k, v) in results.items():
+        if k != "mismatched":
+            print("%-16s %8.1f" % (k, v))
+    print("%-16s %s" % ("mismatched", results["mismatched"] or "none"))
+    sys.exit(1 if results["mismatched"] else 0)
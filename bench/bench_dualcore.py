@@ -0,0 +1,153 @@
+# bench_dualcore.py -- stress test of the Eventer's dual-core mode, with threads for cores
+#
+# A polled eventoid on the poller thread posts bursts of numbered events as fast as it can,
+#   through the SPSC ring, while an "ISR" on the dispatcher's thread (a callback on the
+#   simulator's clock, which runs while the dispatcher idles) posts its own numbered events
+#   straight into the queue.  The dispatcher checks that each stream arrives complete and in
+#   order.  Small rings keep the poller waiting on the dispatcher, and a short thread switch
+#   interval makes the threads interleave as finely as possible.  The state changes every
+#   STATE_EVENTS polled events, which masks and unmasks a second eventoid on the poller, and the
+#   handler changes a third that's registered with dispatcher=True, like the pump: each counts
+#   the polls, rearm()s and changes it gets on the wrong thread.  The script exits nonzero if,
+#   with any ring size, an event is lost or out of order, or anything ran on the wrong thread.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_dualcore.py
+
+import _host
+sim = _host.setup()
+
+import sys, random, _thread
+import eventoid
+from eventer import Eventer
+
+EVENT_POLLED = 1
+EVENT_ISR    = 2
+EVENTS       = 20000
+RING_SIZES   = (1, 4, 16)
+ISR_US       = 200
+TIMEOUT_US   = 60 * 1000000
+STATE_EVENTS = 100
+
+class _OnThread(eventoid.Eventoid):
+    """Counts what's done to it on any thread but the one whose ident thread() returns."""
+
+    def __init__(self, eventer, eo_type, thread):
+        super().__init__(eventer, eo_type, True)
+        self.thread = thread
+        self.polls  = 0
+        self.rearms = 0
+        self.wrong  = 0
+
+    def _check(self):
+        if _thread.get_ident() != self.thread():
+            self.wrong += 1
+
+    def poll(self):
+        self._check()
+        self.polls += 1
+        return False
+
+    def rearm(self):
+        self._check()
+        self.rearms += 1
+
+    def change(self):
+        self._check()
+
+    def next_deadline(self):
+        return None
+
+class _Burst(eventoid.Eventoid):
+    """Posts 1..8 numbered events per poll until it has posted them all."""
+
+    def __init__(self, eventer, total):
+        super().__init__(eventer, "bench.burst", True)
+        self.total = total
+        self.next  = 0
+        self.rnd   = random.Random(1)
+
+    def poll(self):
+        if self.next == self.total:
+            return False
+        for _ in range(min(self.rnd.randint(1, 8), self.total - self.next)):
+            self.eventer.post(EVENT_POLLED, 0, self.next)
+            self.next += 1
+        return True
+
+    def next_deadline(self):
+        return None if self.next == self.total else 0
+
+def run_one(ring_size, total=EVENTS):
+    s = _host.setup()
+    s.clock.ticks_cost_us = 0           # only the dispatcher's thread moves the clock
+    eventer = Eventer(queue_size=8, dual_core=True, ring_size=ring_size, sleep_func=_host.sleep_ms)
+    main    = _thread.get_ident()
+    masked  = _OnThread(eventer, "bench.masked", lambda: eventer._poll_ident)
+    burst   = _Burst(eventer, total)
+    handled = _OnThread(eventer, "bench.handled", lambda: main)
+    eventer.register(masked)            # before the burst, which stops each pass
+    eventer.register(handled, dispatcher=True)
+    eventer.register(burst)
+    eventer.set_poll_states({ 0: (masked, handled, burst), 1: (handled, burst) })
+
+    isr = { "posted": 0, "on": True }
+    def fake_isr(_):
+        if not isr["on"]:
+            return
+        eventer.post(EVENT_ISR, 0, isr["posted"])
+        isr["posted"] += 1
+        s.clock.schedule(ISR_US, fake_isr)
+    s.clock.schedule(ISR_US, fake_isr)
+
+    got  = { EVENT_POLLED: 0, EVENT_ISR: 0 }
+    bad  = { "reordered": 0 }
+    def process(state, event, event_ms, event_data):
+        if event_data != got[event]:
+            bad["reordered"] += 1
+        got[event] += 1
+        handled.change()
+        return (got[EVENT_POLLED] // STATE_EVENTS) & 1
+
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    t0 = _host.now_us()
+    eventer.start_poller()
+    try:
+        state = 0
+        while (got[EVENT_POLLED] < total) and (_host.now_us() - t0 < TIMEOUT_US):
+            state = eventer.step(process, state)
+    finally:
+        isr["on"] = False
+        eventer.stop_poller()
+        sys.setswitchinterval(old_interval)
+    us = _host.now_us() - t0
+    while len(eventer._queue):          # whatever the ISR queued after the last polled event
+        eventer.step(process, 0)
+    stats = eventer.queue_stats()
+    return { "ring_size":  ring_size,
+             "polled":     got[EVENT_POLLED],
+             "lost":       total - got[EVENT_POLLED],
+             "isr":        got[EVENT_ISR],
+             "isr_lost":   isr["posted"] - got[EVENT_ISR] - stats["pending"] - stats["overflows"],
+             "isr_dropped": stats["overflows"],
+             "reordered":  bad["reordered"],
+             "ring_waits": stats["ring_waits"],
+             "rearms":     masked.rearms,
+             "wrong_core": masked.wrong + handled.wrong,
+             "events_per_s": round((got[EVENT_POLLED] + got[EVENT_ISR]) * 1000000 / us) }
+
+def run():
+    """Return a list of results, one per ring size."""
+    return [run_one(size) for size in RING_SIZES]
+
+if __name__ == "__main__":
+    ok = True
+    print("ring   polled   lost   isr events  isr lost  isr dropped  reordered  ring waits  rearms  wrong core   events/s")
+    for r in run():
+        r_ok = (r["lost"] == 0) and (r["isr_lost"] == 0) and (r["reordered"] == 0) and (r["wrong_core"] == 0)
+        ok = ok and r_ok
+        print("%4d  %7d  %5d  %10d  %8d  %11d  %9d  %10d  %6d  %10d  %9d  %s" % (r["ring_size"], r["polled"],
+              r["lost"], r["isr"], r["isr_lost"], r["isr_dropped"], r["reordered"], r["ring_waits"], r["rearms"],
+              r["wrong_core"], r["events_per_s"], "ok" if r_ok else "FAIL"))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,46 @@
+# bench_flowmeter.py -- pump cutoff latency and overshoot of the HydroHomie firmware
+#
+# Runs one simulated fill for each volume and reports, from the simulated pump and flow
+#   sensor, how much more or less than the requested volume came out, how long after the pump
+#   controller decided to cut the pump it actually went off, and how much water came through
+#   the flow meter after the cut.  (The controller tapers the flow before it cuts, so how long
+#   it takes to pump the last few ml isn't a latency; see bench_pump.py for the time per fill.)
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_flowmeter.py [firmware.py]
+# (e.g. against an older firmware:  git show HEAD~1:HydroHomie_106Project_V1.2.3.py > /tmp/old.py)
+
+import _host
+_host.setup()
+
+import sys
+from sim import hydrohomie
+
+VOLUMES_OZ = (8, 16, 32, 64)
+PUMP_ML_S  = 30.0
+
+def run_one(oz, firmware=hydrohomie.FIRMWARE):
+    keys = "D" if oz == 64 else str(oz) + "D"        # D alone is the 64oz preset
+    hh = hydrohomie.fill(keys, vessel_at_ms=6000, remove_at_ms=6000 + 2000 + int(oz * 1200),
+                         pump_ml_per_s=PUMP_ML_S, firmware=firmware)
+    off_ms = [ms for (ms, level) in hh.pump_log if not level][-1]
+    pump   = hh.globals.get("eo_pump")             # None before the closed-loop pump control
+    target_ml = oz * hydrohomie.ML_PER_OZ
+    return { "requested_oz":  oz,
+             "dispensed_oz":  round(hh.dispensed_oz(), 3),
+             "overshoot_ml":  round(hh.flow.volume_ml() - target_ml, 2),
+             "cut_to_off_ms": (off_ms - pump._stop_ms) if pump else None,
+             "coast_ml":      round((pump.flowmeter.pulses - pump._stop_p) / hh.flow.pulses_per_ml, 2)
+                              if pump else None,
+             "irq_errors":    len(hh.sim.irq_errors) }
+
+def run(firmware=hydrohomie.FIRMWARE):
+    """Return {oz: results} for each of VOLUMES_OZ."""
+    return { oz: run_one(oz, firmware) for oz in VOLUMES_OZ }
+
+if __name__ == "__main__":
+    firmware = sys.argv[1] if len(sys.argv) > 1 else hydrohomie.FIRMWARE
+    print("   oz   dispensed   overshoot ml   cut to off ms   coast ml   IRQ errors")
+    for (oz, r) in run(firmware).items():
+        print("%5d   %9.3f   %12.2f   %13s   %8s   %10d" % (oz, r["dispensed_oz"], r["overshoot_ml"],
+                                                            r["cut_to_off_ms"], r["coast_ml"], r["irq_errors"]))
@@ -0,0 +1,112 @@
+# bench_gpio.py -- bounce trains of thousands of edges into EventoidGPIONonPolled
+#
+# Drives a simulated button through a sequence of presses and releases, each one a train of
+#   BOUNCE_EDGES edges a few usecs apart that ends at the new level, plus glitches (trains that
+#   end where they started) and a few trains that go on bouncing for longer than the lockout.
+#   Checks that every press and release comes out as exactly one event, in order and
+#   time-stamped with the train's first edge, that glitches come out as none, and that the
+#   edge counters add up.  Also reports how long after a train's last edge its event was
+#   dispatched (the lockout, in simulated time) and how many of the edges the ISR suppressed.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_gpio.py
+
+import _host
+_host.setup()
+
+import random, sys
+from machine import Pin
+from eventer import Eventer
+from eventoid_gpio import EventoidGPIONonPolled
+
+PIN          = 15
+EVENT_RISING = 1
+EVENT_FALLING = 2
+LOCKOUT_MS   = 20
+BOUNCE_EDGES = 2001             # odd, so that a train ends at the other level
+LONG_EDGES   = 5001             # spaced out to bounce for about 2.5 lockouts
+PRESSES      = 25
+GLITCHES     = 10
+
+def run():
+    """Return a dict of counts and checks; "ok" is True if every check passed."""
+    sim   = _host.setup()
+    clock = sim.clock
+    rnd   = random.Random(1)
+    pin_state = sim.pin(PIN)
+    pin_state.drive(0)
+
+    eventer = Eventer(queue_size=16)
+    eo = EventoidGPIONonPolled(eventer, (EVENT_RISING, EVENT_FALLING), Pin(PIN, Pin.IN), lockout_ms=LOCKOUT_MS)
+    eventer.register(eo)
+
+    trains = []                 # (first edge us, last edge us, final level, is a glitch)
+    at_us  = 10000
+    level  = 0
+    def train(edges, gap_us):
+        nonlocal at_us, level
+        first = at_us
+        for _ in range(edges):
+            level ^= 1
+            clock.schedule_at(at_us, pin_state.drive, level)
+            at_us += rnd.randint(1, gap_us)
+        trains.append((first, at_us - 1, level, (edges & 1) == 0))
+        at_us += rnd.randint(50, 300) * 1000       # held, or left alone, for a while
+
+    kinds = ["press"] * PRESSES + ["glitch"] * GLITCHES
+    rnd.shuffle(kinds)
+    for (i, kind) in enumerate(kinds):
+        if kind == "glitch":
+            train(rnd.randrange(2, 200, 2), 5)
+        else:
+            long = (i % 10) == 0
+            for _ in range(2):                      # press, then release
+                if long:
+                    train(LONG_EDGES, 2 * (LOCKOUT_MS * 2500) // LONG_EDGES)   # ~2.5 lockouts on average
+                else:
+                    train(BOUNCE_EDGES, 5)
+    end_us = at_us + 2 * LOCKOUT_MS * 1000
+
+    got = []                    # (event, event_ms, dispatched us)
+    def process(state, event, event_ms, event_data):
+        got.append((event, event_ms, clock.now_us))
+        return state
+
+    t0 = _host.now_us()
+    while clock.now_us < end_us:
+        eventer.step(process, 0)
+    cpu_us = _host.now_us() - t0
+
+    expected = [t for t in trains if not t[3]]
+    edges    = eo.edges
+    bad      = 0
+    settle   = []
+    for ((first, last, final, _), (event, event_ms, at)) in zip(expected, got):
+        if (event != (EVENT_RISING if final else EVENT_FALLING)) or (event_ms != first // 1000):
+            bad += 1
+        settle.append(at - last)
+    bursts = len(trains)
+    checks = { "one_event_per_transition": (len(got) == len(expected)) and (bad == 0),
+               "glitches_ignored":         eo.glitches == GLITCHES,
+               "edges_add_up":             eo.edges == eo.suppressed + bursts,
+               "no_overflows":             eventer.queue_stats()["overflows"] == 0 }
+    return { "trains":          bursts,
+             "edges":           edges,
+             "suppressed":      eo.suppressed,
+             "glitches":        eo.glitches,
+             "events":          len(got),
+             "expected_events": len(expected),
+             "settle_max_ms":   round(max(settle) / 1000, 2),
+             "settle_min_ms":   round(min(settle) / 1000, 2),
+             "host_ns_per_edge": round(cpu_us * 1000 / edges),
+             "checks":          checks,
+             "ok":              all(checks.values()) }
+
+if __name__ == "__main__":
+    results = run()
+    for (key, value) in results.items():
+        if key != "checks":
+            print("%-18s %s" % (key, value))
+    for (check, ok) in results["checks"].items():
+        print("%-30s %s" % (check, "ok" if ok else "FAIL"))
+    sys.exit(0 if results["ok"] else 1)
@@ -0,0 +1,50 @@
+# bench_keypad.py -- worst-case and mean cost of EventoidKeypadPolled.poll()
+#
+# Polls the keypad eventoid in the simulator for a few simulated seconds while keys are
+#   tapped, and reports how long each poll() took in simulated time (which includes any
+#   time it spends sleeping between rows), along with the number of events it produced.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_keypad.py
+
+import _host
+_host.setup()
+
+import sim
+from sim.devices import KeypadModel
+from eventer import Eventer
+from eventoid_keypad import EventoidKeypadPolled
+
+KEYS = [['1', '2', '3', 'A'],
+        ['4', '5', '6', 'B'],
+        ['7', '8', '9', 'C'],
+        ['*', '0', '#', 'D']]
+ROW_PINS = (9, 8, 7, 6)
+COL_PINS = (5, 4, 3, 2)
+RUN_MS   = 5000
+
+def run():
+    s = sim.install(sim.Simulation())
+    keypad = KeypadModel(s, ROW_PINS, COL_PINS, KEYS)
+    for (i, key) in enumerate("123A456B789C*0#D"):
+        keypad.tap(key, 200 + i*250, 150)
+
+    eventer = Eventer(queue_size=64)
+    eo = EventoidKeypadPolled(eventer, (0, 1), ROW_PINS, COL_PINS)
+    eventer.register(eo)
+
+    clock = s.clock
+    poll_us = []
+    events = 0
+    while clock.ms() < RUN_MS:
+        t0 = clock.now_us
+        eventer.poll()
+        poll_us.append(clock.now_us - t0)
+        while eventer.next() is not None:
+            events += 1
+        eventer.idle()
+    return { "poll_us_max": max(poll_us), "poll_us_mean": sum(poll_us) / len(poll_us),
+             "polls": len(poll_us), "events": events }
+
+if __name__ == "__main__":
+    print(", ".join("%s=%.1f" % kv for kv in run().items()))
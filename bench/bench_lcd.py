@@ -0,0 +1,53 @@
+# bench_lcd.py -- I2C traffic to the LCD for each step of a HydroHomie dispense
+#
+# Runs one simulated 16oz fill and counts the bytes written on the (simulated, recording)
+#   I2C bus while the firmware reacts to each user action, along with the time the
+#   firmware spent stalled in the LCD's clear/home waits.  The screen as the simulated
+#   HD44780 shows it at the end of each step is kept so that two firmwares can be checked
+#   for drawing the same thing.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_lcd.py [firmware.py]
+
+import _host
+_host.setup()
+
+import sys
+from sim import hydrohomie
+
+# (name, start ms) of each step; each runs until the next one starts
+STEPS = (("boot", 0), ("press *", 1000), ("press 1", 2000), ("press 6", 2600), ("press D", 3200),
+         ("place vessel", 6000), ("remove vessel", 30000), ("LCD sleep", 33000))
+END_MS = 40000
+
+def run(firmware=hydrohomie.FIRMWARE):
+    """Return [(step, i2c_bytes, lcd_clears, screen_text)] for each of STEPS."""
+    hh = hydrohomie.HydroHomieSim(firmware=firmware)
+    hh.tap("*", 1000, 300)
+    hh.enter("16D", 2000)
+    hh.place_vessel(6000)
+    hh.remove_vessel(30000)
+
+    marks = []
+    def mark():
+        marks.append((hh.sim.i2c_bytes, hh.lcd.clears, hh.lcd.text()))
+    for (_, ms) in STEPS[1:]:
+        hh.at(ms - 1, mark)
+    hh.at(END_MS - 1, mark)
+    hh.run(END_MS)
+
+    results = []
+    (b0, c0) = (0, 0)
+    for ((step, _), (b, c, text)) in zip(STEPS, marks):
+        results.append((step, b - b0, c - c0, text))
+        (b0, c0) = (b, c)
+    return results
+
+if __name__ == "__main__":
+    firmware = sys.argv[1] if len(sys.argv) > 1 else hydrohomie.FIRMWARE
+    total = 0
+    print("step             I2C bytes   clears")
+    for (step, n, clears, text) in run(firmware):
+        print("%-15s  %9d   %6d" % (step, n, clears))
+        total += n
+    print("%-15s  %9d" % ("total", total))
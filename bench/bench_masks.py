@@ -0,0 +1,86 @@
+# bench_masks.py -- polling every eventoid in every state vs. the per-state polling masks
+#
+# Runs the same simulated 16oz dispense with the firmware's POLL_STATES masks in effect and
+#   with set_poll_states() disabled (every eventoid polled in every state, as before the
+#   masks), and reports for each state the loop iterations per second of simulated time, the
+#   eventoid polls made per iteration, the host CPU time of one polling pass, and the loop
+#   iterations per second that this leaves room for if the loop never idled (1s divided by
+#   the time of a pass).  The CPU times are the host's, so only their ratios mean anything.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_masks.py [firmware.py]
+
+import _host
+_host.setup()
+
+import sys
+import eventer as eventer_module
+from sim import core, hydrohomie
+
+RUN_MS = 31000
+
+def run_one(masked, firmware=hydrohomie.FIRMWARE):
+    Eventer    = eventer_module.Eventer
+    loop       = Eventer.loop
+    set_states = Eventer.set_poll_states
+    per_state  = dict()      # {state: [iterations, polls, poll_us, sim_ms]}
+    def loop_counted(self, process_func, state):
+        poll_all = self.poll
+        clock    = core.current().clock
+        last     = [state, clock.now_us]
+        def counted_poll():
+            if (counts := per_state.get(self.state)) is None:
+                counts = per_state[self.state] = [0, 0, 0, 0]
+            counts[0] += 1
+            counts[1] += len(getattr(self, "_active_eos", self._polled_eos))
+            t0 = _host.now_us()
+            poll_all()
+            counts[2] += _host.now_us() - t0
+        def process(state, event, event_ms, event_data):
+            state_new = process_func(state, event, event_ms, event_data)
+            if state_new != last[0]:
+                per_state.setdefault(last[0], [0, 0, 0, 0])[3] += (clock.now_us - last[1]) / 1000
+                last[0] = state_new
+                last[1] = clock.now_us
+            return state_new
+        self.poll = counted_poll
+        try:
+            return loop(self, process, state)
+        finally:
+            per_state.setdefault(last[0], [0, 0, 0, 0])[3] += (clock.now_us - last[1]) / 1000
+    Eventer.loop = loop_counted
+    if not masked:
+        Eventer.set_poll_states = lambda self, poll_states: None
+    try:
+        hh = hydrohomie.fill("16D", vessel_at_ms=6000, remove_at_ms=30000, until_ms=RUN_MS, firmware=firmware)
+    finally:
+        Eventer.loop            = loop
+        Eventer.set_poll_states = set_states
+
+    names   = hh.eventer.state_str
+    results = dict()
+    for (state, (iterations, polls, poll_us, sim_ms)) in per_state.items():
+        if (iterations == 0) or (sim_ms == 0):
+            continue
+        results[names.get(state, str(state))] = {
+            "sim_ms":          round(sim_ms),
+            "iterations_per_s": round(iterations * 1000 / sim_ms),
+            "polls_per_iter":  round(polls / iterations, 2),
+            "pass_us":         round(poll_us / iterations, 2),
+            "max_iter_per_s":  round(iterations * 1000000 / poll_us) if poll_us else None }
+    return results
+
+def run(firmware=hydrohomie.FIRMWARE):
+    """Return {"all": {state: results}, "masked": {state: results}}."""
+    return { "all": run_one(False, firmware), "masked": run_one(True, firmware) }
+
+if __name__ == "__main__":
+    firmware = sys.argv[1] if len(sys.argv) > 1 else hydrohomie.FIRMWARE
+    results  = run(firmware)
+    print("%-22s %-16s %12s %12s" % ("state", "", "poll all", "masked"))
+    for state in results["all"]:
+        label = state
+        for key in results["all"][state]:
+            print("%-22s %-16s %12s %12s" % (label, key, results["all"][state][key],
+                                             results["masked"].get(state, {}).get(key)))
+            label = ""
@@ -0,0 +1,133 @@
+# bench_policies.py -- worst-case event latency per eventoid under each polling policy
+#
+# Three polled eventoids, in priority (registration) order:
+#   keypad - a storm: for STORM_MS in the middle of the run, it has a new event on every poll
+#   timer  - an event due every TIMER_MS
+#   uson2z - an event at random intervals of 20..80ms (the vessel coming and going)
+# Each event carries the simulated time at which it became due, and the state machine, whose
+#   handlers each take HANDLER_US, records how long after that it was dispatched.  The run
+#   is repeated with each of the Eventer's polling policies, and the worst-case and mean
+#   latency of each eventoid's events is reported with its starvation counters.  Times are
+#   simulated, so the results are exact and repeatable.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_policies.py
+
+import _host
+_host.setup()
+
+import random, time
+import eventoid
+from eventer import Eventer
+from sim import core
+
+RUN_MS      = 3000
+STORM_MS    = (1000, 2000)      # when the keypad storms
+TIMER_MS    = 7
+HANDLER_US  = 300
+POLICIES    = (("priority",    Eventer.POLL_PRIORITY,    1),
+               ("round-robin", Eventer.POLL_ROUND_ROBIN, 1),
+               ("batch/4",     Eventer.POLL_BATCH,       4))
+
+class _Source(eventoid.Eventoid):
+    """Queues its event, with the usec it became due as the data, whenever one is due."""
+
+    def __init__(self, eventer, eo_type, event):
+        super().__init__(eventer, eo_type, True)
+        self.event  = event
+        self.due_us = None
+
+    def _next_due(self, now_us):
+        return None
+
+    def poll(self):
+        clock = core.current().clock
+        if (self.due_us is None) or (self.due_us > clock.now_us):
+            return False
+        self.eventer.post(self.event, time.ticks_ms(), self.due_us)
+        self.due_us = self._next_due(clock.now_us)
+        return True
+
+    def next_deadline(self):
+        if self.due_us is None:
+            return None
+        return time.ticks_add(time.ticks_ms(), max(0, (self.due_us - core.current().clock.now_us) // 1000))
+
+class _Storm(_Source):
+    def __init__(self, eventer, event):
+        super().__init__(eventer, "keypad", event)
+        self.due_us = STORM_MS[0] * 1000
+
+    def _next_due(self, now_us):
+        return now_us if now_us < STORM_MS[1] * 1000 else None
+
+class _Periodic(_Source):
+    def __init__(self, eventer, event):
+        super().__init__(eventer, "timer", event)
+        self.due_us = TIMER_MS * 1000
+
+    def _next_due(self, now_us):
+        due = self.due_us + TIMER_MS * 1000
+        while due <= now_us:                # missed periods are lost, like a timer's
+            due += TIMER_MS * 1000
+        return due
+
+class _Random(_Source):
+    def __init__(self, eventer, event):
+        super().__init__(eventer, "uson2z", event)
+        self.rnd    = random.Random(1)
+        self.due_us = self.rnd.randint(20, 80) * 1000
+
+    def _next_due(self, now_us):
+        return now_us + self.rnd.randint(20, 80) * 1000
+
+def run_one(policy, batch):
+    sim = _host.setup()
+    clock = sim.clock
+    eventer = Eventer(queue_size=16, poll_policy=policy, poll_batch=batch)
+    sources = (_Storm(eventer, 0), _Periodic(eventer, 1), _Random(eventer, 2))
+    for eo in sources:
+        eventer.register(eo)
+
+    latency = [[0, 0, 0] for _ in sources]     # [count, total_us, max_us] per event
+    def process(state, event, event_ms, due_us):
+        us = clock.now_us - due_us
+        l = latency[event]
+        l[0] += 1
+        l[1] += us
+        if us > l[2]:
+            l[2] = us
+        time.sleep_us(HANDLER_US)
+        return state
+
+    state = 0
+    while clock.now_us < RUN_MS * 1000:
+        state = eventer.step(process, state)
+
+    starvation = eventer.starvation()
+    results = dict()
+    for (id, eo) in eventer.eventoids.items():
+        (count, total, worst) = latency[eo.event]
+        (starved, starved_max) = starvation[str(id)+":"+eo.eo_type]
+        results[eo.eo_type] = { "events": count,
+                                "latency_mean_us": round(total / count) if count else None,
+                                "latency_max_us": worst,
+                                "starved": starved,
+                                "starved_max": starved_max }
+    results["overflows"] = eventer.queue_stats()["overflows"]
+    return results
+
+def run():
+    """Return {policy name: {eventoid type: results, "overflows": n}}."""
+    return { name: run_one(policy, batch) for (name, policy, batch) in POLICIES }
+
+if __name__ == "__main__":
+    results = run()
+    names   = [name for (name, _, _) in POLICIES]
+    print("%-8s %-16s" % ("", "") + "".join("%14s" % name for name in names))
+    for eo_type in ("keypad", "timer", "uson2z"):
+        label = eo_type
+        for key in results[names[0]][eo_type]:
+            print("%-8s %-16s" % (label, key) + "".join("%14s" % results[name][eo_type][key] for name in names))
+            label = ""
+    print("%-25s" % "queue overflows" + "".join("%14s" % results[name]["overflows"] for name in names))
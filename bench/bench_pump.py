@@ -0,0 +1,83 @@
+# bench_pump.py -- throughput and accuracy of back-to-back fills with a sluggish pump
+#
+# For each volume, runs FILLS consecutive dispenses in one simulation (so that anything the
+#   firmware learns from one fill carries over to the next) with a pump whose flow takes
+#   PUMP_TAU_MS to follow the drive, and reports how long the pump ran per fill, the fills per
+#   hour that allows, and each fill's overshoot.  Each vessel is taken away COAST_MS after the
+#   pump is switched off, and the next fill starts straight after.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_pump.py [firmware.py]
+# (e.g. against an older firmware:  git show HEAD~1:HydroHomie_106Project_V1.2.3.py > /tmp/old.py)
+
+import _host
+_host.setup()
+
+import sys
+from sim import hydrohomie
+
+VOLUMES_OZ  = (8, 16, 32, 64)
+PUMPS       = ((30.0, 60), (60.0, 120))     # (ml/s at full duty, tau_ms)
+FILLS       = 5
+COAST_MS    = 1000
+
+def run_one(oz, ml_per_s, tau_ms, firmware=hydrohomie.FIRMWARE):
+    keys = "D" if oz == 64 else str(oz) + "D"        # D alone is the 64oz preset
+    hh = hydrohomie.HydroHomieSim(pump_ml_per_s=ml_per_s, pump_tau_ms=tau_ms, firmware=firmware)
+    fills = []                                      # [ml at placement, pump on ms, pump off ms]
+
+    def start_fill(t):
+        fills.append([None, None, None])
+        t = hh.enter("*" + keys, t + 500)
+        hh.at(t + 500, place, len(fills))
+
+    def place(n):
+        fills[n - 1][0] = hh.flow.volume_ml()
+        hh.usonic.distance = 100
+
+    def on_pump(pin, level):
+        if not fills:
+            return
+        f = fills[-1]
+        if level and f[1] is None:
+            f[1] = hh.sim.clock.ms()
+        elif (not level) and (f[1] is not None) and (f[2] is None):
+            f[2] = t = hh.sim.clock.ms()
+            hh.at(t + COAST_MS, hh.remove_vessel, t + COAST_MS)
+            if len(fills) < FILLS:
+                start_fill(t + COAST_MS)
+
+    hh.sim.pin(hydrohomie.PIN_PUMP).listeners.append(on_pump)
+    start_fill(500)
+    hh.run(FILLS * (6000 + COAST_MS + int(oz * hydrohomie.ML_PER_OZ / ml_per_s * 1000)))
+
+    target_ml = oz * hydrohomie.ML_PER_OZ
+    volumes = [f[0] for f in fills[1:]] + [hh.flow.volume_ml()]
+    overshoot, pump_ms = [], []
+    for (f, end_ml) in zip(fills, volumes):
+        if f[2] is not None:
+            overshoot.append(round(end_ml - f[0] - target_ml, 2))
+            pump_ms.append(f[2] - f[1])
+    eo_pump = hh.globals.get("eo_pump")
+    mean_ms = sum(pump_ms) / len(pump_ms)
+    return { "requested_oz":  oz,
+             "fills":         len(pump_ms),
+             "pump_ms":       round(mean_ms),
+             "fills_per_hour": round(3600000 / (mean_ms + COAST_MS)),
+             "overshoot_ml":  overshoot,
+             "learned_lag_ms": None if eo_pump is None else eo_pump.lag_ms }
+
+def run(firmware=hydrohomie.FIRMWARE):
+    """Return {(ml/s, tau_ms): {oz: results}} for each pump in PUMPS and each of VOLUMES_OZ."""
+    return { (ml_per_s, tau_ms): { oz: run_one(oz, ml_per_s, tau_ms, firmware) for oz in VOLUMES_OZ }
+             for (ml_per_s, tau_ms) in PUMPS }
+
+if __name__ == "__main__":
+    firmware = sys.argv[1] if len(sys.argv) > 1 else hydrohomie.FIRMWARE
+    for ((ml_per_s, tau_ms), results) in run(firmware).items():
+        print("pump %.0f ml/s, tau %d ms" % (ml_per_s, tau_ms))
+        print("   oz   fills   pump ms   fills/hour   lag ms   overshoot ml per fill")
+        for (oz, r) in results.items():
+            print("%5d   %5d   %7d   %10d   %6s   %s" % (oz, r["fills"], r["pump_ms"], r["fills_per_hour"],
+                  "-" if r["learned_lag_ms"] is None else r["learned_lag_ms"],
+                  " ".join("%+.2f" % ml for ml in r["overshoot_ml"])))
@@ -0,0 +1,109 @@
+# bench_queue.py -- microbenchmark of the Eventer event queue
+#
+# Compares the EventQueue ring buffer behind Eventer.add()/next() against the plain
+#   list (append()/pop(0)) that it replaced, at several queue depths.  pop(0) on a list
+#   is O(n) in the number of pending events, the ring buffer is O(1).  The ring buffer is
+#   timed both through its tuple API (put()/get()) and its slot API (push()/pop()), which
+#   is what the Eventer and eventoids use.  Each is also run under tracemalloc to report the
+#   heap it allocates per op (the most in any one op, less what measuring costs).  Beyond
+#   256 events, the ring buffer's indices are ints that CPython boxes, which MicroPython's
+#   small ints don't need: that's the 32-64 bytes it shows at the larger depths.  CPython also
+#   recycles the list's and the tuple API's tuples from a free list, so they hardly show here;
+#   on MicroPython each is a heap allocation (see bench_alloc.py).
+#
+# On the host, the list's pop(0) is a memmove() that only starts to tell at thousands of
+#   pending events, and below that the ring buffer's interpreted bookkeeping is several times
+#   slower than the list's built-in methods.  What it buys is that the slot API allocates
+#   nothing, so it can be used from an ISR and never makes work for the garbage collector.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_queue.py
+
+import _host
+_host.setup()
+
+import tracemalloc
+from eventer import EventQueue
+
+DEPTHS = (1, 16, 256, 4096, 65536)
+ROUNDS = 20000
+ALLOC_ROUNDS = 1000
+
+EVENT = 3
+DATA  = "k"
+
+# the list and the tuple API are given a new (event, ticks_ms, data) tuple for each event, as
+#   the eventoids made them before the slot API
+def _list(depth):
+    q = list()
+    for _ in range(depth - 1):
+        q.append((EVENT, 0, DATA))
+    return q
+
+def _list_op(q):
+    q.append((EVENT, 0, DATA))
+    q.pop(0)
+
+def _ring(depth):
+    q = EventQueue(depth)
+    for _ in range(depth - 1):
+        q.put((EVENT, 0, DATA))
+    return q
+
+def _ring_op(q):
+    q.put((EVENT, 0, DATA))
+    q.get()
+
+def _slots(depth):
+    q = EventQueue(depth)
+    for _ in range(depth - 1):
+        q.push(EVENT, 0, DATA)
+    return q
+
+def _slots_op(q):
+    q.push(EVENT, 0, DATA)
+    q.pop()
+
+QUEUES = (("list", _list, _list_op), ("ring", _ring, _ring_op), ("slots", _slots, _slots_op))
+
+def bench_ns(op, q, rounds=ROUNDS):
+    t0 = _host.now_us()
+    for _ in range(rounds):
+        op(q)
+    return (_host.now_us() - t0) * 1000 / rounds
+
+def bench_bytes(op, q, rounds=ALLOC_ROUNDS):
+    def worst(op):
+        least = None
+        most  = 0
+        for _ in range(rounds):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            op(q)
+            n = tracemalloc.get_traced_memory()[1] - current
+            least = n if least is None else min(least, n)
+            most  = max(most, n)
+        return (least, most)
+    tracemalloc.start()
+    try:
+        base = worst(lambda q: None)[0]
+        return worst(op)[1] - base
+    finally:
+        tracemalloc.stop()
+
+def run():
+    """Return {depth: {queue: (ns_per_op, bytes_per_op)}} for each queue depth."""
+    results = dict()
+    for depth in DEPTHS:
+        results[depth] = dict()
+        for (name, make, op) in QUEUES:
+            q = make(depth)
+            op(q)                               # warm up
+            results[depth][name] = (bench_ns(op, q), bench_bytes(op, q))
+    return results
+
+if __name__ == "__main__":
+    names = [name for (name, _, _) in QUEUES]
+    print("depth " + "".join("  %8s ns/op  bytes/op" % name for name in names))
+    for (depth, r) in run().items():
+        print("%5d " % depth + "".join("  %14.1f  %8d" % r[name] for name in names))
@@ -0,0 +1,96 @@
+# bench_scenarios.py -- the firmware end to end, through the orders a user might do things in
+#
+# Each scenario is a 16oz request, scheduled on the simulator's clock, with the vessel placed
+#   and removed at different points:
+#   normal         - the vessel is placed after 'D', and removed once it's full
+#   vessel_first   - the vessel is already under the spout when 'D' is pressed
+#   placed_lifted  - the vessel is placed and lifted again before 'D', then placed after it
+#   star_timeout   - the LCD timer goes off just as '*' is queued, so that its event is
+#                    already queued when sleep_key() cancel()s it
+# Checks that none of them crashes the firmware, that each dispenses what was asked for, that
+#   the pump was left off, and that the dispenser went back to sleep.  Times are simulated.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_scenarios.py
+
+import _host
+_host.setup()
+
+import sys
+from sim import hydrohomie
+
+REQUEST_OZ   = 16
+TOLERANCE_OZ = 0.5
+RUN_MS       = 40000
+
+def _normal(hh):
+    hh.enter("16D", 2000)
+    hh.place_vessel(6000)
+    hh.remove_vessel(30000)
+
+def _vessel_first(hh):
+    hh.place_vessel(1500)
+    hh.enter("16D", 2000)
+    hh.remove_vessel(30000)
+
+def _placed_lifted(hh):
+    hh.place_vessel(1500)
+    hh.remove_vessel(2500)
+    hh.enter("16D", 3000)
+    hh.place_vessel(7000)
+    hh.remove_vessel(31000)
+
+def _star_timeout(hh):
+    def expire_with_star():
+        eventer = hh.eventer
+        timer   = hh.globals["eo_lcd_timer"]
+        post    = eventer.post
+        def post_star(event, event_ms, data=None):
+            ok = post(event, event_ms, data)
+            if data == "*":
+                timer.start(0)          # its callback runs before the key is dispatched
+            return ok
+        eventer.post = post_star
+    hh.at(500, expire_with_star)        # booted, and not yet woken by the '*' at 1000
+    _normal(hh)
+
+SCENARIOS = (("normal",        _normal),
+             ("vessel_first",  _vessel_first),
+             ("placed_lifted", _placed_lifted),
+             ("star_timeout",  _star_timeout))
+
+def run_one(schedule):
+    hh = hydrohomie.HydroHomieSim()
+    hh.tap("*", 1000, 300)
+    schedule(hh)
+    error = None
+    try:
+        hh.run(RUN_MS)
+    except Exception as e:
+        error = type(e).__name__ + ": " + str(e)
+    oz = hh.dispensed_oz()
+    checks = { "no_crash":    error is None,
+               "dispensed":   abs(oz - REQUEST_OZ) <= TOLERANCE_OZ,
+               "pump_off":    bool(hh.pump_log) and hh.pump_log[-1][1] == 0,
+               "asleep":      hh.state_name() == "STATE_SLEEP" }
+    return { "dispensed_oz": round(oz, 2),
+             "pump_log":     hh.pump_log,
+             "final_state":  hh.state_name(),
+             "error":        error,
+             "checks":       checks,
+             "ok":           all(checks.values()) }
+
+def run():
+    """Return {scenario: results}; each has "ok" True if every check passed."""
+    return { name: run_one(schedule) for (name, schedule) in SCENARIOS }
+
+if __name__ == "__main__":
+    results = run()
+    for (name, r) in results.items():
+        print(name)
+        for (key, value) in r.items():
+            if key not in ("checks", "ok"):
+                print("    %-14s %s" % (key, value))
+        for (check, ok) in r["checks"].items():
+            print("    %-14s %s" % (check, "ok" if ok else "FAIL"))
+    sys.exit(0 if all(r["ok"] for r in results.values()) else 1)
@@ -0,0 +1,54 @@
+# bench_settle.py -- time from placing a vessel to the pump starting, for various placements
+#
+# Each trace is the distance (mm) the HC-SR04 sees, as a function of the msecs since the
+#   vessel arrived: dropped straight in, slid in, wobbling, jittering, lifted and put back,
+#   held in a shaky hand that never settles (so only the max_ms fallback starts the pump),
+#   swung about too much for even that, and pushed back to just past the fill zone (but not
+#   far enough to leave OUTER).  Each is run through a simulated dispense and the time until
+#   the pump is switched on is reported; the last two should never start it.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_settle.py [firmware.py]
+
+import _host
+_host.setup()
+
+import sys, math, random
+from sim import hydrohomie
+
+PLACE_MS = 6000
+RUN_MS   = 6000
+
+def _jitter(seed, mm, spread):
+    rnd = random.Random(seed)
+    return lambda t: mm + rnd.randint(-spread, spread)
+
+TRACES = {
+    "drop":    lambda t: 100,
+    "slide":   lambda t: 400 - 300 * t // 400 if t < 400 else 100,
+    "wobble":  lambda t: 100 + int(25 * math.cos(2 * math.pi * t / 150) * math.exp(-t / 300)),
+    "jitter":  _jitter(1, 100, 4),
+    "replace": lambda t: 400 if 250 <= t < 600 else 100,
+    "shaky":   lambda t: 100 + int(15 * math.sin(2 * math.pi * t / 400)),
+    "swung":   lambda t: 100 + int(40 * math.sin(2 * math.pi * t / 400)),
+    "edge":    lambda t: 100 if t < 400 else 153,
+}
+
+def run_one(trace, firmware=hydrohomie.FIRMWARE):
+    hh = hydrohomie.HydroHomieSim(firmware=firmware)
+    hh.tap("*", 1000, 300)
+    hh.enter("16D", 2000)
+    hh.at(PLACE_MS, setattr, hh.usonic, "distance", lambda ms: trace(ms - PLACE_MS))
+    hh.run(PLACE_MS + RUN_MS)
+    on = [ms for (ms, level) in hh.pump_log if level]
+    return (on[0] - PLACE_MS) if on else None
+
+def run(firmware=hydrohomie.FIRMWARE):
+    """Return {trace name: ms from placement to pump on (None if it never started)}."""
+    return { name: run_one(trace, firmware) for (name, trace) in TRACES.items() }
+
+if __name__ == "__main__":
+    firmware = sys.argv[1] if len(sys.argv) > 1 else hydrohomie.FIRMWARE
+    print("trace      pump on after ms")
+    for (name, ms) in run(firmware).items():
+        print("%-9s  %16s" % (name, "never" if ms is None else ms))
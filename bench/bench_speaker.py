@@ -0,0 +1,57 @@
+# bench_speaker.py -- time spent inside HydroHomie's state machine handlers
+#
+# Runs a simulated dispense that exercises every beep (wake, key presses, a rejected third
+#   digit, confirm, and the double beep when the vessel is taken away) and measures, on the
+#   simulator's virtual clock, how long each call of the firmware's process_func took.
+#   Handlers that sleep for a beep show up as hundreds of msecs, during which nothing else
+#   is dispatched, so every handler's worst case has to stay under HANDLER_US_MAX: the script
+#   exits nonzero if one doesn't.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_speaker.py [firmware.py]
+
+import _host
+_host.setup()
+
+import sys
+import eventer as eventer_module
+from sim import hydrohomie
+
+HANDLER_US_MAX = 1000
+
+def run(firmware=hydrohomie.FIRMWARE):
+    """Return {event name: (calls, max handler us, total handler us)} for one dispense."""
+    hh = hydrohomie.HydroHomieSim(firmware=firmware)
+    hh.tap("*", 1000, 300)
+    hh.enter("167D", 2000)
+    hh.place_vessel(7000)
+    hh.remove_vessel(9000)
+    clock = hh.sim.clock
+
+    stats = {}
+    loop = eventer_module.Eventer.loop
+    def timed_loop(self, process_func, state):
+        def timed(state, event, event_ms, event_data):
+            t0 = clock.now_us
+            state_new = process_func(state, event, event_ms, event_data)
+            us = clock.now_us - t0
+            name = self.event_str[event]
+            (n, worst, total) = stats.get(name, (0, 0, 0))
+            stats[name] = (n + 1, max(worst, us), total + us)
+            return state_new
+        return loop(self, timed, state)
+
+    eventer_module.Eventer.loop = timed_loop
+    try:
+        hh.run(15000)
+    finally:
+        eventer_module.Eventer.loop = loop
+    return stats
+
+if __name__ == "__main__":
+    firmware = sys.argv[1] if len(sys.argv) > 1 else hydrohomie.FIRMWARE
+    stats = run(firmware)
+    print("event                  calls   max us   total us")
+    for (name, (n, worst, total)) in sorted(stats.items()):
+        print("%-21s  %5d  %7d  %9d  %s" % (name, n, worst, total, "ok" if worst < HANDLER_US_MAX else "FAIL"))
+    sys.exit(0 if all(worst < HANDLER_US_MAX for (_, worst, _) in stats.values()) else 1)
@@ -0,0 +1,137 @@
+# bench_timer.py -- checks of EventoidTimerNonPolled against the simulator's machine.Timer
+#
+# Runs one-shot, periodic, restarted and cancelled timers with ticks_ms() starting just short
+#   of its wraparound (and again from 0), and checks that each one goes off when it should:
+#   the jitter is how late each event's timestamp is compared with when it was due, and the
+#   dispatch latency how much later its handler ran.  A periodic timer's expirations follow
+#   its own schedule, so they mustn't drift either.  Restarted and cancelled timers also get
+#   a stray callback, as from a soft IRQ that was already on its way, which must be ignored.
+#   The last check is that the Eventer has nothing to poll.  Times are simulated.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_timer.py
+
+import _host
+_host.setup()
+
+import random, sys, time
+import sim
+from sim.clock import TICKS_PERIOD
+from eventer import Eventer
+from eventoid_timer import EventoidTimerNonPolled
+
+EVENT_ONESHOT  = 0
+EVENT_PERIODIC = 1
+EVENT_RESTART  = 2
+EVENT_CANCEL   = 3
+PERIOD_MS      = 7
+RUN_MS         = 5000
+
+def run_one(start_ms):
+    s     = sim.install(sim.Simulation(start_ms))
+    clock = s.clock
+    rnd   = random.Random(1)
+    eventer  = Eventer(queue_size=16)
+    oneshot  = EventoidTimerNonPolled(eventer, EVENT_ONESHOT)
+    periodic = EventoidTimerNonPolled(eventer, EVENT_PERIODIC, periodic=True, period_ms=PERIOD_MS)
+    restart  = EventoidTimerNonPolled(eventer, EVENT_RESTART)
+    cancel   = EventoidTimerNonPolled(eventer, EVENT_CANCEL)
+    for eo in (oneshot, periodic, restart, cancel):
+        eventer.register(eo)
+
+    due   = { EVENT_ONESHOT: None, EVENT_PERIODIC: None, EVENT_RESTART: None }
+    late  = { EVENT_ONESHOT: [], EVENT_PERIODIC: [], EVENT_RESTART: [] }
+    dispatch_late = [0]
+    count = { EVENT_ONESHOT: 0, EVENT_PERIODIC: 0, EVENT_RESTART: 0, EVENT_CANCEL: 0 }
+    errors = []
+
+    def process(state, event, event_ms, event_data):
+        count[event] += 1
+        if event == EVENT_CANCEL:
+            errors.append("cancelled timer went off")
+            return state
+        if due[event] is None:
+            errors.append("event %d went off unexpectedly" % event)
+            return state
+        late[event].append(time.ticks_diff(event_ms, due[event]))
+        dispatch_late[0] = max(dispatch_late[0], time.ticks_diff(time.ticks_ms(), due[event]))
+        if event == EVENT_PERIODIC:
+            due[event] = time.ticks_add(due[event], PERIOD_MS)
+        elif event == EVENT_ONESHOT:
+            due[event] = None
+            if oneshot.expiration is not None:
+                errors.append("one-shot still has an expiration")
+            ms = rnd.randint(1, 200)
+            due[event] = time.ticks_add(time.ticks_ms(), ms)
+            oneshot.start(ms)
+        else:
+            due[event] = None
+        return state
+
+    # a one-shot that re-starts itself from its handler, a free-running periodic timer, a
+    #   timer that's restarted before it goes off (every time but the last), and one that's
+    #   always cancelled before it goes off
+    ms = rnd.randint(1, 200)
+    due[EVENT_ONESHOT] = time.ticks_add(time.ticks_ms(), ms)
+    oneshot.start(ms)
+    due[EVENT_PERIODIC] = time.ticks_add(time.ticks_ms(), PERIOD_MS)
+    periodic.start()
+    restarts = [0]
+    def do_restart(_):
+        due[EVENT_RESTART] = time.ticks_add(time.ticks_ms(), 100)
+        restart.start(100)
+        restart._isr_timer(restart.timer)       # the previous start()'s callback, arriving late
+        restarts[0] += 1
+        if clock.ms() < RUN_MS - 500:
+            clock.schedule(rnd.randint(10, 99) * 1000, do_restart)
+    clock.schedule(0, do_restart)
+    def do_cancel(_):
+        cancel.start(50)
+        def do_cancel_now(_):
+            cancel.cancel()
+            cancel._isr_timer(cancel.timer)     # arriving just after the cancel
+        clock.schedule(rnd.randint(1, 49) * 1000, do_cancel_now)
+        if clock.ms() < RUN_MS - 500:
+            clock.schedule(60 * 1000, do_cancel)
+    clock.schedule(0, do_cancel)
+
+    while clock.ms() < RUN_MS:
+        eventer.step(process, 0)
+
+    periodic.cancel()
+    expected_periodic = (RUN_MS - 1) // PERIOD_MS
+    checks = { "no_errors":           not errors,
+               "oneshot_on_time":     max(late[EVENT_ONESHOT]) <= 1 and min(late[EVENT_ONESHOT]) >= 0,
+               "periodic_no_drift":   max(late[EVENT_PERIODIC]) <= 1 and min(late[EVENT_PERIODIC]) >= 0 and
+                                      abs(count[EVENT_PERIODIC] - expected_periodic) <= 1,
+               "restart_fires_once":  count[EVENT_RESTART] == 1,
+               "cancel_never_fires":  count[EVENT_CANCEL] == 0,
+               "no_polling":          not eventer.requires_polling() }
+    return { "start_ms":          start_ms,
+             "wrapped":           time.ticks_ms() < start_ms,
+             "oneshots":          count[EVENT_ONESHOT],
+             "oneshot_jitter_ms": (min(late[EVENT_ONESHOT]), max(late[EVENT_ONESHOT])),
+             "periodics":         count[EVENT_PERIODIC],
+             "periodic_jitter_ms": (min(late[EVENT_PERIODIC]), max(late[EVENT_PERIODIC])),
+             "dispatch_late_ms":  dispatch_late[0],
+             "restarts":          restarts[0],
+             "restart_events":    count[EVENT_RESTART],
+             "cancel_events":     count[EVENT_CANCEL],
+             "errors":            errors[:3],
+             "checks":            checks,
+             "ok":                all(checks.values()) }
+
+def run():
+    """Return a list of results, starting ticks_ms() just before wraparound and at 0."""
+    return [run_one(TICKS_PERIOD - RUN_MS // 2), run_one(0)]
+
+if __name__ == "__main__":
+    results = run()
+    for r in results:
+        for (key, value) in r.items():
+            if key not in ("checks", "ok"):
+                print("%-20s %s" % (key, value))
+        for (check, ok) in r["checks"].items():
+            print("%-20s %s" % (check, "ok" if ok else "FAIL"))
+        print()
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
@@ -0,0 +1,57 @@
+# bench_timers.py -- cost of many timers: individually polled vs. a shared EventoidTimerService
+#
+# For 1, 10, 100 and 1000 armed (not yet expired) timers, measures the cost of one
+#   Eventer.poll() pass, and the cost of a start()+cancel() pair.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_timers.py
+
+import _host
+_host.setup()
+
+from eventer import Eventer
+from eventoid_timer import EventoidTimerPolled, EventoidTimerService
+
+COUNTS = (1, 10, 100, 1000)
+ROUNDS = 2000
+
+def _make(n, shared):
+    eventer = Eventer()
+    service = None
+    if shared:
+        service = EventoidTimerService(eventer)
+        eventer.register(service)
+    timers = []
+    for i in range(n):
+        tmr = EventoidTimerPolled(eventer, i, service=service)
+        eventer.register(tmr)
+        tmr.start(60000 + i)      # far enough out to never expire during the run
+        timers.append(tmr)
+    return (eventer, timers)
+
+def bench_poll(n, shared, rounds=ROUNDS):
+    (eventer, _) = _make(n, shared)
+    t0 = _host.now_us()
+    for _ in range(rounds):
+        eventer.poll()
+    return (_host.now_us() - t0) * 1000 / rounds
+
+def bench_start_cancel(n, shared, rounds=ROUNDS):
+    (eventer, timers) = _make(n, shared)
+    tmr = timers[n // 2]
+    t0 = _host.now_us()
+    for i in range(rounds):
+        tmr.start(30000 + i)
+        tmr.cancel()
+    return (_host.now_us() - t0) * 1000 / rounds
+
+def run():
+    """Return {n: {"poll_ns": (polled, service), "start_cancel_ns": (polled, service)}}."""
+    return { n: { "poll_ns":         (bench_poll(n, False),         bench_poll(n, True)),
+                  "start_cancel_ns": (bench_start_cancel(n, False), bench_start_cancel(n, True)) }
+             for n in COUNTS }
+
+if __name__ == "__main__":
+    print("timers   poll ns (polled / service)   start+cancel ns (polled / service)")
+    for (n, r) in run().items():
+        print("%6d   %10.0f / %-10.0f       %10.0f / %-10.0f" % ((n,) + r["poll_ns"] + r["start_cancel_ns"]))
@@ -0,0 +1,74 @@
+# bench_usonic.py -- loop latency with the blocking vs. the split-phase (IRQ) ultrasonic driver
+#
+# Runs an Eventer with a 10ms periodic timer and a 2-zone ultrasonic eventoid in the
+#   simulator for a few simulated seconds while a vessel moves in and out of range, and
+#   reports how long each Eventer.poll() pass took and how late the timer events were
+#   dispatched, in simulated time.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_usonic.py
+
+import _host
+_host.setup()
+
+import time, sim
+from sim.devices import UltrasonicModel
+from sim.fake_hcsr04 import HCSR04
+from eventer import Eventer
+from eventoid_timer import EventoidTimerPolled
+from eventoid_uson2z import EventoidUsonic2ZonesPolled
+from usonic_irq import HCSR04Irq
+
+PIN_TRIG = 11
+PIN_ECHO = 10
+RUN_MS   = 5000
+
+def distance(ms):
+    return 100 if (ms // 1000) % 2 else 400      # vessel placed/removed every second
+
+def run_one(split_phase):
+    s = sim.install(sim.Simulation())
+    UltrasonicModel(s, PIN_TRIG, PIN_ECHO, distance=distance)
+
+    eventer = Eventer()
+    tmr = EventoidTimerPolled(eventer, 0, periodic=True, period_ms=10)
+    if split_phase:
+        usonic = HCSR04Irq(PIN_TRIG, PIN_ECHO, interval_ms=60)
+        interval_ms = None
+    else:
+        usonic = HCSR04(PIN_TRIG, PIN_ECHO)
+        interval_ms = 60
+    eo = EventoidUsonic2ZonesPolled(eventer, usonic, (0, 10000),
+                                    ((150, (1, 2)), (-100, (3, 4))), 5, None, interval_ms)
+    eventer.register(tmr)
+    eventer.register(eo)
+    tmr.start()
+
+    clock = s.clock
+    poll_us = []
+    late_ms = []
+    zone_events = 0
+    while clock.ms() < RUN_MS:
+        expiration = tmr.expiration
+        t0 = clock.now_us
+        eventer.poll()
+        poll_us.append(clock.now_us - t0)
+        while (e := eventer.next()) is not None:
+            if e[0] == 0:
+                late_ms.append(time.ticks_diff(e[1], expiration))
+            else:
+                zone_events += 1
+        eventer.idle()
+
+    return { "poll_us_max":  max(poll_us),
+             "poll_us_mean": sum(poll_us) / len(poll_us),
+             "timer_late_ms_max":  max(late_ms),
+             "timer_late_ms_mean": sum(late_ms) / len(late_ms),
+             "zone_events": zone_events }
+
+def run():
+    return { "blocking": run_one(False), "split_phase": run_one(True) }
+
+if __name__ == "__main__":
+    for (name, r) in run().items():
+        print("%-12s" % name, ", ".join("%s=%.1f" % kv for kv in r.items()))
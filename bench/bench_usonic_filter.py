@@ -0,0 +1,93 @@
+# bench_usonic_filter.py -- spurious zone events removed by the ultrasonic filter stages
+#
+# Replays ultrasonic traces (one reading in mm per line, sampled every 60ms) through a
+#   2-zone ultrasonic eventoid with several filter configurations, and counts the zone
+#   events each one produces compared to the number of real vessel placements/removals.
+#   Without trace files, synthetic traces are generated: a vessel placed and removed a few
+#   times, with gaussian noise, isolated spurious echoes and short bursts of them.
+#
+# Run on the host from the top of the repository:
+#     python bench/bench_usonic_filter.py [trace.txt ...]
+
+import _host
+_host.setup()
+
+import sys, random
+from eventer import Eventer
+from eventoid_uson2z import EventoidUsonic2ZonesPolled
+from usonic_filter import MedianFilter, EmaFilter, OutlierReject, FilterChain
+
+OUTER_MM = 150
+
+CONFIGS = {
+    "none":             lambda: None,
+    "median3":          lambda: MedianFilter(3),
+    "median5":          lambda: MedianFilter(5),
+    "ema2":             lambda: EmaFilter(2),
+    "reject+median3":   lambda: FilterChain(OutlierReject(200, 2), MedianFilter(3)),
+    "reject+median5+ema1": lambda: FilterChain(OutlierReject(200, 2), MedianFilter(5), EmaFilter(1)),
+}
+
+class TraceRanger:
+    def __init__(self, trace):
+        self.trace = trace
+        self.i = 0
+    def range_mm(self):
+        mm = self.trace[self.i]
+        self.i += 1
+        return mm
+
+def synthetic_trace(seed, cycles=5, p_spike=0.04, p_burst=0.01):
+    rng = random.Random(seed)
+    trace = []
+    for _ in range(cycles):
+        for (mm, n) in ((400, 80), (100, 300)):        # ~5s absent, ~18s present
+            for _ in range(n):
+                trace.append(int(rng.gauss(mm, 3)))
+    i = 0
+    while i < len(trace):
+        r = rng.random()
+        if r < p_spike:
+            trace[i] = rng.choice((rng.randint(20, 90), rng.randint(300, 3000)))
+        elif r < p_spike + p_burst:
+            v = rng.randint(300, 3000)
+            trace[i:i+2] = [v, v + rng.randint(-20, 20)]
+            i += 1
+        i += 1
+    return (trace, 2 * cycles - 1)          # starts absent, ends present
+
+def count_events(trace, mm_filter):
+    eventer = Eventer(queue_size=4)
+    eo = EventoidUsonic2ZonesPolled(eventer, TraceRanger(trace), (0, 10000),
+                                    ((OUTER_MM, (1, 2)), (-100, (3, 4))), 5, None, mm_filter=mm_filter)
+    n = 0
+    for _ in range(len(trace)):
+        eo.poll()
+        while eventer.next() is not None:
+            n += 1
+    return n
+
+def run(traces=None):
+    """Return {config: {"events": n, "spurious": n}} summed over all traces."""
+    if not traces:
+        traces = [synthetic_trace(seed) for seed in range(10)]
+    results = {}
+    for (name, make) in CONFIGS.items():
+        events = expected = 0
+        for (trace, n_real) in traces:
+            events   += count_events(trace, make())
+            expected += n_real
+        results[name] = { "events": events, "spurious": events - expected }
+    return results
+
+def load_trace(path):
+    """A recorded trace: one reading per line.  The real transitions are counted from a
+       heavily filtered copy of the trace."""
+    with open(path) as f:
+        trace = [int(float(line)) for line in f if line.strip()]
+    return (trace, count_events(trace, FilterChain(OutlierReject(200, 4), MedianFilter(9))))
+
+if __name__ == "__main__":
+    traces = [load_trace(p) for p in sys.argv[1:]]
+    for (name, r) in run(traces).items():
+        print("%-22s events=%4d  spurious=%4d" % (name, r["events"], r["spurious"]))
@@ -0,0 +1,394 @@
+# suite.py -- benchmark suite for the eventer library, the eventoids and the HydroHomie firmware
+#
+# Measures events/sec through the Eventer (add()/next(), post()/step() and a whole loop()),
+#   the cost of one poll() of each type of eventoid (wired to the dispenser's pins), and, on
+#   the host, the throughput of simulated HydroHomie dispenses.  Each measurement is the best
+#   of REPEATS runs.  The results are written as JSON, which can be compared against an
+#   earlier run to flag regressions, either directly or by running the suite on another commit.
+#
+# Run on the host from the top of the repository:
+#     python bench/suite.py [-o results.json] [name-filter]
+#     python bench/suite.py --compare old.json new.json [--threshold 10]
+#     python bench/suite.py --rev HEAD~1 [--threshold 10]       (runs on HEAD~1, then here)
+# Run on the Pico, with suite.py copied next to the lib/ modules:
+#     import suite; suite.main(["-o", "bench.json"])
+# (The scenario benchmarks need the simulator, so they only run on the host.)
+
+import sys, json
+
+try:
+    import _host
+    _host.setup()
+    ON_DEVICE = False
+    now_us    = _host.now_us
+    def elapsed_us(t0):
+        return now_us() - t0
+except ImportError:
+    import time
+    ON_DEVICE = True
+    now_us    = time.ticks_us
+    def elapsed_us(t0):
+        return time.ticks_diff(time.ticks_us(), t0)
+
+from machine import Pin, PWM
+from eventer import Eventer
+import eventoid
+
+ROUNDS  = 500 if ON_DEVICE else 20000
+REPEATS = 7
+THRESHOLD_PCT = 10
+
+# the dispenser's wiring, as in HydroHomie_106Project_V1.2.3.py
+ROW_PINS    = (9, 8, 7, 6)
+COL_PINS    = (5, 4, 3, 2)
+PIN_TRIG    = 11
+PIN_ECHO    = 10
+PIN_FLOW    = 12
+PIN_PUMP    = 16
+PIN_SPEAKER = 18
+
+BENCHMARKS = []         # (name, unit, higher_is_better, func), func returning the value
+
+def benchmark(name, unit, higher_is_better):
+    def register(func):
+        BENCHMARKS.append((name, unit, higher_is_better, func))
+        return func
+    return register
+
+def _best_us(func, rounds=ROUNDS):
+    """Least time (us) that func(rounds) took over REPEATS calls."""
+    best = None
+    for _ in range(REPEATS):
+        t0 = now_us()
+        func(rounds)
+        us = elapsed_us(t0)
+        if (best is None) or (us < best):
+            best = us
+    return max(best, 1)
+
+def _per_sec(func, rounds=ROUNDS):
+    return rounds * 1000000 / _best_us(func, rounds)
+
+def _ns_per(func, rounds=ROUNDS):
+    return _best_us(func, rounds) * 1000 / rounds
+
+# --- events/sec through the Eventer
+
+def _process(state, event, event_ms, event_data):
+    return state
+
+@benchmark("eventer.add_next", "events/s", True)
+def bench_add_next():
+    eventer = Eventer()
+    e = (0, 0, None)
+    def run(n):
+        for _ in range(n):
+            eventer.add(e)
+            eventer.next()
+    return _per_sec(run)
+
+@benchmark("eventer.post_step", "events/s", True)
+def bench_post_step():
+    eventer = Eventer()
+    def run(n):
+        state = 0
+        for _ in range(n):
+            eventer.post(0, 0)
+            state = eventer.step(_process, state)
+    return _per_sec(run)
+
+class _Done(Exception):
+    pass
+
+class _Source(eventoid.Eventoid):
+    """Queues an event every time it's polled."""
+
+    def __init__(self, eventer):
+        super().__init__(eventer, "bench.source", True)
+
+    def poll(self):
+        self.eventer.post(0, 0)
+        return True
+
+@benchmark("eventer.loop", "events/s", True)
+def bench_loop():
+    eventer = Eventer()
+    eventer.register(_Source(eventer))
+    def run(n):
+        left = [n]
+        def process(state, event, event_ms, event_data):
+            left[0] -= 1
+            if left[0] == 0:
+                raise _Done()
+            return state
+        try:
+            eventer.loop(process, 0)
+        except _Done:
+            pass
+    return _per_sec(run)
+
+# --- cost of one poll() of each type of eventoid, when there's nothing for it to do
+
+def _poll_cost(eo):
+    poll = eo.poll
+    def run(n):
+        for _ in range(n):
+            poll()
+    return _ns_per(run)
+
+@benchmark("poll.timer.polled", "ns/poll", False)
+def bench_poll_timer():
+    from eventoid_timer import EventoidTimerPolled
+    eo = EventoidTimerPolled(Eventer(), 0)
+    eo.start(1000000)
+    return _poll_cost(eo)
+
+@benchmark("poll.timer.service10", "ns/poll", False)
+def bench_poll_timer_service():
+    from eventoid_timer import EventoidTimerService, EventoidTimerPolled
+    eventer = Eventer()
+    service = EventoidTimerService(eventer)
+    timers  = [EventoidTimerPolled(eventer, 0, service=service) for _ in range(10)]
+    for (i, timer) in enumerate(timers):
+        timer.start(1000000 + i)
+    return _poll_cost(service)
+
+@benchmark("poll.keypad", "ns/poll", False)
+def bench_poll_keypad():
+    from eventoid_keypad import EventoidKeypadPolled
+    eo = EventoidKeypadPolled(Eventer(), (0, None), ROW_PINS, COL_PINS, 5, col_pull=Pin.PULL_DOWN,
+                              debounce=True)
+    return _poll_cost(eo)
+
+@benchmark("poll.uson2z", "ns/poll", False)
+def bench_poll_uson2z():
+    from usonic_irq import HCSR04Irq
+    from eventoid_uson2z import EventoidUsonic2ZonesPolled
+    usonic = HCSR04Irq(PIN_TRIG, PIN_ECHO, 60)
+    eo = EventoidUsonic2ZonesPolled(Eventer(), usonic, (0, 10000), ((150, (3, 4)), (-100, (5, 6))), 5, None)
+    return _poll_cost(eo)
+
+@benchmark("poll.usonzones", "ns/poll", False)
+def bench_poll_usonzones():
+    from usonic_irq import HCSR04Irq
+    from eventoid_usonzones import EventoidUsonicZonesPolled
+    usonic = HCSR04Irq(PIN_TRIG, PIN_ECHO, 60)
+    eo = EventoidUsonicZonesPolled(Eventer(), usonic, (0, 10000), ((150, (3, 4)),), 5)
+    return _poll_cost(eo)
+
+# --- cost of ranging (a reading always ready) and classifying it, staying in one zone
+
+class _Ranger:
+    def __init__(self):
+        self.i = 0
+
+    def range_mm(self):
+        self.i = (self.i + 1) & 7
+        return 300 + self.i
+
+@benchmark("classify.uson2z", "ns/reading", False)
+def bench_classify_uson2z():
+    from eventoid_uson2z import EventoidUsonic2ZonesPolled
+    eo = EventoidUsonic2ZonesPolled(Eventer(), _Ranger(), (0, 10000), ((150, (3, 4)), (-100, (5, 6))), 5, None)
+    return _poll_cost(eo)
+
+@benchmark("classify.usonzones1", "ns/reading", False)
+def bench_classify_usonzones1():
+    from eventoid_usonzones import EventoidUsonicZonesPolled
+    eo = EventoidUsonicZonesPolled(Eventer(), _Ranger(), (0, 10000), ((150, (3, 4)),), 5)
+    return _poll_cost(eo)
+
+@benchmark("classify.usonzones8", "ns/reading", False)
+def bench_classify_usonzones8():
+    from eventoid_usonzones import EventoidUsonicZonesPolled
+    zones = tuple((mm, (None, None)) for mm in range(40, 360, 40))   # e.g. fill levels
+    eo = EventoidUsonicZonesPolled(Eventer(), _Ranger(), (0, 10000), zones, 5)
+    return _poll_cost(eo)
+
+@benchmark("poll.speaker", "ns/poll", False)
+def bench_poll_speaker():
+    from eventoid_speaker import EventoidSpeaker
+    eo = EventoidSpeaker(Eventer(), PWM(Pin(PIN_SPEAKER)), { "beep": ((1000, 0x8000, 100),) })
+    return _poll_cost(eo)
+
+def _null_lcd():
+    from lcd_api import LcdApi
+    class NullLcd(LcdApi):
+        def hal_write_command(self, cmd): pass
+        def hal_write_data(self, data):   pass
+    return NullLcd(4, 20)
+
+@benchmark("poll.lcd.framebuffer", "ns/poll", False)
+def bench_poll_lcd():
+    from eventoid_lcd import EventoidLcdFramebuffer
+    eo = EventoidLcdFramebuffer(Eventer(), _null_lcd(), 4, 20)
+    eo.flush()
+    return _poll_cost(eo)
+
+@benchmark("lcd.flush_screen", "ns/flush", False)
+def bench_lcd_flush():
+    from eventoid_lcd import EventoidLcdFramebuffer
+    eo = EventoidLcdFramebuffer(Eventer(), _null_lcd(), 4, 20)
+    screens = ("Enter oz:".ljust(80), "Place vessel".ljust(80))
+    def run(n):
+        for i in range(n):
+            eo.move_to(0, 0)
+            eo.putstr(screens[i & 1])
+            eo.flush()
+    return _ns_per(run, ROUNDS // 10)
+
+@benchmark("poll.pump", "ns/poll", False)
+def bench_poll_pump():
+    from eventoid_flowmeter import EventoidFlowMeter
+    from eventoid_pump import EventoidPumpControl
+    eventer = Eventer()
+    flow = EventoidFlowMeter(eventer, 0, Pin(PIN_FLOW, Pin.IN), 4920)
+    eo = EventoidPumpControl(eventer, 0, PWM(Pin(PIN_PUMP)), flow)
+    return _poll_cost(eo)
+
+@benchmark("isr.flowmeter", "ns/pulse", False)
+def bench_isr_flowmeter():
+    from eventoid_flowmeter import EventoidFlowMeter
+    pin = Pin(PIN_FLOW, Pin.IN)
+    eo  = EventoidFlowMeter(Eventer(), 0, pin, 4920)
+    eo.start(1000000)
+    isr = eo._isr_pulse
+    def run(n):
+        for _ in range(n):
+            isr(pin)
+    return _ns_per(run)
+
+@benchmark("filter.settle", "ns/reading", False)
+def bench_settle():
+    from eventoid_settle import EventoidUsonicSettle
+    eo = EventoidUsonicSettle(Eventer(), 0)
+    update = eo.update
+    def run(n):
+        for i in range(n):
+            update(100 + (i & 3))
+    return _ns_per(run)
+
+# --- whole simulated dispenses (host only)
+
+def _dispense():
+    from sim import hydrohomie
+    t0 = now_us()
+    hh = hydrohomie.fill("16D", vessel_at_ms=6000, remove_at_ms=30000)
+    return (elapsed_us(t0), hh)
+
+@benchmark("scenario.dispense", "dispenses/s", True)
+def bench_dispense():
+    if ON_DEVICE:
+        return None
+    return 1000000 / min(_dispense()[0] for _ in range(REPEATS))
+
+@benchmark("scenario.loop", "iterations/s", True)
+def bench_dispense_loop():
+    if ON_DEVICE:
+        return None
+    (us, hh) = min((_dispense() for _ in range(REPEATS)), key=lambda r: r[0])
+    return hh.eventer.loop_iterations * 1000000 / us
+
+# --- running and comparing
+
+def run(name_filter=None):
+    """Run the benchmarks (those whose names contain name_filter) and return the results dict."""
+    results = dict()
+    for (name, unit, higher_is_better, func) in BENCHMARKS:
+        if name_filter and name_filter not in name:
+            continue
+        try:
+            value = func()
+        except Exception as e:          # e.g. an eventoid that doesn't exist at this commit
+            results[name] = { "error": repr(e) }
+            continue
+        if value is not None:
+            results[name] = { "value": value, "unit": unit, "higher_is_better": higher_is_better }
+    return { "meta": { "implementation": sys.implementation.name, "platform": sys.platform,
+                       "rounds": ROUNDS, "repeats": REPEATS },
+             "results": results }
+
+def compare(old, new, threshold=THRESHOLD_PCT):
+    """
+    Return [(name, old value, new value, % worse, flag)] for the benchmarks in both runs, where
+    flag is "REGRESSION" or "improved" if the new value is more than threshold % worse or better.
+    """
+    rows = []
+    for (name, r_new) in new["results"].items():
+        r_old = old["results"].get(name)
+        if (r_old is None) or ("value" not in r_old) or ("value" not in r_new):
+            continue
+        (a, b) = (r_old["value"], r_new["value"])
+        worse = (a - b) / a * 100 if r_new["higher_is_better"] else (b - a) / a * 100
+        flag = "REGRESSION" if worse > threshold else ("improved" if worse < -threshold else "")
+        rows.append((name, a, b, worse, flag))
+    return rows
+
+def print_results(results):
+    for (name, r) in results["results"].items():
+        if "error" in r:
+            print("%-24s  error: %s" % (name, r["error"]))
+        else:
+            print("%-24s  %14.1f  %s" % (name, r["value"], r["unit"]))
+
+def print_comparison(rows):
+    print("%-24s  %14s  %14s  %8s" % ("benchmark", "old", "new", "% worse"))
+    for (name, a, b, worse, flag) in rows:
+        print("%-24s  %14.1f  %14.1f  %+8.1f  %s" % (name, a, b, worse, flag))
+    return sum(1 for row in rows if row[4] == "REGRESSION")
+
+def run_at_rev(rev, name_filter=None):
+    """Run this suite against the tree at git revision rev (host only) and return its results."""
+    import os, io, shutil, tarfile, tempfile, subprocess
+    root = _host.ROOT_DIR
+    tree = subprocess.run(["git", "archive", rev], cwd=root, check=True, stdout=subprocess.PIPE).stdout
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    try:
+        tarfile.open(fileobj=io.BytesIO(tree)).extractall(tmp)
+        os.makedirs(os.path.join(tmp, "bench"), exist_ok=True)
+        for f in ("suite.py", "_host.py"):
+            shutil.copy(os.path.join(root, "bench", f), os.path.join(tmp, "bench", f))
+        out = os.path.join(tmp, "results.json")
+        subprocess.run([sys.executable, os.path.join(tmp, "bench", "suite.py"), "-o", out] +
+                       ([name_filter] if name_filter else []), check=True, stdout=subprocess.DEVNULL)
+        with open(out) as f:
+            return json.load(f)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def main(argv=None):
+    """Returns the number of regressions found when comparing, otherwise 0."""
+    args = list(sys.argv[1:] if argv is None else argv)
+    threshold = THRESHOLD_PCT
+    if "--threshold" in args:
+        i = args.index("--threshold")
+        threshold = float(args[i + 1])
+        del args[i:i + 2]
+
+    if args and args[0] == "--compare":
+        with open(args[1]) as f:
+            old = json.load(f)
+        with open(args[2]) as f:
+            new = json.load(f)
+        return print_comparison(compare(old, new, threshold))
+
+    if args and args[0] == "--rev":
+        name_filter = args[2] if len(args) > 2 else None
+        old = run_at_rev(args[1], name_filter)
+        new = run(name_filter)
+        return print_comparison(compare(old, new, threshold))
+
+    out = None
+    if "-o" in args:
+        i = args.index("-o")
+        out = args[i + 1]
+        del args[i:i + 2]
+    results = run(args[0] if args else None)
+    print_results(results)
+    if out is not None:
+        with open(out, "w") as f:
+            json.dump(results, f)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -4,10 +4,63 @@
 # Note that any time that the event queue is manipulated, interrupts must be turned
 #   off to prevent it from being corrupted by interrupt-induced race conditions.
 #
+# Pending events are kept in a fixed-capacity ring buffer (EventQueue) that is allocated
+#   up-front, so queueing an event from an ISR never allocates or grows anything, and both
+#   enqueue and dequeue are O(1).  The event numbers and timestamps live in array('I') slots
+#   rather than in (event, ticks_ms, data) tuples: eventoids queue with post() and step()
+#   dispatches straight out of the slots, so the whole event path runs without touching the
+#   heap.  add()/next() still take and return tuples, for code that doesn't care.
+#
+# Tracing: with trace=True, every dispatch is printed to the console, which is slow enough
+#   to change the timing being traced.  Given a tracer (see tracer.py), each dispatch is
+#   instead packed into a fixed-size binary record in a preallocated ring buffer, to be
+#   dumped when wanted and decoded on the host.
+#
+# Instrumentation: stats_enable() makes the Eventer time every eventoid's poll(), every
+#   handler (per state and event) and how long each event waited in the queue, with
+#   ticks_us(), into Histograms of power-of-2 buckets.  The histograms are allocated the first
+#   time each one is needed, and while it's disabled all it costs is an `is None` test in
+#   poll() and step().  See stats(), and tools/stats_report.py for ranking the results.
+#
+# Dual-core: with dual_core=True, loop() runs the polling of the eventoids in a _thread (on
+#   the RP2040's second core) and only dispatches on the first.  machine.disable_irq() only
+#   masks the core it's called on, so events posted by eventoids while they're polled on the
+#   second core don't go into the event queue, but into a lock-free single-producer/single-
+#   consumer ring (SpscRing), which the dispatcher takes events from whenever the queue is
+#   empty.  Events queued by ISRs therefore go first.  Nothing serialises the handlers with the
+#   poller, so an eventoid that handlers change (e.g. start()/stop() a pump, play() a tune)
+#   must be registered with dispatcher=True, to be polled on the first core between dispatches
+#   instead.  rearm()s for the poller's eventoids are left to the poller, which makes them just
+#   before it next polls each one.  What handlers can't avoid is an event the poller queued
+#   just before a handler changed its eventoid, so the state machine has to tolerate those.
+#
+# Polling masks: set_poll_states() says which polled eventoids each state of the machine cares
+#   about, and only those are polled (and asked for deadlines) while in that state -- e.g. no
+#   ultrasonic pings while the machine sleeps.  An eventoid that's unmasked again by a state
+#   change is rearm()'d first, so it resyncs with its input: the keypad doesn't report keys
+#   that changed while nobody was listening, while the ultrasonic sensor reports a vessel that's
+#   already there as arriving.
+#
+# Polling policy: by default, poll() stops at the first eventoid that queues an event ("one and
+#   done"), so eventoids registered early always win -- and one that's queueing an event on
+#   every pass starves everything registered after it.  POLL_ROUND_ROBIN starts each pass
+#   just after the eventoid that queued last, and POLL_BATCH polls them all, queueing up to
+#   poll_batch events per pass (which step() then dispatches together).  Every eventoid counts
+#   the passes on which it was due its turn but wasn't polled, see starvation().
+#
+# When there's nothing to dispatch, loop() asks the eventoids when they next need polling
+#   and idles until the earliest of those deadlines (or until an ISR queues an event)
+#   instead of spinning.
+#
 # Written by Eric Wertz (eric@edushields.com)
 # Last modified 25-Apr-2022 22:55
 
 import micropython, machine, time
+from array import array
+try:
+    import _thread
+except ImportError:
+    _thread = None
 
 micropython.alloc_emergency_exception_buf(100)
 
@@ -20,13 +73,212 @@ class EventoidException(Exception):
 class EventerException(Exception):
     pass
 
+class Histogram:
+    """
+    Counts of durations in power-of-2 buckets of usecs: bucket 0 counts 0us, bucket i counts
+    [2**(i-1), 2**i) us and the last bucket also counts anything longer.
+    """
+
+    def __init__(self, buckets=20):
+        self.buckets  = array("I", [0] * buckets)
+        self.count    = 0
+        self.total_us = 0
+        self.max_us   = 0
+
+    def add(self, us):
+        b = 0
+        v = us
+        while v > 0:
+            v >>= 1
+            b += 1
+        n = len(self.buckets)
+        if b >= n:
+            b = n - 1
+        self.buckets[b] += 1
+        self.count    += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def as_dict(self):
+        return { "count": self.count, "total_us": self.total_us, "max_us": self.max_us,
+                 "buckets": list(self.buckets) }
+
+class EventQueue:
+    """
+    Fixed-capacity FIFO ring buffer of pending events.  All of the slots are allocated when
+    the queue is created, so push() never allocates and both push() and pop() are O(1).
+    Events must be non-negative ints.
+
+    The queue itself does no locking -- callers (the Eventer) must disable interrupts around
+    any access that can race with an ISR.
+    """
+
+    def __init__(self, size=16):
+        """
+        size - maximum number of events that can be pending at once [type: int]
+        """
+        if size < 1:
+            raise EventerException("Event queue size must be at least 1")
+
+        self.size       = size
+        self._events    = array("I", [0] * size)
+        self._ms        = array("I", [0] * size)
+        self._data      = [None] * size
+        self._head      = 0       # index of the oldest pending event
+        self._count     = 0       # number of pending events
+        self.overflows  = 0       # events dropped because the queue was full
+        self.high_water = 0       # maximum number of events ever pending at once
+
+        self.ms         = 0       # timestamp and data of the event last returned by pop()
+        self.data       = None
+        self._us        = None    # ticks_us() of each push, if stamp_us() is on
+        self.us         = 0       #   and of the push of the event last returned by pop()
+
+    def __len__(self):
+        return self._count
+
+    def stamp_us(self, on=True):
+        """Start (or stop) recording the ticks_us() at which each event is pushed."""
+        self._us = array("I", [0] * self.size) if on else None
+
+    def push(self, event, event_ms, data=None):
+        """Append an event.  Returns False (and counts an overflow) if the queue is full."""
+        count = self._count
+        if count == self.size:
+            self.overflows += 1
+            return False
+
+        i = self._head + count
+        if i >= self.size:
+            i -= self.size
+        self._events[i] = event
+        self._ms[i]     = event_ms
+        self._data[i]   = data
+        if self._us is not None:
+            self._us[i] = time.ticks_us()
+
+        count += 1
+        self._count = count
+        if count > self.high_water:
+            self.high_water = count
+        return True
+
+    def pop(self):
+        """
+        Remove the oldest event and return its number, leaving its timestamp and data in
+        .ms and .data.  Returns None if the queue is empty.
+        """
+        if self._count == 0:
+            return None
+
+        i = self._head
+        self.ms   = self._ms[i]
+        self.data = self._data[i]
+        self._data[i] = None      # don't keep the event's data alive
+        if self._us is not None:
+            self.us = self._us[i]
+
+        self._count -= 1
+        if i + 1 == self.size:
+            self._head = 0
+        else:
+            self._head = i + 1
+        return self._events[i]
+
+    def put(self, e):
+        """Append an (event, ticks_ms, data) tuple.  Returns False if the queue is full."""
+        (event, event_ms, data) = e
+        return self.push(event, event_ms, data)
+
+    def get(self):
+        """Remove and return the oldest event as an (event, ticks_ms, data) tuple, or None."""
+        if (event := self.pop()) is None:
+            return None
+        return (event, self.ms, self.data)
+
+    def clear(self):
+        while self._count:
+            self.pop()
+        self.data = None
+
+class SpscRing:
+    """
+    Fixed-capacity FIFO of events from exactly one producer to exactly one consumer, that
+    can safely run at the same time on different cores without any locking.  The producer
+    only ever writes _tail and the consumer only ever writes _head, each after the slot it
+    refers to has been written or read.  One slot is always left empty, to tell a full ring
+    from an empty one.
+    """
+
+    def __init__(self, size=16):
+        """
+        size - maximum number of events that can be in the ring at once [type: int]
+        """
+        if size < 1:
+            raise EventerException("Ring size must be at least 1")
+
+        n = size + 1
+        self.size    = size
+        self._n      = n
+        self._events = array("I", [0] * n)
+        self._ms     = array("I", [0] * n)
+        self._data   = [None] * n
+        self._head   = 0      # next slot to read, written only by the consumer
+        self._tail   = 0      # next slot to write, written only by the producer
+        self.waits   = 0      # times the producer found the ring full (producer-owned)
+        self.ms      = 0      # timestamp and data of the event last returned by pop()
+        self.data    = None
+
+    def __len__(self):
+        n = self._tail - self._head
+        return n + self._n if n < 0 else n
+
+    def push(self, event, event_ms, data=None):
+        """Producer: append an event.  Returns False if the ring is full."""
+        tail = self._tail
+        i = tail + 1
+        if i == self._n:
+            i = 0
+        if i == self._head:
+            return False
+        self._events[tail] = event
+        self._ms[tail]     = event_ms
+        self._data[tail]   = data
+        self._tail = i        # publish the slot only once it's written
+        return True
+
+    def pop(self):
+        """
+        Consumer: remove the oldest event and return its number, leaving its timestamp and
+        data in .ms and .data.  Returns None if the ring is empty.
+        """
+        head = self._head
+        if head == self._tail:
+            return None
+        self.ms   = self._ms[head]
+        self.data = self._data[head]
+        self._data[head] = None
+        event = self._events[head]
+        head += 1
+        self._head = 0 if head == self._n else head     # hand the slot back to the producer
+        return event
+
 class Eventer:
     """
     Custom event manager that composes events from changing conditions in the system
     and queues them up for retrieval, usually by a state machine.
     """
 
-    def __init__(self, trace=False, trace_info=None):
+    POLLER_MAX_IDLE_MS = 10     # longest the dual-core poller waits, so it notices re-armed eventoids
+
+    # polling policies, see poll()
+    POLL_PRIORITY    = 0        # registration order, stop at the first eventoid to queue an event
+    POLL_ROUND_ROBIN = 1        # the same, but start after the last eventoid that queued one
+    POLL_BATCH       = 2        # poll them all, stopping only once poll_batch events are queued
+
+    def __init__(self, trace=False, trace_info=None, queue_size=16, sleep_func=None, max_idle_ms=1000,
+                 tracer=None, dual_core=False, ring_size=16, poll_policy=POLL_PRIORITY, poll_batch=4):
         """
         Create an event-checker object with an internal queue for holding pending events.
 
@@ -35,23 +287,77 @@ class Eventer:
                      event values to strings.  If None or either tuple member is None, then str(val)
                      will be used instead.
                      [type: None | (None|dict(state_val, str), None|dict(event_val, str))]
+        queue_size - (optional) maximum number of pending events.  Events added while the queue
+                     is full are dropped and counted in queue_stats() [type: int]
+        sleep_func - (optional) function called as sleep_func(ms) to idle the loop until the next
+                     eventoid deadline, e.g. time.sleep_ms or machine.lightsleep, or a simulated
+                     sleep on the host.  If None, the loop waits in machine.idle() and wakes as
+                     soon as an ISR queues an event. [type: None | function(int)]
+        max_idle_ms - (optional) upper bound on any one idle period [type: int]
+        tracer - (optional) binary recorder of every dispatch, with the time its handler took.
+                 If it has a sink, it's flushed while the loop is idle. [type: None | TraceRecorder]
+        dual_core - (optional) have loop() poll the eventoids in a second thread (core), see
+                    above.  The poller waits for deadlines with sleep_func if given, otherwise
+                    time.sleep_ms(), for at most POLLER_MAX_IDLE_MS at a time [type: bool]
+        ring_size - (optional) maximum number of events in flight from the poller to the
+                    dispatcher.  When it's full, the poller waits [type: int]
+        poll_policy, poll_batch - (optional) see set_poll_policy()
         """
         self.trace = trace
+        self.tracer = tracer
         (self.state_str, self.event_str) = (None, None) if trace_info is None else trace_info
 
-        self._queue            = list()
+        self._queue            = EventQueue(queue_size)
         self._requires_polling = 0
         self._next_id          = 0
         self.eventoids         = dict()
+        self._polled_eos       = list()   # registered eventoids that require polling, in priority order
+        self._active_eos       = self._polled_eos   # the ones polled in the current state
+        self._poll_states      = None     # {state: [eventoid, ...]} from set_poll_states()
+        self._dispatcher_eos   = list()   # dual_core: polled eventoids that handlers change, see register()
+        self._splits           = dict()   # dual_core: {id(active list): (dispatcher's, poller's)}
+        self._local_eos        = self._polled_eos   # dual_core: polled on the dispatching core...
+        self._poller_eos       = self._polled_eos   #   ...and by the poller, in the current state
+
+        self.state             = None     # current state of the machine being run by loop()
+        self.set_poll_policy(poll_policy, poll_batch)
+
+        self.sleep_func        = sleep_func
+        self.max_idle_ms       = max_idle_ms
+        self.loop_iterations   = 0    # passes through step()
+        self.loop_busy         = 0    # passes that dispatched an event
+        self.loop_idle_ms      = 0    # total time requested for idling
+
+        self._poll_hist        = None     # {eventoid: Histogram} while stats are enabled
+        self._handler_hist     = None     # {state: {event: Histogram}}
+        self._residency_hist   = None     # {event: Histogram} of time spent queued
+
+        if dual_core and (_thread is None):
+            raise EventerException("Dual-core mode needs _thread")
+        self.dual_core         = dual_core
+        self._ring             = SpscRing(ring_size) if dual_core else None
+        self._poll_ident       = None     # _thread ident of the poller while it runs
+        self._poll_running     = False
+        self._poll_stopped     = True
+        self.wake              = None     # flag set() whenever an event is queued, e.g. asyncio.ThreadSafeFlag
 
-    def register(self, eo):
+    def register(self, eo, dispatcher=False):
+        """
+        eo - eventoid to poll (if it's polled) and take events from
+        dispatcher - (dual_core only) poll eo on the dispatching core, because handlers change it
+        """
         id = self._next_id
         self.eventoids[id] = eo
 
         eo.set_queue(self._queue)
         if eo.is_polled():
             self._requires_polling += 1
+            self._polled_eos.append(eo)
+            if dispatcher:
+                self._dispatcher_eos.append(eo)
+            self._resplit()
         self._next_id += 1
+        return id
 
     # FIXME: this is entirely untested
     def unregister(self, id):
@@ -59,99 +365,546 @@ class Eventer:
             raise EventerException("No such eventoid id: "+str(id))
 
         eo = self.eventoids[id]
-        if eo.is_polled:
+        if eo.is_polled():
             self._requires_polling -= 1
+            self._polled_eos.remove(eo)
+            if eo in self._dispatcher_eos:
+                self._dispatcher_eos.remove(eo)
+            if self._poll_states is not None:
+                for eos in self._poll_states.values():
+                    if eo in eos:
+                        eos.remove(eo)
+            self._resplit()
         eo.deinit()
         del self.eventoids[id]
 
     def requires_polling(self):
         return bool(self._requires_polling)
 
+    def set_poll_policy(self, policy, batch=4):
+        """
+        policy - POLL_PRIORITY, POLL_ROUND_ROBIN or POLL_BATCH
+        batch - most events queued by one pass of POLL_BATCH, and dispatched by one step()
+        """
+        if policy not in (self.POLL_PRIORITY, self.POLL_ROUND_ROBIN, self.POLL_BATCH):
+            raise EventerException("No such polling policy: "+str(policy))
+        if batch < 1:
+            raise EventerException("poll_batch must be at least 1")
+        self.poll_policy = policy
+        self.poll_batch  = batch if policy == self.POLL_BATCH else 1
+        self._poll_start = [0, 0]       # where the next pass starts, on this core and the poller's
+
+    def starvation(self):
+        """
+        Return {"id:type": (passes, longest)} for each polled eventoid: the number of passes that
+        stopped before getting to it, and the most of them in a row.
+        """
+        return { str(id)+":"+eo.eo_type: (eo.starved, eo.starved_max)
+                 for (id, eo) in self.eventoids.items() if eo.is_polled() }
+
+    def set_poll_states(self, poll_states):
+        """
+        Only poll the given eventoids while the state machine is in the given state.
+        poll_states - {state: iterable of the polled eventoids whose events that state handles}.
+                      States that aren't in it poll every eventoid.  None polls every eventoid
+                      in every state [type: None | dict(state, iterable(Eventoid))]
+        Eventoids keep their registration (priority) order within each state.
+        """
+        if poll_states is None:
+            self._poll_states = None
+            self._select_eventoids(None)
+            return
+        polled = self._polled_eos
+        self._poll_states = dict()
+        for (state, eos) in poll_states.items():
+            eos = tuple(eos)
+            self._poll_states[state] = [eo for eo in polled if eo in eos]
+        self._resplit()
+        self._select_eventoids(self.state)
+
+    def is_active(self, eo):
+        """Return whether eo is polled in the current state."""
+        return eo in self._active_eos
+
+    def _select_eventoids(self, state):
+        if self._poll_states is None:
+            active = self._polled_eos
+        else:
+            active = self._poll_states.get(state, self._polled_eos)
+        if active is self._active_eos:
+            return
+        previous = self._active_eos
+        if self._ring is None:
+            for eo in active:
+                if eo not in previous:
+                    eo.rearm()
+        else:
+            (local, remote) = self._split(active)
+            for eo in local:
+                if eo not in previous:
+                    eo.rearm()
+            for eo in remote:
+                if eo not in previous:
+                    eo._rearm_pending = True    # the poller rearms it, on its own core
+            self._local_eos  = local
+            self._poller_eos = remote   # only now, so that the poller never sees one unflagged
+        self._active_eos = active
+
+    def _split(self, active):
+        # dual_core: active as (the eventoids polled on this core, the poller's), made once per list
+        if (split := self._splits.get(id(active))) is None:
+            local  = [eo for eo in active if eo in self._dispatcher_eos]
+            remote = [eo for eo in active if eo not in self._dispatcher_eos]
+            split  = self._splits[id(active)] = (local, remote)
+        return split
+
+    def _resplit(self):
+        # the eventoids or the masks changed
+        self._splits = dict()
+        if self._ring is not None:
+            (self._local_eos, self._poller_eos) = self._split(self._active_eos)
+
     def poll(self):
         """
         Poll all of the eventoids that requrie it for changes since last called.
         The order in which they are checked/queued implicitly dictates their priority,
           which is the order in which they were registered.
-        The current implementation only allows one (polled) event to be queued at a time because
+        The default policy (POLL_PRIORITY) only allows one (polled) event to be queued at a time because
           this helps to limit race conditions in users' programs that are very difficult to defend against --
           one example being the race between pressing a button to cancel a timer and the timer going
-          off anyways.
+          off anyways.  POLL_ROUND_ROBIN keeps that, but rotates which eventoid goes first;
+          POLL_BATCH gives it up (up to poll_batch events per pass) so that all of them get a look.
         
         params: none
         """
         if self._requires_polling == 0:
             return
-        for eo in self.eventoids.values():
-            if eo.is_polled():
-                if eo.poll():    # one and done
+        self._poll_eos(self._active_eos, 0)
+
+    def _poll_eos(self, active, core):
+        # one pass of poll() over active, for the dispatching core (0) or the poller (1)
+        n = len(active)
+        if n == 0:
+            return
+        starts = self._poll_start
+        i = starts[core]
+        if i >= n:                      # the active eventoids changed with the state
+            i = 0
+        hists  = self._poll_hist
+        left   = self.poll_batch
+        for k in range(n):
+            eo = active[i]
+            if eo._rearm_pending:       # dual_core: unmasked by the dispatcher since the last pass
+                eo._rearm_pending = False
+                eo.rearm()
+            if hists is None:
+                queued = eo.poll()
+            else:
+                t0 = time.ticks_us()
+                queued = eo.poll()
+                us = time.ticks_diff(time.ticks_us(), t0)
+                if (h := hists.get(eo)) is None:
+                    h = hists[eo] = Histogram()
+                h.add(us)
+            eo._starved_run = 0
+            i += 1
+            if i == n:
+                i = 0
+            if queued:
+                left -= 1
+                if left == 0:           # one and done (or batch done)
+                    self._starve(active, i, n - k - 1)
+                    if self.poll_policy != self.POLL_PRIORITY:
+                        starts[core] = i
                     return
 
+    def _starve(self, active, i, count):
+        # the next count eventoids from active[i] (wrapping around) didn't get polled this pass
+        n = len(active)
+        while count:
+            eo = active[i]
+            eo.starved += 1
+            run = eo._starved_run + 1
+            eo._starved_run = run
+            if run > eo.starved_max:
+                eo.starved_max = run
+            i += 1
+            if i == n:
+                i = 0
+            count -= 1
+
+    def next_deadline(self):
+        """
+        Return the number of msecs until the earliest deadline of any polled eventoid (0 if one
+        is already due), or None if no eventoid has anything pending.
+        """
+        if self._requires_polling == 0:
+            return None
+        return self._next_deadline(self._active_eos)
+
+    def _next_deadline(self, active):
+        now = time.ticks_ms()
+        ms  = None
+        for eo in active:
+            if (deadline := eo.next_deadline()) is None:
+                continue
+            d = time.ticks_diff(deadline, now)
+            if d <= 0:
+                return 0
+            if (ms is None) or (d < ms):
+                ms = d
+        return ms
+
+    def idle(self):
+        """
+        Idle until the earliest eventoid deadline, bounded by max_idle_ms.
+        Returns immediately if an eventoid is already due or an event is pending.
+        """
+        if len(self._queue):
+            return
+        ring = self._ring
+        if ring is None:
+            ms = self.next_deadline()
+            if ms == 0:
+                return
+            if (ms is None) or (ms > self.max_idle_ms):
+                ms = self.max_idle_ms
+        else:
+            # the poller has the deadlines of its eventoids, just wait for what it sends
+            if len(ring):
+                return
+            ms = self._next_deadline(self._local_eos)
+            if ms == 0:
+                return
+            if (ms is None) or (ms > self.max_idle_ms):
+                ms = self.max_idle_ms
+        self.loop_idle_ms += ms
+
+        if (self.sleep_func is not None) and (ring is None):
+            self.sleep_func(ms)
+            return
+
+        # WFI until the deadline, waking early for any event queued by an ISR (or the poller)
+        queue = self._queue
+        t_end = time.ticks_add(time.ticks_ms(), ms)
+        while (len(queue) == 0) and ((ring is None) or (len(ring) == 0)) and \
+              (time.ticks_diff(t_end, time.ticks_ms()) > 0):
+            machine.idle()
+
+    def post(self, event, event_ms, data=None):
+        """
+        Put an event in the queue for subsequent removal, without allocating anything (so
+        it's safe to call from an ISR).
+        Returns False if the queue was full and the event was dropped.
+        """
+        if (self._poll_ident is not None) and (_thread.get_ident() == self._poll_ident):
+            self._ring_push(event, event_ms, data)
+            return True
+        mask = machine.disable_irq()
+        ok = self._queue.push(event, event_ms, data)
+        machine.enable_irq(mask)
+        if self.wake is not None:
+            self.wake.set()
+        return ok
+
+    def post2(self, event1, event2, event_ms, data=None):
+        """
+        Put two events in the queue inside a single critical section, so that they can't be
+        interleaved with events queued from an ISR.
+        Returns the number of events that were dropped because the queue was full.
+        """
+        if (self._poll_ident is not None) and (_thread.get_ident() == self._poll_ident):
+            self._ring_push(event1, event_ms, data)     # nothing else can write to the ring
+            self._ring_push(event2, event_ms, data)
+            return 0
+        queue = self._queue
+        mask = machine.disable_irq()
+        dropped = 0 if queue.push(event1, event_ms, data) else 1
+        if not queue.push(event2, event_ms, data):
+            dropped += 1
+        machine.enable_irq(mask)
+        if self.wake is not None:
+            self.wake.set()
+        return dropped
+
     def add(self, e):
-        """Put an event in the queue for subsequent removal"""
+        """
+        Put an (event, ticks_ms, data) tuple in the queue for subsequent removal.
+        Returns False if the queue was full and the event was dropped.
+        """
+        if (self._poll_ident is not None) and (_thread.get_ident() == self._poll_ident):
+            (event, event_ms, data) = e
+            self._ring_push(event, event_ms, data)
+            return True
+        mask = machine.disable_irq()
+        ok = self._queue.put(e)
+        machine.enable_irq(mask)
+        if self.wake is not None:
+            self.wake.set()
+        return ok
+
+    def add_many(self, events):
+        """
+        Put several events in the queue inside a single critical section, so that they
+        can't be interleaved with events queued from an ISR.
+        Returns the number of events that were dropped because the queue was full.
+        """
+        if (self._poll_ident is not None) and (_thread.get_ident() == self._poll_ident):
+            for (event, event_ms, data) in events:
+                self._ring_push(event, event_ms, data)
+            return 0
+        dropped = 0
+        queue = self._queue
         mask = machine.disable_irq()
-        self._queue.append(e)
+        for e in events:
+            if not queue.put(e):
+                dropped += 1
         machine.enable_irq(mask)
+        if self.wake is not None:
+            self.wake.set()
+        return dropped
+
+    def _ring_push(self, event, event_ms, data):
+        # poller: rather than drop an event, wait for the dispatcher to make room
+        ring = self._ring
+        if ring.push(event, event_ms, data):
+            return
+        sleep = self.sleep_func or time.sleep_ms
+        while not ring.push(event, event_ms, data):
+            ring.waits += 1
+            sleep(0)
+
+    def _poller(self):
+        self._poll_ident = _thread.get_ident()
+        sleep = self.sleep_func or time.sleep_ms
+        try:
+            while self._poll_running:
+                eos = self._poller_eos
+                self._poll_eos(eos, 1)
+                ms = self._next_deadline(eos)
+                if (ms is None) or (ms > self.POLLER_MAX_IDLE_MS):
+                    ms = self.POLLER_MAX_IDLE_MS
+                if ms:
+                    sleep(ms)
+        finally:
+            self._poll_ident   = None
+            self._poll_stopped = True
+
+    def start_poller(self):
+        """Start polling the eventoids in a new thread (dual_core only).  loop() calls this."""
+        if self._ring is None:
+            raise EventerException("Not in dual-core mode")
+        if self._poll_running:
+            return
+        self._poll_running = True
+        self._poll_stopped = False
+        _thread.start_new_thread(self._poller, ())
+
+    def stop_poller(self):
+        """Ask the poller thread to finish, and wait until it has."""
+        self._poll_running = False
+        while not self._poll_stopped:
+            time.sleep_ms(1)
 
     def next(self):
         """
         Retrieve the next event (Event.*) from the queue of pending events.
-        Returns Event.NONE if the queue is empty.
+        Returns None if the queue is empty.
 
 
         params: none
         """
         mask = machine.disable_irq()        # prevent queue corruption
-        e = self._queue.pop(0) if len(self._queue) else None
+        e = self._queue.get()
         machine.enable_irq(mask)
+        ring = self._ring
+        if (e is None) and (ring is not None) and ((event := ring.pop()) is not None):
+            e = (event, ring.ms, ring.data)
 
         return e
 
+    def queue_stats(self):
+        """
+        Return a dict describing the event queue: its size, the number of events currently
+        pending, the high-water mark and the number of events dropped on overflow.
+        """
+        q = self._queue
+        stats = { "size": q.size, "pending": len(q), "high_water": q.high_water, "overflows": q.overflows }
+        if self._ring is not None:
+            stats["ring_pending"] = len(self._ring)
+            stats["ring_waits"]   = self._ring.waits
+        return stats
+
+    def loop_stats(self):
+        """
+        Return a dict with the number of loop iterations, how many of them dispatched an event,
+        the fraction of iterations that did useful work and the total msecs spent idling.
+        """
+        n = self.loop_iterations
+        return { "iterations": n, "busy": self.loop_busy,
+                 "busy_fraction": (self.loop_busy / n) if n else 0.0,
+                 "idle_ms": self.loop_idle_ms }
+
+    def stats_enable(self, on=True):
+        """Start (afresh) or stop timing polls, handlers and queue residency for stats()."""
+        if on:
+            self._poll_hist      = dict()
+            self._handler_hist   = dict()
+            self._residency_hist = dict()
+        else:
+            self._poll_hist = self._handler_hist = self._residency_hist = None
+        self._queue.stamp_us(on)
+
+    def stats(self):
+        """
+        Return a dict of everything measured since stats_enable(), with each histogram as a
+        dict (see Histogram.as_dict()):
+          polls - {"id:type" of each polled eventoid: poll() durations}
+          handlers - {"STATE/EVENT": handler durations}
+          residency - {"EVENT": usecs from being queued to being dispatched}
+          queue, loop - as from queue_stats() and loop_stats()
+        Returns None if stats aren't enabled.
+        """
+        if self._poll_hist is None:
+            return None
+        state_str = self.state_str or {}
+        event_str = self.event_str or {}
+        ids = { eo: id for (id, eo) in self.eventoids.items() }
+        polls = { str(ids.get(eo))+":"+eo.eo_type: h.as_dict() for (eo, h) in self._poll_hist.items() }
+        handlers = dict()
+        for (state, by_event) in self._handler_hist.items():
+            for (event, h) in by_event.items():
+                handlers[str(state_str.get(state, state))+"/"+str(event_str.get(event, event))] = h.as_dict()
+        residency = { str(event_str.get(event, event)): h.as_dict() for (event, h) in self._residency_hist.items() }
+        return { "polls": polls, "handlers": handlers, "residency": residency,
+                 "queue": self.queue_stats(), "loop": self.loop_stats() }
+
+    def _time_handler(self, state, event, us):
+        if (by_event := self._handler_hist.get(state)) is None:
+            by_event = self._handler_hist[state] = dict()
+        if (h := by_event.get(event)) is None:
+            h = by_event[event] = Histogram()
+        h.add(us)
+
+    def step(self, process_func, state):
+        """
+        Make one pass through the state machine loop: poll, then dispatch at most one event
+        (poll_batch of them with POLL_BATCH), idling until the next eventoid deadline if there was nothing to dispatch.
+        Returns the (possibly new) state.
+        """
+        self.loop_iterations += 1
+        if self._requires_polling:
+            if self._ring is None:
+                self.poll()
+            else:
+                self._poll_eos(self._local_eos, 0)
+
+        busy = self.loop_busy
+        state = self.dispatch_pending(process_func, state)
+        n = self.poll_batch - 1         # POLL_BATCH: the rest of what the pass may have queued
+        while n and (self.loop_busy != busy):
+            b = self.loop_busy
+            state = self.dispatch_pending(process_func, state)
+            if self.loop_busy == b:
+                break
+            n -= 1
+        if self.loop_busy == busy:
+            tracer = self.tracer
+            if (tracer is not None) and (tracer.sink is not None):
+                tracer.flush()
+            self.idle()
+        return state
+
+    def dispatch_pending(self, process_func, state):
+        """
+        Dispatch the next pending event, if there is one, without polling or idling.  Events
+        from the queue go before any from the dual-core ring.  Returns the (possibly new) state.
+        """
+        queue = self._queue
+        mask = machine.disable_irq()        # prevent queue corruption
+        event = queue.pop()
+        machine.enable_irq(mask)
+        source = queue
+        if event is None:
+            if (ring := self._ring) is None:
+                return state
+            if (event := ring.pop()) is None:
+                return state
+            source = ring
+        self.loop_busy += 1
+
+        event_time = source.ms
+        event_data = source.data
+        source.data = None
+        trace = self.trace
+        if trace:
+            event_str = self.event_str
+            if event_str is None:
+                s = str(event)
+            else:
+                s = event_str[event]
+                if s is None: s = str(event)
+
+            print(f"{s}:{event_time}", end="")
+            if event_data is not None:
+                print(f":{event_data}", end="")
+
+        tracer = self.tracer
+        timed  = self._handler_hist is not None
+        if (tracer is None) and not timed:
+            state_new = process_func(state, event, event_time, event_data)
+        else:
+            t0 = time.ticks_us()
+            if timed and (source is queue):
+                if (h := self._residency_hist.get(event)) is None:
+                    h = self._residency_hist[event] = Histogram()
+                h.add(time.ticks_diff(t0, queue.us))
+            state_new = process_func(state, event, event_time, event_data)
+            us = time.ticks_diff(time.ticks_us(), t0)
+            if tracer is not None:
+                tracer.record(event_time, state, event, event_data, state_new, us)
+            if timed:
+                self._time_handler(state, event, us)
+
+        if trace:
+            state_str = self.state_str
+            print(" -> ", end="")
+            if state_str is None:
+                s = str(state_new)
+            else:
+                s = state_str.get(state_new)
+                if s is None: s = str(state_new)
+            print(s)
+        if (state_new != state) and (self._poll_states is not None):
+            self._select_eventoids(state_new)
+        self.state = state_new
+        return state_new
+
     def loop(self, process_func, state):
         """
         Run the state machine in a (infinite) loop.
         process_func - function to process the current (state,event) and returt the new state
-                       [type: state_new = process_func(event, event_msecs, event_data)]
+                       [type: state_new = process_func(state, event, event_msecs, event_data)]
         state - the state in which the state machine starts [type: any]
         """
-        trace     = self.trace
-        state_str = self.state_str
-        event_str = self.event_str
-
         if self.trace:
-            print(state if state_str is None else state_str[state])
-
-        while True:
-            if self.requires_polling():
-                self.poll()
+            print(state if self.state_str is None else self.state_str[state])
 
-            if (e := self.next()) is not None:
-                (event, event_time, event_data) = e
-                if self.trace:
-                    if event_str is None:
-                        s = str(event)
-                    else:
-                        s = event_str[event]
-                        if s is None: s = str(event)
-
-                    print(f"{s}:{event_time}", end="")
-                    if event_data is not None:
-                        print(f":{event_data}", end="")
-
-                state_new = process_func(state, event, event_time, event_data)
-
-                if trace:
-                    print(" -> ", end="")
-                    if state_str is None:
-                        s = str(state_new)
-                    else:
-                        s = state_str.get(state_new)
-                        if s is None: s = str(state_new)
-                    print(s)
-                state = state_new
+        self.state = state
+        self._select_eventoids(state)
+        if self._ring is None:
+            while True:
+                state = self.step(process_func, state)
+        self.start_poller()
+        try:
+            while True:
+                state = self.step(process_func, state)
+        finally:
+            self._poll_running = False      # don't leave the other core polling
 
     def err_bad_event_in_state(self, st, e, data):
         try:
-            e_str = self.event_str[st]
+            e_str = self.event_str[e]
         except:
             e_str = "Event#"+str(e)
         raise StateMachineException("Unrecognized "+e_str+" in "+self.state_str[st])
@@ -0,0 +1,125 @@
+# eventer_async.py -- run an Eventer's state machine under asyncio (uasyncio) instead of loop()
+#
+# Eventer.loop() polls every polled eventoid on each pass and idles in between.  Here, each
+#   polled eventoid gets its own task instead, which polls it and then sleeps until the
+#   eventoid's next_deadline() (or indefinitely, if it has none).  The dispatcher is another
+#   task, which awaits a ThreadSafeFlag that the Eventer sets whenever anything is queued, from
+#   a task or an ISR, and dispatches everything pending with the same
+#   process_func(state, event, event_ms, event_data) as loop().  When nothing is due, all of
+#   the tasks are waiting and the time is spent idle inside the asyncio scheduler.
+#
+# A handler can re-arm an eventoid (e.g. start a timer) that's sleeping with no deadline or a
+#   later one, so after each dispatch every eventoid task is woken to look again.  Unlike
+#   loop(), polls aren't "one and done" -- every eventoid that's due gets polled.  Eventoids
+#   masked in the current state (see Eventer.set_poll_states()) wait for the next dispatch.
+#
+# Other tasks (e.g. the application's own) can run alongside the state machine:
+#     asyncio.create_task(...)
+#     await EventerAsync(eventer).run(state_machine.process, STATE_SLEEP)
+# or, to just replace eventer.loop():
+#     eventer_async.loop(eventer, state_machine.process, STATE_SLEEP)
+
+import time
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+try:
+    ThreadSafeFlag = asyncio.ThreadSafeFlag
+except AttributeError:
+    # CPython's asyncio doesn't have one; on the host, "ISRs" run in the event loop's thread
+    class ThreadSafeFlag:
+        def __init__(self):
+            self._event = asyncio.Event()
+
+        def set(self):
+            self._event.set()
+
+        def clear(self):
+            self._event.clear()
+
+        async def wait(self):
+            await self._event.wait()
+            self._event.clear()
+
+if hasattr(asyncio, "wait_for_ms"):
+    _wait_for_ms = asyncio.wait_for_ms
+else:
+    def _wait_for_ms(awaitable, ms):
+        return asyncio.wait_for(awaitable, ms / 1000)
+
+class EventerAsync:
+    """EventerAsync - asyncio runtime for an Eventer and its registered eventoids."""
+
+    def __init__(self, eventer):
+        """
+        eventer - Eventer with its eventoids already registered
+        """
+        self.eventer     = eventer
+        self.wake        = ThreadSafeFlag()
+        self._kicks      = []           # an asyncio.Event per eventoid task, set after each dispatch
+        self.wakeups     = 0            # times the dispatcher woke up
+        self.poll_wakeups = 0           # times eventoid tasks woke up
+
+    async def _eventoid_task(self, eo, kick):
+        eventer = self.eventer
+        while True:
+            if eventer.is_active(eo):
+                eo.poll()
+                deadline = eo.next_deadline()
+            else:
+                deadline = None         # masked in this state: wait for a dispatch to change it
+            if deadline is None:
+                await kick.wait()
+            else:
+                ms = time.ticks_diff(deadline, time.ticks_ms())
+                if ms <= 0:
+                    await asyncio.sleep(0)      # polled on every pass: let everything else run
+                    continue
+                try:
+                    await _wait_for_ms(kick.wait(), ms)
+                except asyncio.TimeoutError:
+                    pass
+            kick.clear()
+            self.poll_wakeups += 1
+
+    async def _dispatcher(self, process_func, state):
+        eventer = self.eventer
+        kicks   = self._kicks
+        while True:
+            busy = eventer.loop_busy
+            state = eventer.dispatch_pending(process_func, state)
+            if eventer.loop_busy == busy:
+                await self.wake.wait()
+                self.wakeups += 1
+                continue
+            for kick in kicks:          # the handler may have re-armed any of them
+                kick.set()
+            await asyncio.sleep(0)      # let the eventoid tasks look before the next dispatch
+
+    async def run(self, process_func, state):
+        """Run the state machine (forever), with a task polling each polled eventoid."""
+        eventer = self.eventer
+        if eventer.trace:
+            print(state if eventer.state_str is None else eventer.state_str[state])
+        eventer.state = state
+        eventer._select_eventoids(state)
+        eventer.wake  = self.wake
+        tasks = []
+        try:
+            for eo in eventer.eventoids.values():
+                if eo.is_polled():
+                    kick = asyncio.Event()
+                    self._kicks.append(kick)
+                    tasks.append(asyncio.create_task(self._eventoid_task(eo, kick)))
+            await self._dispatcher(process_func, state)
+        finally:
+            eventer.wake = None
+            for task in tasks:
+                task.cancel()
+
+def loop(eventer, process_func, state):
+    """Drop-in replacement for eventer.loop(process_func, state), running under asyncio."""
+    asyncio.run(EventerAsync(eventer).run(process_func, state))
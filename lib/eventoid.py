@@ -3,11 +3,15 @@
 #   1. they get created (first, obviously)
 #   2. they (minimally) communicate with the Eventer to which they're registered
 #   3. they are asked to poll, and report back with True/False if they queued any events
+#   3a. they are asked when they next need to be polled (next_deadline()), so that the Eventer
+#       can idle instead of spinning when nothing can happen for a while
 #   4. TODO: someday they might be asked to clean-up via deinit() if unregistered
 #
 # Written by Eric B. Wertz (eric@edushields.com)
 # Last modified 22-Apr-2022 17:38
 
+import time
+
 class Eventoid:
 
     def __init__(self, eventer, eo_type, requires_polling):
@@ -16,6 +20,10 @@ class Eventoid:
         self._polled  = requires_polling
 
         self.event_queue = None
+        self.starved      = 0            # polling passes that stopped before getting to this one
+        self.starved_max  = 0            # the most of them in a row
+        self._starved_run = 0
+        self._rearm_pending = False      # dual-core: for the poller to rearm() it, see Eventer
 
     def __repr__(self):
         return "type="+self.eo_type+","+str(self._polled)
@@ -29,5 +37,16 @@ class Eventoid:
     # method for subclasses that use require polling rather than solely relying on interrupts
     def poll(self): pass
 
+    # ticks_ms() value at which this eventoid next needs to be polled, or None if it has nothing
+    #   pending (interrupt-driven eventoids only produce events from their ISRs).  By default,
+    #   polled eventoids want to be polled on every pass through the loop.
+    def next_deadline(self):
+        return time.ticks_ms() if self._polled else None
+
+    # called when the Eventer starts polling this eventoid again after a state in which it
+    #   wasn't (see Eventer.set_poll_states()), so that it resyncs with its input rather than
+    #   reporting stale input, or whatever changed while it wasn't being polled, as new events.
+    def rearm(self): pass
+
     # currently unused method for cleaning up when unregistered from the Eventer.
     def deinit(self): pass
@@ -0,0 +1,96 @@
+# eventoid_flowmeter.py -- interrupt-driven event checker for a turbine flow sensor
+#
+# Every pulse from the sensor is counted by a Pin IRQ, so nothing has to sleep or poll to
+#   measure the flow.  start() converts a target volume into an integer number of pulses once,
+#   and the ISR queues the target event on the very pulse that reaches it, so the state
+#   machine hears about it as soon as the dispatcher next runs rather than on the next timer
+#   tick.  Volume and rate are integer reads that never block.
+
+import machine, time
+import eventoid
+
+class EventoidFlowMeter(eventoid.Eventoid):
+    """EventoidFlowMeter - count flow sensor pulses, and generate an event when a target volume is reached."""
+
+    def __init__(self, eventer, event_target, pin, pulses_per_l, rate_window_ms=250, data=None):
+        """
+        EventoidFlowMeter() - eventoid object counting the pulses of a flow sensor using interrupts
+
+        eventer - Eventer maintaining the queue of generated events
+        event_target - event to return when the target set by start() is reached
+        pin - instance of machine.Pin the sensor's pulse output is connected to
+        pulses_per_l - calibration of the sensor, in (rising edge) pulses per litre
+        rate_window_ms - (optional) shortest interval rate_ml_s() averages the flow over
+        data - (optional) data to return with event
+        """
+        super().__init__(eventer, "flowmeter", False)
+
+        self.pin            = pin
+        self.event_target   = event_target
+        self.pulses_per_l   = pulses_per_l
+        self.rate_window_ms = rate_window_ms
+        self.data           = data
+
+        self.pulses  = 0              # pulses counted since start()
+        self.target  = 0              # pulses at which to queue event_target, 0 if not armed
+
+        self._rate_ms     = time.ticks_ms()
+        self._rate_pulses = 0
+        self._rate        = 0
+
+        pin.irq(trigger=machine.Pin.IRQ_RISING, handler=self._isr_pulse)
+
+    def __repr__(self):
+        """ __repr__(): Return printable obj representation"""
+        return super().__repr__() + ",event="+str(self.event_target)+",pulses="+str(self.pulses)+ \
+               ",target="+str(self.target)
+
+    def _isr_pulse(self, pin):
+        n = self.pulses + 1
+        self.pulses = n
+        if n == self.target:
+            self.target = 0
+            self.eventer.post(self.event_target, time.ticks_ms(), self.data)
+
+    def ml_to_pulses(self, ml):
+        """Number of pulses (rounded up) that measure ml millilitres."""
+        return (ml * self.pulses_per_l + 999) // 1000
+
+    def start(self, target_ml=None):
+        """
+        Zero the volume count and, if target_ml is given, arm the event for when that many
+        millilitres have flowed through the sensor.
+        """
+        target = 0 if target_ml is None else max(1, self.ml_to_pulses(target_ml))
+        mask = machine.disable_irq()
+        self.pulses = 0
+        self.target = target
+        machine.enable_irq(mask)
+        self._rate_ms     = time.ticks_ms()
+        self._rate_pulses = 0
+        self._rate        = 0
+
+    def cancel(self):
+        """Disarm the target event (the volume keeps counting)."""
+        self.target = 0
+
+    def armed(self):
+        return self.target != 0
+
+    def volume_ml(self):
+        """Millilitres that have flowed since start()."""
+        return (self.pulses * 1000) // self.pulses_per_l
+
+    def rate_ml_s(self):
+        """
+        Flow rate in ml/s, averaged over at least rate_window_ms.  Calls made sooner than that
+        after the last update return the previous value.
+        """
+        t  = time.ticks_ms()
+        dt = time.ticks_diff(t, self._rate_ms)
+        if dt >= self.rate_window_ms:
+            n = self.pulses
+            self._rate        = ((n - self._rate_pulses) * 1000000) // (self.pulses_per_l * dt)
+            self._rate_pulses = n
+            self._rate_ms     = t
+        return self._rate
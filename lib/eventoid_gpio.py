@@ -1,5 +1,7 @@
 # eventoid_gpio.py -- event checker for a single GPIO input pin.
 #
+# The interrupt-driven one debounces in its ISRs: see EventoidGPIONonPolled.
+#
 # Written by Eric B. Wertz (eric@edushields.com)
 # Last modified 22-Apr-2022 14:35
 
@@ -39,51 +41,90 @@ class EventoidGPIOPolled(eventoid.Eventoid):
         if b != state_prev:
             t = time.ticks_ms()
             if (self.event_rising is not None)  and (b == 1) and (state_prev == 0):
-                self.eventer.add((self.event_rising,  t, self.data))
+                self.eventer.post(self.event_rising,  t, self.data)
                 evented = True
             if (self.event_falling is not None) and (b == 0) and (state_prev == 1):
-                self.eventer.add((self.event_falling, t, self.data))
+                self.eventer.post(self.event_falling, t, self.data)
                 evented = True
 
         self.state_prev = b
         return evented
 
-# FIXME - this eventoid is a work-in-progress.  IT DON'T WORK
 class EventoidGPIONonPolled(eventoid.Eventoid):
-    """EventoidGPIOPolled - generate events for rising/falling edges of a GPIO pin using interrupts."""
+    """EventoidGPIONonPolled - generate debounced events for rising/falling edges of a GPIO pin using interrupts."""
 
-    def __init__(self, eventer, edge_events, pin, data=None):
+    def __init__(self, eventer, edge_events, pin, data=None, lockout_ms=20, timer_id=-1):
         """
-        EventoidGPIOPolled() - eventoid object for detecting rising/falling transitions of a GPIO pin using interrupts
-        
+        EventoidGPIONonPolled() - eventoid object for detecting rising/falling transitions of a GPIO pin using interrupts
+
+        The first edge of a burst starts a lockout, during which the ISR only counts the
+          (bouncing) edges.  Once the pin has been quiet for lockout_ms, its level is read and,
+          if it differs from the last one reported, a single event is queued, time-stamped with
+          the burst's first edge.  A burst that ends where it started (a glitch) queues nothing.
+
         eventer - Eventer maintaining the queue of generated events
         edge_events - tuple of (rising,falling) events to return
         pin - instance of machine.Pin to interrupt-enable
         data - (optional) data to return with event
+        lockout_ms - (optional) how long the pin must be quiet before a burst of edges is over
+        timer_id - (optional) id of the machine.Timer that times the lockout
         """
         super().__init__(eventer, "gpio.non-polled", False)
 
         self.pin = pin
         (self.event_rising, self.event_falling) = edge_events
         self.data = data
+        self.lockout_ms = max(1, lockout_ms)
+
+        self.level      = pin.value()    # last level reported (or the initial one)
+        self.edges      = 0              # every edge the ISR has seen
+        self.suppressed = 0              # edges ignored because a burst was already in progress
+        self.glitches   = 0              # bursts that ended at the level they started from
 
-        mask =  0 if self.event_rising  is None else machine.Pin.IRQ_RISING
-        mask |= 0 if self.event_falling is None else machine.Pin.IRQ_FALLING
+        self._burst   = False
+        self._t_first = 0                # ticks_ms() of the burst's first edge
+        self._t_last  = 0                # ... and of its latest one
+        self._timer   = machine.Timer(timer_id)
+        self._settled_ref = self._isr_settled    # bound once, so the ISRs don't allocate one
 
-        pin.irq(trigger=mask, handler=self._isr_gpio)
+        # both edges, always: the level has to be tracked even if only one of them is evented
+        pin.irq(trigger=machine.Pin.IRQ_RISING | machine.Pin.IRQ_FALLING, handler=self._isr_gpio)
 
     def _isr_gpio(self, pin):
-        g = pin.value()
         t = time.ticks_ms()
+        self.edges += 1
+        if self._burst:
+            self.suppressed += 1
+            self._t_last = t
+            return
+        self._burst   = True
+        self._t_first = t
+        self._t_last  = t
+        self._timer.init(mode=machine.Timer.ONE_SHOT, period=self.lockout_ms, callback=self._settled_ref)
+
+    def _isr_settled(self, timer):
+        quiet = time.ticks_diff(time.ticks_ms(), self._t_last)
+        if quiet < self.lockout_ms:     # still bouncing: wait for the rest of the lockout
+            self._timer.init(mode=machine.Timer.ONE_SHOT, period=self.lockout_ms - quiet,
+                             callback=self._settled_ref)
+            return
+        self._burst = False
+        g = self.pin.value()
+        if g == self.level:
+            self.glitches += 1
+            return
+        self.level = g
 
         if   (g == 0) and (self.event_falling is not None):
-                self.eventer.add((self.event_falling, t, self.data))
+                self.eventer.post(self.event_falling, self._t_first, self.data)
         elif (g == 1) and (self.event_rising is not None):
-                self.eventer.add((self.event_rising,  t, self.data))
+                self.eventer.post(self.event_rising,  self._t_first, self.data)
 
     def __repr__(self):
         """ __repr__(): Return printable obj representation"""
-        return super().__repr__() + ",events=("+str(self.event_rising)+","+str(self.event_falling)+"),pin="+str(Pin)
+        return super().__repr__() + ",events=("+str(self.event_rising)+","+str(self.event_falling)+"),pin="+str(self.pin)+ \
+               ",lockout="+str(self.lockout_ms)
 
-    def poll(self):
-        raise 
+    def deinit(self):
+        self.pin.irq(handler=None)
+        self._timer.deinit()
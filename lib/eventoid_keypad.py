@@ -4,10 +4,15 @@
 #   one keypad press or release at a time, by design.  Multiple (or all, if you have
 #   a friend) keys can be held down simultaneously without issues.
 #
-# Note: to decrease the time spent in any one poll() call, we could poll just the next,
-#       single row at a time and return quicker, but that level of performance/granularity
-#       probably isn't necessary for most applications, given the nature of this device.
-# Note: It probably wouldn't hurt to queue multiple press and release events in one call to poll()
+# Each call to poll() only handles a single row: it reads the columns of the row that was
+#   driven on the previous call, then drives the next row and returns.  The row is given
+#   row_delay_ms to settle before it's read, but that's a deadline rather than a sleep, so a
+#   poll() never blocks.  All of the Pins are created once up-front, and the key state is a
+#   bitmask (bit row*num_cols+col is set while that key is down).
+#
+# With debounce on, a change has to be seen on two consecutive scans of its row before it's
+#   reported.  With a keymap, events carry keymap[row*num_cols+col] (e.g. the key's legend)
+#   rather than (row,col).
 #
 # TODO: Implement and interrupt-driven eventoid that does *almost* the same thing.  It would likely
 #       behave differently as some presses/releases wouldn't be noticed depending on the state of
@@ -18,54 +23,121 @@
 
 from machine import Pin
 import time, eventoid
+from eventer import EventoidException
 
 class EventoidKeypadPolled(eventoid.Eventoid):
-    def __init__(self, eventer, events, pinnums_rows, pinnums_cols, row_delay_ms=35):
+    def __init__(self, eventer, events, pinnums_rows, pinnums_cols, row_delay_ms=35, col_pull=None,
+                 keymap=None, debounce=False):
+        """
+        events - tuple of (press,release) events to return, with (row,col) as their data
+        pinnums_rows, pinnums_cols - GPIO numbers of the row (driven) and column (read) lines
+        row_delay_ms - time to let a row settle after driving it, before reading its columns
+        col_pull - (optional) pull to enable on the column inputs, e.g. Pin.PULL_DOWN
+        keymap - (optional) sequence of num_rows*num_cols key codes, in row-major order, to
+                 return as the event data instead of (row,col)
+        debounce - only report changes seen on two consecutive scans of the row
+        """
         super().__init__(eventer, "keypad", True)
 
         (self.event_press,self.event_release) = events
         self.pinnums_rows = pinnums_rows
         self.pinnums_cols = pinnums_cols
-        self.pins_cols    = [Pin(i, Pin.IN) for i in pinnums_cols]
-        self.row_delay_ms = row_delay_ms
+        self.pins_rows    = [Pin(i, Pin.IN) for i in pinnums_rows]
+        if col_pull is None:
+            self.pins_cols = [Pin(i, Pin.IN) for i in pinnums_cols]
+        else:
+            self.pins_cols = [Pin(i, Pin.IN, col_pull) for i in pinnums_cols]
+        self.row_delay_ms = 0 if row_delay_ms is None else row_delay_ms
+
+        self.num_rows = len(pinnums_rows)
+        self.num_cols = len(pinnums_cols)
+        self.keys     = 0                 # bitmask of keys currently down
+        self.keymap   = None if keymap is None else tuple(keymap)
+        self.debounce = debounce
+        self._pending = 0                 # bitmask of changes seen once, awaiting confirmation
+        self._quiet_rows = 0              # rows left to scan silently after rearm()
+        if (self.keymap is not None) and (len(self.keymap) != self.num_rows*self.num_cols):
+            raise EventoidException("keymap needs "+str(self.num_rows*self.num_cols)+" entries")
+        # event data for each key, made up-front so that poll() doesn't allocate any
+        if self.keymap is None:
+            self._codes = tuple((row,col) for row in range(self.num_rows) for col in range(self.num_cols))
+        else:
+            self._codes = self.keymap
 
-        self.prev_state   = []
-        for i in range(len(self.pinnums_rows)):
-            cols = [0 for i in pinnums_cols]
-            self.prev_state.append(cols)
+        self._row     = 0
+        self._settle  = time.ticks_add(time.ticks_ms(), self.row_delay_ms)
+        self.pins_rows[0].init(Pin.OUT, value=1)
 
     def __repr__(self):
         return super().__repr__()+\
                ",events="+str((self.event_press,self.event_release))+",rows="+\
                str(self.pinnums_rows)+",cols="+str(self.pinnums_cols)
 
+    def is_down(self, row, col):
+        return bool(self.keys & (1 << (row*self.num_cols + col)))
+
     def poll(self):
-        _ = [Pin(n, Pin.IN) for n in self.pinnums_rows]
-        pins_cols = self.pins_cols
+        t = time.ticks_ms()
+        if time.ticks_diff(t, self._settle) < 0:
+            return False
+
+        row      = self._row
+        num_cols = self.num_cols
+        pins     = self.pins_cols
+        shift    = row * num_cols
+
+        bits = 0
+        for col in range(num_cols):
+            if pins[col].value():                   # 1=pressed, 0=unpressed
+                bits |= 1 << col
+        changed = bits ^ ((self.keys >> shift) & ((1 << num_cols) - 1))
 
-        evented = False
-        for (row,row_pinnum) in enumerate(self.pinnums_rows):
-            Pin(row_pinnum, Pin.OUT, value=1)
-            for (col, pinobj) in enumerate(pins_cols):
-                val = pinobj.value()                   # 0=pressed, 1=unpressed
-                if val == self.prev_state[row][col]:   # no change from prev scan, skip
-                    continue
+        if self._quiet_rows:
+            # resyncing after rearm(): take the row as it is, without reporting it
+            self.keys    ^= changed << shift
+            self._pending &= ~(((1 << num_cols) - 1) << shift)
+            changed = 0
+        elif self.debounce:
+            # a change only counts if it was also seen on the previous scan of this row
+            row_mask = ((1 << num_cols) - 1) << shift
+            seen     = (self._pending >> shift) & ((1 << num_cols) - 1)
+            self._pending = (self._pending & ~row_mask) | (changed << shift)
+            changed &= seen
 
-                if (self.event_press is not None) and (val == 1):
-                        self.eventer.add((self.event_press, time.ticks_ms(), (row,col)))
-                        evented = True
-                elif (self.event_release is not None) and (val == 0):
-                        self.eventer.add((self.event_release, time.ticks_ms(), (row,col)))
-                        evented = True
+        if changed:
+            # report the first change only; the row stays driven so the next poll() picks up the rest
+            col = 0
+            while not (changed & (1 << col)):
+                col += 1
+            bit = 1 << (shift + col)
+            self.keys ^= bit
+            self._pending &= ~bit
+            if self.keys & bit:
+                e = self.event_press
+            else:
+                e = self.event_release
+            if e is not None:
+                self.eventer.post(e, t, self._codes[shift + col])
+                return True
+            if changed & ~(1 << col):
+                return False
 
-                self.prev_state[row][col] = val
+        # on to the next row
+        rows = self.pins_rows
+        rows[row].init(Pin.IN)
+        row += 1
+        if row == self.num_rows:
+            row = 0
+        rows[row].init(Pin.OUT, value=1)
+        self._row    = row
+        self._settle = time.ticks_add(t, self.row_delay_ms)
+        if self._quiet_rows:
+            self._quiet_rows -= 1
+        return False
 
-                if evented:
-                    break
-            Pin(row_pinnum, Pin.IN)
-            if evented:
-                break
-            if self.row_delay_ms is not None:
-                time.sleep_ms(self.row_delay_ms)
+    def rearm(self):
+        # keys pressed or released while unpolled aren't news: spend one full scan catching up
+        self._quiet_rows = self.num_rows
 
-        return evented
+    def next_deadline(self):
+        return self._settle
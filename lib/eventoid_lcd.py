@@ -0,0 +1,242 @@
+# eventoid_lcd.py -- write-behind framebuffer for HD44780 character LCDs
+#
+# Every LcdApi call goes straight out over I2C as several transactions per byte, and clear()
+#   also stalls for milliseconds, so redrawing a screen from a state machine handler is slow
+#   even when only a digit changed.  This eventoid stands in for the LcdApi object: the
+#   program writes to a shadow copy of the display as often as it likes, and the Eventer polls
+#   the eventoid to bring the real display up to date.  Only the cells that differ are sent,
+#   consecutive cells share one cursor move (the display auto-increments), clear() just blanks
+#   the shadow copy (the display's own, slow, clear command is only used when blanking it
+#   would take fewer bytes than rewriting the old text with spaces), and the cursor, display
+#   and backlight settings are only sent when they change.  Updates are rate-limited to one
+#   pass every interval_ms and at most cells_per_poll cells are sent per poll(), so a full
+#   redraw doesn't hog the loop.
+#
+# The eventoid never queues any events, so it doesn't take a turn away from other eventoids.
+
+import time, eventoid
+
+class EventoidLcdFramebuffer(eventoid.Eventoid):
+    """EventoidLcdFramebuffer - LcdApi look-alike that redraws only the changed cells of the display."""
+
+    def __init__(self, eventer, lcd, num_lines, num_columns, interval_ms=50, cells_per_poll=20,
+                 use_clear=True):
+        """
+        eventer - Eventer polling this eventoid
+        lcd - the LcdApi (e.g. pico_i2c_lcd.I2cLcd) of the display, freshly initialized/cleared
+        num_lines, num_columns - size of the display
+        interval_ms - (optional) minimum time between the starts of two update passes
+        cells_per_poll - (optional) maximum number of cells to send per poll()
+        use_clear - (optional) allow the display's clear command (which stalls for a few msecs)
+                    when it saves sending enough cells
+        """
+        super().__init__(eventer, "lcd.framebuffer", True)
+
+        self.lcd            = lcd
+        self.num_lines      = num_lines
+        self.num_columns    = num_columns
+        self.interval_ms    = interval_ms
+        self.cells_per_poll = cells_per_poll
+        self.use_clear      = use_clear
+
+        n = num_lines * num_columns
+        self._want    = bytearray(b" " * n)     # what the program has written
+        self._have    = bytearray(b" " * n)     # what's on the display
+        self._dirty   = False
+        self._next    = 0                       # where the current update pass has got to
+        self._due     = time.ticks_ms()         # when the next update pass may start
+        self._hw      = 0                       # cell the display's cursor is on, -1 if unknown
+
+        self.cursor_x = 0                       # where the next character will be written
+        self.cursor_y = 0
+        self._ctrl_want  = lcd.LCD_ON_CTRL | lcd.LCD_ON_DISPLAY
+        self._ctrl_have  = self._ctrl_want
+        self._light_want = True
+        self._light_have = True
+
+        self.cells_sent  = 0                    # totals, for seeing what the framebuffer saves
+        self.moves_sent  = 0
+        self.clears_sent = 0
+
+    def __repr__(self):
+        return super().__repr__()+",size="+str((self.num_columns, self.num_lines))+",dirty="+str(self._dirty)
+
+    def _touch(self, i):
+        self._dirty = True
+        if i < self._next:
+            self._next = i
+
+    def invalidate(self):
+        """Forget what's on the display (e.g. after it has been written to directly), so it's all redrawn."""
+        for i in range(len(self._have)):
+            self._have[i] = 0
+        self._hw = -1
+        self._touch(0)
+
+    # The subset of LcdApi used by programs
+
+    def clear(self):
+        want = self._want
+        for i in range(len(want)):
+            want[i] = 0x20
+        self.cursor_x = 0
+        self.cursor_y = 0
+        self._touch(0)
+
+    def move_to(self, cursor_x, cursor_y):
+        self.cursor_x = cursor_x
+        self.cursor_y = cursor_y
+        self._dirty = True              # the cursor may need to be moved on the display
+
+    def putchar(self, char):
+        if char == "\n":
+            self.cursor_x = self.num_columns
+        else:
+            i = self.cursor_y * self.num_columns + self.cursor_x
+            c = ord(char)
+            if self._want[i] != c:
+                self._want[i] = c
+                self._touch(i)
+            self.cursor_x += 1
+        if self.cursor_x >= self.num_columns:
+            self.cursor_x = 0
+            self.cursor_y += 1
+            if self.cursor_y >= self.num_lines:
+                self.cursor_y = 0
+        self._dirty = True
+
+    def putstr(self, string):
+        for char in string:
+            self.putchar(char)
+
+    def _set_ctrl(self, ctrl):
+        if ctrl != self._ctrl_want:
+            self._ctrl_want = ctrl
+            self._dirty = True
+
+    def show_cursor(self):
+        lcd = self.lcd
+        self._set_ctrl(lcd.LCD_ON_CTRL | lcd.LCD_ON_DISPLAY | lcd.LCD_ON_CURSOR)
+
+    def hide_cursor(self):
+        lcd = self.lcd
+        self._set_ctrl(lcd.LCD_ON_CTRL | lcd.LCD_ON_DISPLAY)
+
+    def blink_cursor_on(self):
+        lcd = self.lcd
+        self._set_ctrl(lcd.LCD_ON_CTRL | lcd.LCD_ON_DISPLAY | lcd.LCD_ON_CURSOR | lcd.LCD_ON_BLINK)
+
+    def blink_cursor_off(self):
+        lcd = self.lcd
+        self._set_ctrl(lcd.LCD_ON_CTRL | lcd.LCD_ON_DISPLAY | lcd.LCD_ON_CURSOR)
+
+    def display_on(self):
+        lcd = self.lcd
+        self._set_ctrl(lcd.LCD_ON_CTRL | lcd.LCD_ON_DISPLAY)
+
+    def display_off(self):
+        self._set_ctrl(self.lcd.LCD_ON_CTRL)
+
+    def backlight_on(self):
+        self._light_want = True
+        self._dirty = True
+
+    def backlight_off(self):
+        self._light_want = False
+        self._dirty = True
+
+    # Bringing the display up to date
+
+    def flush(self, max_cells=None):
+        """
+        Send (up to max_cells of) the differences to the display, regardless of the rate limit.
+        Returns True once the display is up to date.
+        """
+        lcd  = self.lcd
+        want = self._want
+        have = self._have
+        cols = self.num_columns
+        n    = len(want)
+        hw   = self._hw
+        i    = self._next
+
+        if (i == 0) and self.use_clear:
+            # clearing costs two commands, then only the non-blank cells need sending
+            changed = 0
+            text    = 0
+            for j in range(n):
+                c = want[j]
+                if c != have[j]:
+                    changed += 1
+                if c != 0x20:
+                    text += 1
+            if text + 2 < changed:
+                lcd.clear()
+                for j in range(n):
+                    have[j] = 0x20
+                hw = 0
+                self.clears_sent += 1
+
+        while i < n:
+            c = want[i]
+            if c == have[i]:
+                i += 1
+                continue
+            if max_cells is not None:
+                if max_cells == 0:
+                    break
+                max_cells -= 1
+            if i != hw:
+                lcd.move_to(i % cols, i // cols)
+                self.moves_sent += 1
+            lcd.hal_write_data(c)
+            have[i] = c
+            self.cells_sent += 1
+            i += 1
+            # the display's address doesn't run on into the next visible line
+            hw = -1 if (i % cols) == 0 else i
+        self._hw   = hw
+        self._next = i
+        if i < n:
+            return False
+
+        if self._light_want != self._light_have:
+            if self._light_want:
+                lcd.backlight_on()
+            else:
+                lcd.backlight_off()
+            self._light_have = self._light_want
+
+        ctrl = self._ctrl_want
+        if ctrl & lcd.LCD_ON_CURSOR:
+            # a visible cursor has to be where the next character will go
+            cursor = self.cursor_y * cols + self.cursor_x
+            if cursor != hw:
+                lcd.move_to(self.cursor_x, self.cursor_y)
+                self.moves_sent += 1
+                self._hw = cursor
+        if ctrl != self._ctrl_have:
+            lcd.hal_write_command(ctrl)
+            self._ctrl_have = ctrl
+
+        self._next  = 0
+        self._dirty = False
+        return True
+
+    def poll(self):
+        if not self._dirty:
+            return False
+        if self._next == 0:                 # starting a new pass
+            t = time.ticks_ms()
+            if time.ticks_diff(t, self._due) < 0:
+                return False
+            self._due = time.ticks_add(t, self.interval_ms)
+        self.flush(self.cells_per_poll)
+        return False
+
+    def next_deadline(self):
+        if not self._dirty:
+            return None
+        if self._next != 0:                 # part way through a pass
+            return time.ticks_ms()
+        return self._due
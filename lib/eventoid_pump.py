@@ -0,0 +1,150 @@
+# eventoid_pump.py -- closed-loop PWM control of a pump dispensing a target volume
+#
+# Switching a pump straight off at the target volume always overshoots: the water that's
+#   already moving (and the motor coasting down) keeps going through the flow sensor for a
+#   while afterwards.  This eventoid drives the pump's MOSFET with PWM and samples the flow
+#   meter every period_ms.  It runs at full duty for the bulk of the fill, then tapers the duty
+#   down over the last taper_ml so the flow is slow when it's cut, and cuts it early by the
+#   volume it predicts will still come through: the measured flow rate times the pump's lag.
+#   The lag is learned: after each fill, the volume that came through after the cut is
+#   measured and folded into the estimate, so the next fill stops closer to the target.
+#
+# All of the control arithmetic is in integer flow meter pulses and msecs.
+
+import time, eventoid
+
+PUMP_IDLE     = 0
+PUMP_RUNNING  = 1
+PUMP_COASTING = 2               # switched off, measuring what still comes through
+
+class EventoidPumpControl(eventoid.Eventoid):
+    """EventoidPumpControl - dispense a target volume through a flow meter with a PWM-driven pump."""
+
+    def __init__(self, eventer, event_done, pwm, flowmeter, period_ms=10, taper_ml=20,
+                 duty_min=0x4000, duty_max=0xffff, lag_ms=50, coast_ms=500, rate_window_ms=100,
+                 data=None):
+        """
+        eventer - Eventer maintaining the queue of generated events
+        event_done - event to return when the pump has been switched off at the target
+        pwm - instance of machine.PWM driving the pump
+        flowmeter - EventoidFlowMeter measuring the pump's output
+        period_ms - (optional) time between control updates
+        taper_ml - (optional) volume over which the duty is ramped down before the target
+        duty_min, duty_max - (optional) duty_u16 at the end of the taper, and for the bulk of the fill
+        lag_ms - (optional) initial estimate of how long the flow keeps going after the pump is cut
+        coast_ms - (optional) how long to keep measuring after the cut, to learn the lag
+        rate_window_ms - (optional) the flow rate is measured over this long (a few pulses at least)
+        data - (optional) data to return with event
+        """
+        super().__init__(eventer, "pump", True)
+
+        self.event_done = event_done
+        self.pwm        = pwm
+        self.flowmeter  = flowmeter
+        self.period_ms  = period_ms
+        self.taper_p    = flowmeter.ml_to_pulses(taper_ml)
+        self.duty_min   = duty_min
+        self.duty_max   = duty_max
+        self.lag_ms     = lag_ms
+        self.coast_ms   = coast_ms
+        self.rate_window_ms = rate_window_ms
+        self.data       = data
+
+        self.state      = PUMP_IDLE
+        self.fills      = 0             # fills that the lag has been learned from
+        self.overshoot_p = 0            # pulses past the target on the last learned fill
+
+        self._target_p  = 0
+        self._duty      = 0
+        self._next      = None          # ticks_ms() of the next control update
+        self._last_ms   = 0
+        self._last_p    = 0
+        self._rate_pps  = 0             # flow rate over the last rate_window_ms, pulses/s
+        self._stop_p    = 0
+        self._stop_pps  = 0
+        self._stop_ms   = 0
+        pwm.duty_u16(0)
+
+    def __repr__(self):
+        return super().__repr__()+",state="+str(self.state)+",lag_ms="+str(self.lag_ms)+",fills="+str(self.fills)
+
+    def _set_duty(self, duty):
+        if duty != self._duty:
+            self._duty = duty
+            self.pwm.duty_u16(duty)
+
+    def start(self, target_ml):
+        """Zero the flow meter and start pumping target_ml."""
+        t = time.ticks_ms()
+        self.flowmeter.start()
+        self._target_p = self.flowmeter.ml_to_pulses(target_ml)
+        self._last_ms  = t
+        self._last_p   = 0
+        self._rate_pps = 0
+        self._next     = time.ticks_add(t, self.period_ms)
+        self.state     = PUMP_RUNNING
+        self._set_duty(self.duty_max)
+
+    def stop(self):
+        """Switch the pump off now (e.g. the vessel was taken away).  Nothing is learned from it."""
+        self._set_duty(0)
+        if self.state == PUMP_RUNNING:
+            self.state = PUMP_IDLE
+            self._next = None
+
+    def running(self):
+        return self.state == PUMP_RUNNING
+
+    def _control(self, t):
+        n  = self.flowmeter.pulses
+        dt = time.ticks_diff(t, self._last_ms)
+        if dt >= self.rate_window_ms:
+            self._rate_pps = (n - self._last_p) * 1000 // dt
+            self._last_ms  = t
+            self._last_p   = n
+
+        # what will still come through if the pump is cut before the next update
+        coast_p   = self._rate_pps * (self.lag_ms + (self.period_ms >> 1)) // 1000
+        remaining = self._target_p - n - coast_p
+        if remaining <= 0:
+            self._set_duty(0)
+            self._stop_p   = n
+            self._stop_pps = self._rate_pps
+            self._stop_ms  = t
+            self.state     = PUMP_COASTING
+            self._next     = time.ticks_add(t, self.coast_ms)
+            self.eventer.post(self.event_done, t, self.data)
+            return True
+
+        if remaining >= self.taper_p:
+            duty = self.duty_max
+        else:
+            duty = self.duty_min + (self.duty_max - self.duty_min) * remaining // self.taper_p
+        self._set_duty(duty)
+        self._next = time.ticks_add(t, self.period_ms)
+        return False
+
+    def _learn(self):
+        coasted_p = self.flowmeter.pulses - self._stop_p
+        self.overshoot_p = self.flowmeter.pulses - self._target_p
+        if self._stop_pps > 0:
+            # the lag that would have predicted this fill's coast exactly
+            lag_ms = coasted_p * 1000 // self._stop_pps - (self.period_ms >> 1)
+            self.lag_ms += (max(lag_ms, 0) - self.lag_ms) >> 1
+            self.fills += 1
+        self.state = PUMP_IDLE
+        self._next = None
+
+    def poll(self):
+        if self._next is None:
+            return False
+        t = time.ticks_ms()
+        if time.ticks_diff(t, self._next) < 0:
+            return False
+        if self.state == PUMP_RUNNING:
+            return self._control(t)
+        self._learn()
+        return False
+
+    def next_deadline(self):
+        return self._next
@@ -0,0 +1,114 @@
+# eventoid_settle.py -- event checker for an object coming to rest in front of an ultrasonic sensor
+#
+# Rather than waiting a fixed time after something arrives for it to stop moving, this
+#   eventoid watches the range readings and generates its event as soon as they have stayed
+#   within band_mm of each other for window_ms.  It doesn't range by itself (the sensor is
+#   already being polled by a zone eventoid): it's the last stage of that eventoid's
+#   mm_filter chain (see usonic_filter), so it sees every reading, and passes them on as-is.
+#
+# If the readings haven't settled max_ms after arm(), it settles for less: the event is
+#   generated once they have stayed within the looser max_band_mm for window_ms.  Either way
+#   the latest reading has to be within zone_mm, so something that's being taken away (or a
+#   reading of the floor behind it) never counts as settled.  Readings outside the zone
+#   restart both runs.  Everything is decided as a reading arrives: if the sensor stops
+#   returning any, nothing is known about the vessel, and no event is generated.
+#
+# Tracking a run of steady readings only needs its start time and min/max, so each reading
+#   costs a few comparisons and nothing is allocated.
+
+import time, eventoid
+
+class EventoidUsonicSettle(eventoid.Eventoid):
+    """EventoidUsonicSettle - generate an event once ultrasonic readings stop changing."""
+
+    def __init__(self, eventer, event, window_ms=300, band_mm=10, max_ms=None, max_band_mm=None,
+                 zone_mm=None, data=None):
+        """
+        eventer - Eventer maintaining the queue of generated events
+        event - event to return once the readings have settled
+        window_ms - how long the readings have to stay within the band
+        band_mm - how far apart the readings in the window may be
+        max_ms - (optional) stop waiting for band_mm this long after arm(), and settle for max_band_mm
+        max_band_mm - how far apart the readings in the window may be after max_ms, 2*band_mm if None
+        zone_mm - (optional) readings further away than this are never settled
+        data - (optional) data to return with event
+        """
+        super().__init__(eventer, "usonic.settle", False)
+
+        self.event     = event
+        self.window_ms = window_ms
+        self.band_mm   = band_mm
+        self.max_ms    = max_ms
+        self.max_band_mm = (2 * band_mm) if max_band_mm is None else max_band_mm
+        self.zone_mm   = zone_mm
+        self.data      = data
+
+        self._armed    = False
+        self._armed_ms = 0
+        self.reset()
+
+    def __repr__(self):
+        return super().__repr__()+",event="+str(self.event)+",window="+str(self.window_ms)+\
+               ",band="+str(self.band_mm)+",armed="+str(self._armed)
+
+    def arm(self):
+        """Generate the event the next time the readings have been steady for window_ms."""
+        self._armed    = True
+        self._armed_ms = time.ticks_ms()
+
+    def disarm(self):
+        self._armed = False
+
+    def armed(self):
+        return self._armed
+
+    def settled_ms(self):
+        """How long the readings have been steady for, or 0 if there are none."""
+        if self._start_ms is None:
+            return 0
+        return time.ticks_diff(time.ticks_ms(), self._start_ms)
+
+    # usonic_filter stage interface
+
+    def reset(self):
+        self._start_ms = None           # when the current run of steady readings began
+        self._min      = 0
+        self._max      = 0
+        self._loose_start_ms = None     # ditto, within max_band_mm
+        self._loose_min      = 0
+        self._loose_max      = 0
+
+    def update(self, mm):
+        t = time.ticks_ms()
+        if (self.zone_mm is not None) and (mm > self.zone_mm):
+            # out of the zone: nothing to settle
+            self.reset()
+            return mm
+
+        if (self._start_ms is None) or (mm < self._max - self.band_mm) or (mm > self._min + self.band_mm):
+            # moved: start a new run from this reading
+            self._start_ms = t
+            self._min      = mm
+            self._max      = mm
+        elif mm < self._min:
+            self._min = mm
+        elif mm > self._max:
+            self._max = mm
+
+        if (self._loose_start_ms is None) or (mm < self._loose_max - self.max_band_mm) or \
+           (mm > self._loose_min + self.max_band_mm):
+            self._loose_start_ms = t
+            self._loose_min      = mm
+            self._loose_max      = mm
+        elif mm < self._loose_min:
+            self._loose_min = mm
+        elif mm > self._loose_max:
+            self._loose_max = mm
+
+        if self._armed:
+            if (time.ticks_diff(t, self._start_ms) >= self.window_ms) or \
+               ((self.max_ms is not None) and (time.ticks_diff(t, self._armed_ms) >= self.max_ms) and
+                (time.ticks_diff(t, self._loose_start_ms) >= self.window_ms)):
+                self._armed = False
+                self.eventer.post(self.event, t, self.data)
+        return mm
@@ -0,0 +1,102 @@
+# eventoid_speaker.py -- non-blocking tone sequencer for a PWM speaker/buzzer
+#
+# Beeps used to be played by setting the PWM and sleeping inside state machine handlers,
+#   which stops everything else for as long as the beep lasts.  This eventoid plays named
+#   patterns of (freq, duty_u16, ms) steps instead: play() loads the steps into a small,
+#   preallocated queue and starts the first one, and the Eventer polls the eventoid at each
+#   step's deadline to move on to the next one.  The eventoid never queues any events.
+
+from array import array
+import time, eventoid
+from eventer import EventoidException
+
+class EventoidSpeaker(eventoid.Eventoid):
+    """EventoidSpeaker - play patterns of tones on a PWM output without blocking."""
+
+    def __init__(self, eventer, pwm, patterns, max_steps=8):
+        """
+        eventer - Eventer polling this eventoid
+        pwm - instance of machine.PWM driving the speaker
+        patterns - dict mapping each pattern's name to a sequence of (freq, duty_u16, ms) steps
+                   (a duty of 0 is a rest)
+        max_steps - (optional) number of steps that can be queued at once
+        """
+        super().__init__(eventer, "speaker", True)
+
+        self.pwm       = pwm
+        self.max_steps = max_steps
+        self.patterns  = dict()
+        for (name, steps) in patterns.items():
+            if not 0 < len(steps) <= max_steps:
+                raise EventoidException("Pattern "+str(name)+" needs 1 to "+str(max_steps)+" steps")
+            self.patterns[name] = tuple(tuple(step) for step in steps)
+
+        self._freq  = array("H", [0] * max_steps)
+        self._duty  = array("H", [0] * max_steps)
+        self._ms    = array("H", [0] * max_steps)
+        self._head  = 0                 # index of the step being played
+        self._count = 0                 # steps queued, including the one being played
+        self._end   = None              # ticks_ms() at which the current step ends
+
+    def __repr__(self):
+        return super().__repr__()+",patterns="+str(tuple(self.patterns))+",queued="+str(self._count)
+
+    def playing(self):
+        return self._count != 0
+
+    def play(self, name, queue=False):
+        """
+        Start playing the named pattern, cutting off whatever is playing, or with queue=True,
+        after whatever is already queued (steps that don't fit are dropped).
+        """
+        steps = self.patterns[name]
+        if not queue:
+            self._count = 0
+        size  = self.max_steps
+        start = self._count == 0
+        for (freq, duty, ms) in steps:
+            if self._count == size:
+                break
+            i = self._head + self._count
+            if i >= size:
+                i -= size
+            self._freq[i] = freq
+            self._duty[i] = duty
+            self._ms[i]   = ms
+            self._count  += 1
+        if start:
+            self._start(time.ticks_ms())
+
+    def stop(self):
+        """Silence the speaker and forget any queued steps."""
+        self._count = 0
+        self._end   = None
+        self.pwm.duty_u16(0)
+
+    def _start(self, t):
+        i = self._head
+        duty = self._duty[i]
+        if duty:
+            self.pwm.freq(self._freq[i])
+        self.pwm.duty_u16(duty)
+        self._end = time.ticks_add(t, self._ms[i])
+
+    def poll(self):
+        if self._end is None:
+            return False
+        t = time.ticks_ms()
+        if time.ticks_diff(t, self._end) < 0:
+            return False
+
+        i = self._head + 1
+        self._head   = 0 if i == self.max_steps else i
+        self._count -= 1
+        if self._count:
+            self._start(t)
+        else:
+            self._end = None
+            self.pwm.duty_u16(0)
+        return False
+
+    def next_deadline(self):
+        return self._end
@@ -1,24 +1,138 @@
 # Eventoid_timer.py -- event checker for a (restartable) timer
 #
+# Lots of timers can share one EventoidTimerService, which keeps them in a min-heap ordered
+#   by expiration.  Only the service is polled, and it only ever checks the earliest timer,
+#   so the cost of a poll doesn't grow with the number of timers, and start()/cancel() are
+#   O(log n).  Expirations are compared with ticks_diff() so the heap survives ticks wraparound
+#   (as long as no timer is set further than half the ticks period into the future).
+#
+# EventoidTimerNonPolled doesn't need polling at all: each one has its own machine.Timer,
+#   whose callback queues the event from the IRQ without allocating.
+#
 # Written by Eric B. Wertz (eric@edushields.com)
 # Last modified 19-Apr-2022 13:17
 
-from machine import Pin
-import time, eventoid
+import machine, time, eventoid
 
 class ExceptionTimerIncomplete(Exception):
     pass
 
+class EventoidTimerService(eventoid.Eventoid):
+    """EventoidTimerService - shared scheduler for EventoidTimerPolled timers created with service=."""
+
+    def __init__(self, eventer):
+        super().__init__(eventer, "timer.service", True)
+
+        self._heap = []      # timers ordered by expiration, each knows its own _heap_index
+
+    def __repr__(self):
+        return super().__repr__() + ",timers="+str(len(self._heap))
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, tmr):
+        """(Re)insert a timer whose expiration has just been set."""
+        if tmr._heap_index < 0:
+            i = len(self._heap)
+            self._heap.append(tmr)
+            tmr._heap_index = i
+            self._sift_up(i)
+        else:
+            i = tmr._heap_index
+            self._sift_up(i)
+            self._sift_down(tmr._heap_index)
+
+    def unschedule(self, tmr):
+        """Remove a timer, if it is scheduled."""
+        i = tmr._heap_index
+        if i < 0:
+            return
+        heap = self._heap
+        last = heap.pop()
+        tmr._heap_index = -1
+        if last is not tmr:
+            heap[i] = last
+            last._heap_index = i
+            self._sift_up(i)
+            self._sift_down(last._heap_index)
+
+    def _sift_up(self, i):
+        heap = self._heap
+        tmr  = heap[i]
+        exp  = tmr.expiration
+        while i > 0:
+            parent = (i - 1) >> 1
+            p = heap[parent]
+            if time.ticks_diff(exp, p.expiration) >= 0:
+                break
+            heap[i] = p
+            p._heap_index = i
+            i = parent
+        heap[i] = tmr
+        tmr._heap_index = i
+
+    def _sift_down(self, i):
+        heap = self._heap
+        n    = len(heap)
+        tmr  = heap[i]
+        exp  = tmr.expiration
+        while True:
+            child = 2*i + 1
+            if child >= n:
+                break
+            c = heap[child]
+            if child + 1 < n:
+                c2 = heap[child + 1]
+                if time.ticks_diff(c2.expiration, c.expiration) < 0:
+                    child += 1
+                    c = c2
+            if time.ticks_diff(c.expiration, exp) >= 0:
+                break
+            heap[i] = c
+            c._heap_index = i
+            i = child
+        heap[i] = tmr
+        tmr._heap_index = i
+
+    def poll(self):
+        """Queue the event for the earliest timer, if it has expired (one and done)."""
+        heap = self._heap
+        if not heap:
+            return False
+        tmr = heap[0]
+        t = time.ticks_ms()
+        if time.ticks_diff(t, tmr.expiration) < 0:
+            return False
+
+        self.eventer.post(tmr.event, t, tmr.data)
+        if tmr.periodic:
+            tmr.expiration = time.ticks_add(t, tmr.period_ms)
+            self._sift_down(0)
+        else:
+            self.unschedule(tmr)
+            tmr.expiration = None
+        return True
+
+    def next_deadline(self):
+        return self._heap[0].expiration if self._heap else None
+
 class EventoidTimerPolled(eventoid.Eventoid):
-    def __init__(self, eventer, event, periodic=False, period_ms=None, data=None):
-        super().__init__(eventer, "timer.polled", True)
+    def __init__(self, eventer, event, periodic=False, period_ms=None, data=None, service=None):
+        """
+        service - (optional) EventoidTimerService that schedules this timer.  Such timers
+                  aren't polled themselves; only the (registered) service is.
+        """
+        super().__init__(eventer, "timer.polled", service is None)
 
         self.event     = event
         self.periodic  = periodic
         self.period_ms = period_ms
         self.data      = data
+        self.service   = service
 
-        self.expiration = None
+        self.expiration  = None
+        self._heap_index = -1
 
     def __repr__(self):
         return super().__repr__() + ",event="+str(self.event)+",periodic="+str(self.periodic)+",ms="+str(self.period_ms)+\
@@ -34,22 +148,36 @@ class EventoidTimerPolled(eventoid.Eventoid):
         if data is not None:
             self.data = data
         self.expiration = time.ticks_add(time.ticks_ms(), msecs)
+        if self.service is not None:
+            self.service.schedule(self)
 
     def cancel(self):
+        if self.service is not None:
+            self.service.unschedule(self)
         self.expiration = None
 
     def poll(self):
-        if self.expiration is not None:
+        if (self.expiration is not None) and (self.service is None):
             t = time.ticks_ms()
             if time.ticks_diff(t, self.expiration) >= 0:
-                self.eventer.add((self.event, t, self.data))
+                self.eventer.post(self.event, t, self.data)
                 self.expiration = time.ticks_add(t, self.period_ms) if self.periodic else None
                 return True
         return False
 
-# FIXME - this eventoid is a work-in-progress.  IT DON'T WORK
+    def next_deadline(self):
+        return self.expiration if self.service is None else None
+
 class EventoidTimerNonPolled(eventoid.Eventoid):
-    def __init__(self, eventer, event, periodic=False, period_ms=None, data=None):
+    """
+    EventoidTimerNonPolled - timer on a machine.Timer, whose callback queues the event.  Never
+    polled, so it costs nothing until it goes off.  Same interface as EventoidTimerPolled.
+    """
+
+    def __init__(self, eventer, event, periodic=False, period_ms=None, data=None, timer_id=-1):
+        """
+        timer_id - (optional) id of the machine.Timer to use (-1 is a virtual one)
+        """
         super().__init__(eventer, "timer.non-polled", False)
 
         self.event     = event
@@ -57,23 +185,44 @@ class EventoidTimerNonPolled(eventoid.Eventoid):
         self.period_ms = period_ms
         self.data      = data
 
-        self.timer     = None
+        self.expiration = None
+        self.timer      = machine.Timer(timer_id)
+        self._isr_ref   = self._isr_timer   # bound once, so start() doesn't allocate one
 
     def __repr__(self):
         return super().__repr__() + ",event="+str(self.event)+",periodic="+str(self.periodic)+",ms="+str(self.period_ms)+\
-               ","+("" if self.data is None else "data="+str(self.data))
+               ",exp="+str(self.expiration)+("" if self.data is None else "data="+str(self.data))
 
-    def start(self, msecs=None, data=None):
-        """Set an (optionally periodic) timer at which time(s) an event is generated"""
+    def _isr_timer(self, timer):
+        t   = time.ticks_ms()
+        exp = self.expiration
+        # a callback from before a cancel() or restart can still be on its way: only an
+        #   expiration that has actually come counts
+        if (exp is None) or (time.ticks_diff(t, exp) < 0):
+            return
+        if self.periodic:
+            self.expiration = time.ticks_add(exp, self.period_ms)
+        else:
+            self.expiration = None
+        self.eventer.post(self.event, t, self.data)
 
-        if self.timer is None:
-            self.timer = machine.Timer(period=msecs,
-                                       mode=(machine.Timer.PERIODIC if self.periodic else machine.Timer.ONE_SHOT),
-                                       callback=self._isr_timer)
+    def start(self, msecs=None, data=None):
+        """Set an (optionally periodic) timer at which time(s) an event is generated, restarting it if running"""
+        if msecs is None:
+            if self.period_ms is None: raise ExceptionTimerIncomplete
+            msecs = self.period_ms
         else:
-            raise EventerTimerInUseException()
-        
+            self.period_ms = msecs
+
+        if data is not None:
+            self.data = data
+        self.expiration = time.ticks_add(time.ticks_ms(), msecs)
+        self.timer.init(mode=(machine.Timer.PERIODIC if self.periodic else machine.Timer.ONE_SHOT),
+                        period=msecs, callback=self._isr_ref)
+
     def cancel(self):
-        if self.timer is not None:
-            self.timer.deinit()
-            self.timer = None
+        self.timer.deinit()
+        self.expiration = None
+
+    def deinit(self):
+        self.cancel()
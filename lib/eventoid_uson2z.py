@@ -1,7 +1,9 @@
 # EventoidUsonic2Zone.py -- event checker for two zone-thresholded ultrasonic sensor:
 #
 # NB: The worst-case time that it takes to poll using this eventoid is the time that it takes
-#     for the ranging function to time-out and finally give up.
+#     for the ranging function to time-out and finally give up -- unless usonic is a split-phase
+#     driver like usonic_irq.HCSR04Irq, whose range_mm() returns None until a new measurement
+#     is ready and never blocks.
 #
 # Written by Eric B. Wertz (eric@edushields.com)
 # Last modified 18-Apr-2022 12:24
@@ -14,7 +16,15 @@ USONIC_2ZONES_OUTER = 1
 USONIC_2ZONES_INNER = 0
 
 class EventoidUsonic2ZonesPolled(eventoid.Eventoid):
-    def __init__(self, eventer, usonic, range_window, zones, hysteresis_mm, debug):
+    def __init__(self, eventer, usonic, range_window, zones, hysteresis_mm, debug, interval_ms=None,
+                 mm_filter=None):
+        """
+        interval_ms - (optional) minimum time between ranging attempts.  The HC-SR04 wants ~60ms
+                      between pings anyways, and this lets the Eventer idle in between.
+                      None means range on every poll.
+        mm_filter - (optional) filter (see usonic_filter) that in-range readings go through before
+                    they're classified into zones
+        """
         super().__init__(eventer, "uson2z", True)
 
         self.usonic = usonic
@@ -23,10 +33,16 @@ class EventoidUsonic2ZonesPolled(eventoid.Eventoid):
         (self.mm_boundary_inner, self.events_inner) = zones[1]
         self.mm_hysteresis = hysteresis_mm
         self.debug         = debug
+        self.interval_ms   = interval_ms
+        self.mm_filter     = mm_filter
+        self.next_ranging  = time.ticks_ms()
+        self._usonic_deadline = getattr(usonic, "next_deadline", None)   # split-phase drivers only
+        self._usonic_discard  = getattr(usonic, "discard", None)
 
         if debug:
             self.mm_last = range_window[1] + hysteresis_mm + 1  # just into FAR
         self.zone_last = USONIC_2ZONES_FAR
+        self.mm        = None           # last filtered reading that was classified
 
     def __repr__(self):
         return super().__repr__() +\
@@ -34,11 +50,15 @@ class EventoidUsonic2ZonesPolled(eventoid.Eventoid):
                ",hyst="+str(self.hysteresis_mm+","+str(debug))
 
     def _usonic_get_zone(self):
-        mm = self.usonic.range_mm()
+        if (mm := self.usonic.range_mm()) is None:    # split-phase driver, nothing new yet
+            return None
 
         if (mm < self.mm_min) or (mm > self.mm_max):  # toss all "unreliable" values
             return None
 
+        if (self.mm_filter is not None) and ((mm := self.mm_filter.update(mm)) is None):
+            return None
+
         if self.debug is not None:  # only print if enabled and movement above threshold
             if abs(mm - self.mm_last) > self.debug:
                 print(mm, "mm")
@@ -62,32 +82,57 @@ class EventoidUsonic2ZonesPolled(eventoid.Eventoid):
             elif mm > mm_outer:             ret_zone = USONIC_2ZONES_FAR
             else:                           ret_zone = USONIC_2ZONES_OUTER
 
-        return (ret_zone, mm)
+        self.mm = mm                # returned separately so that polling doesn't allocate a tuple
+        return ret_zone
+
+    def rearm(self):
+        # level-triggered: start again from far, so that something already in range when
+        #   nobody was listening is reported as arriving with the first fresh reading
+        self.zone_last = USONIC_2ZONES_FAR
+        if self._usonic_discard is not None:
+            self._usonic_discard()
+        if self.mm_filter is not None:
+            self.mm_filter.reset()
+
+    def next_deadline(self):
+        if self.interval_ms is not None:
+            return self.next_ranging
+        if self._usonic_deadline is not None:
+            return self._usonic_deadline()
+        return time.ticks_ms()
 
     # TODO/FIXME: there's an ugly division of labor between this function and _usonic_get_zone
     #   that could use some cleaning-up
     # Note: it takes about 15ms to call _usonic_get_zone(), so this will block for that long
     def poll(self):
+        if self.interval_ms is not None:
+            t = time.ticks_ms()
+            if time.ticks_diff(t, self.next_ranging) < 0: return False
+            self.next_ranging = time.ticks_add(t, self.interval_ms)
+
         if (z := self._usonic_get_zone()) is None: return False
-        z,mm = z
+        mm = self.mm
         if z == (zone_last := self.zone_last): return False
 
         t = time.ticks_ms()
         evented = False
 
+        # jumps across both boundaries queue their two events in one critical section
         if zone_last == USONIC_2ZONES_FAR:
-            self.eventer.add((self.events_outer[0], t, mm))
             if z == USONIC_2ZONES_INNER:
-                self.eventer.add((self.events_inner[0], t, mm))
+                self.eventer.post2(self.events_outer[0], self.events_inner[0], t, mm)
+            else:
+                self.eventer.post(self.events_outer[0], t, mm)
         elif zone_last == USONIC_2ZONES_OUTER:
             if z == USONIC_2ZONES_FAR:
-                self.eventer.add((self.events_outer[1], t, mm))
+                self.eventer.post(self.events_outer[1], t, mm)
             else:
-                self.eventer.add((self.events_inner[0], t, mm))
+                self.eventer.post(self.events_inner[0], t, mm)
         else: # zone_last == USONIC_2ZONES_INNER
-            self.eventer.add((self.events_inner[1], t, mm))
             if z == USONIC_2ZONES_FAR:
-                self.eventer.add((self.events_outer[1], t, mm))
+                self.eventer.post2(self.events_inner[1], self.events_outer[1], t, mm)
+            else:
+                self.eventer.post(self.events_inner[1], t, mm)
 
         self.zone_last = z
         return True
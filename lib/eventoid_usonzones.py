@@ -0,0 +1,175 @@
+# eventoid_usonzones.py -- event checker for an ultrasonic sensor's readings against any number of zones
+#
+# The generalisation of EventoidUsonic2ZonesPolled: N boundaries split the distance into N+1
+#   zones, numbered from 0 (closest, inside every boundary) to N (beyond them all, "far").
+#   Each boundary has an (entering, exiting) pair of events, for readings crossing it towards
+#   and away from the sensor, so the same eventoid can sense a vessel being present (one
+#   boundary) or how full it is (one boundary per level).
+#
+# The hysteresis is applied by having two thresholds per boundary, precomputed into sorted
+#   arrays when the eventoid is made: a reading has to get hysteresis_mm inside a boundary to
+#   cross it inwards, and more than hysteresis_mm outside it to cross it outwards.  Most readings stay
+#   in the zone they were in, which the precomputed band of each zone answers with two
+#   comparisons; otherwise, the new zone is a binary search of each array, so a reading costs
+#   O(log N) comparisons whatever the number of zones, and nothing is allocated.  A jump across several boundaries queues the events of
+#   every one crossed, in order, in one critical section.
+#
+# NB: as with EventoidUsonic2ZonesPolled, polling can block for as long as the ranging takes,
+#     unless usonic is a split-phase driver like usonic_irq.HCSR04Irq.
+
+from array import array
+import machine, time, eventoid
+from eventer import EventoidException
+
+_MM_NONE_LO = const(-0x3FFFFFFF)  # further than any reading, for the zones with no boundary on one side
+_MM_NONE_HI = const(0x3FFFFFFF)
+
+def _bisect_left(a, x):
+    # index of the first element of the sorted a that's >= x
+    lo = 0
+    hi = len(a)
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if a[mid] < x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+class EventoidUsonicZonesPolled(eventoid.Eventoid):
+    """EventoidUsonicZonesPolled - generate events as ultrasonic readings cross any number of zone boundaries."""
+
+    def __init__(self, eventer, usonic, range_window, zones, hysteresis_mm, debug=None, interval_ms=None,
+                 mm_filter=None):
+        """
+        eventer - Eventer maintaining the queue of generated events
+        usonic - ranger with range_mm(), e.g. usonic_irq.HCSR04Irq
+        range_window - (min,max) mm outside of which readings are tossed as unreliable
+        zones - sequence of (boundary_mm, (entering_event, exiting_event)), in any order.
+                Either event may be None.  The data of each event is the reading in mm.
+        hysteresis_mm - how far past a boundary a reading has to be to cross it
+        debug - (optional) print readings that moved more than this many mm, or None
+        interval_ms - (optional) minimum time between ranging attempts, None to range on every poll
+        mm_filter - (optional) filter (see usonic_filter) that in-range readings go through before
+                    they're classified into zones
+        """
+        super().__init__(eventer, "usonzones", True)
+
+        zones = sorted(zones, key=lambda z: z[0])
+        for i in range(1, len(zones)):
+            if zones[i][0] - zones[i-1][0] <= 2 * hysteresis_mm:
+                raise EventoidException("zone boundaries "+str(zones[i-1][0])+" and "+str(zones[i][0])+
+                                        " overlap with hysteresis "+str(hysteresis_mm))
+
+        self.usonic = usonic
+        (self.mm_min, self.mm_max) = range_window
+        self.boundaries    = tuple(b for (b, _) in zones)
+        self.events_enter  = tuple(e[0] for (_, e) in zones)
+        self.events_exit   = tuple(e[1] for (_, e) in zones)
+        self.mm_hysteresis = hysteresis_mm
+        self._down = array("i", [b - hysteresis_mm for b in self.boundaries])   # cross inwards below these...
+        self._up   = array("i", [b + hysteresis_mm for b in self.boundaries])   # ...and outwards above these
+        # readings above _stay_lo[z], up to _stay_hi[z], leave something in zone z where it is
+        self._stay_lo = array("i", [_MM_NONE_LO] + list(self._down))
+        self._stay_hi = array("i", list(self._up) + [_MM_NONE_HI])
+        self.debug         = debug
+        self.interval_ms   = interval_ms
+        self.mm_filter     = mm_filter
+        self.next_ranging  = time.ticks_ms()
+        self._usonic_deadline = getattr(usonic, "next_deadline", None)   # split-phase drivers only
+        self._usonic_discard  = getattr(usonic, "discard", None)
+
+        self.zone_far  = len(zones)
+        self.zone_last = self.zone_far
+        self.mm        = None           # last filtered reading that was classified
+        self.mm_last   = self.mm_max + hysteresis_mm + 1   # just into far, for debug
+
+    def __repr__(self):
+        return super().__repr__() +\
+               ",range="+str((self.mm_min, self.mm_max))+",zones="+str(self.boundaries)+\
+               ",hyst="+str(self.mm_hysteresis)+",zone="+str(self.zone_last)
+
+    def classify(self, mm, zone):
+        """Return the zone that reading mm puts something in, given that it was in zone."""
+        if self._stay_lo[zone] < mm <= self._stay_hi[zone]:
+            return zone
+        z = _bisect_left(self._down, mm)        # boundaries it's not (far enough) inside of
+        if z < zone:
+            return z
+        z = _bisect_left(self._up, mm)          # boundaries it's (far enough) outside of
+        if z > zone:
+            return z
+        return zone
+
+    def _usonic_get_zone(self):
+        if (mm := self.usonic.range_mm()) is None:    # split-phase driver, nothing new yet
+            return None
+
+        if (mm < self.mm_min) or (mm > self.mm_max):  # toss all "unreliable" values
+            return None
+
+        if (self.mm_filter is not None) and ((mm := self.mm_filter.update(mm)) is None):
+            return None
+
+        if self.debug is not None:  # only print if enabled and movement above threshold
+            if abs(mm - self.mm_last) > self.debug:
+                print(mm, "mm")
+            self.mm_last = mm
+
+        self.mm = mm                # returned separately so that polling doesn't allocate a tuple
+        zone = self.zone_last
+        if self._stay_lo[zone] < mm <= self._stay_hi[zone]:
+            return zone
+        return self.classify(mm, zone)
+
+    def rearm(self):
+        # level-triggered: start again from far, so that something already in range when
+        #   nobody was listening is reported as arriving with the first fresh reading
+        self.zone_last = self.zone_far
+        if self._usonic_discard is not None:
+            self._usonic_discard()
+        if self.mm_filter is not None:
+            self.mm_filter.reset()
+
+    def next_deadline(self):
+        if self.interval_ms is not None:
+            return self.next_ranging
+        if self._usonic_deadline is not None:
+            return self._usonic_deadline()
+        return time.ticks_ms()
+
+    def poll(self):
+        if self.interval_ms is not None:
+            t = time.ticks_ms()
+            if time.ticks_diff(t, self.next_ranging) < 0: return False
+            self.next_ranging = time.ticks_add(t, self.interval_ms)
+
+        if (z := self._usonic_get_zone()) is None: return False
+        if z == (zone_last := self.zone_last): return False
+
+        t  = time.ticks_ms()
+        mm = self.mm
+        evented = False
+
+        # every boundary crossed, nearest the old zone first, in one critical section
+        mask = machine.disable_irq()
+        if z < zone_last:
+            events = self.events_enter
+            i = zone_last - 1
+            while i >= z:
+                if (e := events[i]) is not None:
+                    self.eventer.post(e, t, mm)
+                    evented = True
+                i -= 1
+        else:
+            events = self.events_exit
+            i = zone_last
+            while i < z:
+                if (e := events[i]) is not None:
+                    self.eventer.post(e, t, mm)
+                    evented = True
+                i += 1
+        machine.enable_irq(mask)
+
+        self.zone_last = z
+        return evented
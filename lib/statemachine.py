@@ -0,0 +1,141 @@
+# statemachine.py -- table-driven state machine runtime for use with the Eventer
+#
+# Rather than a hand-written if/elif chain over every state and event, the state machine
+#   is described by a table of (state, event, handler, next_state) transitions.  The table
+#   is checked when the StateMachine is built (every (state,event) pair has to be covered,
+#   either explicitly or by a default handler) and compiled into a tuple of rows, one per
+#   state, indexed by event, so dispatching an event is O(1) no matter how many states and
+#   events there are.  Every slot of the rows is filled (those with no transition with an
+#   entry that raises), so process() doesn't need to check them.  StateMachine.process() has the same signature as the process_func
+#   that Eventer.loop() expects.
+#
+# States and events must be small non-negative integers (e.g. const()s numbered from 0).  A state
+#   or event that's too big raises StateMachineException; a negative one isn't checked for.
+
+from eventer import StateMachineException
+
+class StateMachine:
+    """
+    Table-driven state machine.  Each transition is a tuple of:
+        (state, event, handler, next_state)
+    handler - None, or function called as handler(state, event, event_ms, event_data)
+    next_state - the state to move to after the handler runs, or a tuple of the states it
+                 may return (for transitions whose outcome is decided at run-time), or None
+                 if the handler never returns (e.g. it raises) or its outcome isn't declared
+    """
+
+    def __init__(self, transitions, state_str, event_str, default=None):
+        """
+        transitions - iterable of (state, event, handler, next_state) tuples
+        state_str - dict mapping every state to its name; its keys define the set of states
+        event_str - dict mapping every event to its name; its keys define the set of events
+        default - (optional) handler for every (state,event) pair not in the transitions.  Its
+                  return value is the next state.  If None, any uncovered pair is an error.
+        """
+        self.state_str = state_str
+        self.event_str = event_str
+
+        for v in list(state_str) + list(event_str):
+            if (not isinstance(v, int)) or (v < 0):
+                raise StateMachineException("States and events must be non-negative ints: "+str(v))
+
+        self.num_states = max(state_str) + 1
+        self.num_events = max(event_str) + 1
+        self.transitions = tuple(transitions)
+
+        table = [None] * (self.num_states * self.num_events)
+        for (state, event, handler, state_next) in self.transitions:
+            if state not in state_str:
+                raise StateMachineException("Unknown state in transition: "+str(state))
+            if event not in event_str:
+                raise StateMachineException("Unknown event in transition: "+str(event))
+            if isinstance(state_next, tuple):
+                for s in state_next:
+                    if s not in state_str:
+                        raise StateMachineException("Unknown next state in transition: "+str(s))
+                if handler is None:
+                    raise StateMachineException("Transition to any of several states needs a handler: "+
+                                                self._pair_str(state, event))
+            elif (state_next is not None) and (state_next not in state_str):
+                raise StateMachineException("Unknown next state in transition: "+str(state_next))
+            if (handler is None) and (state_next is None):
+                raise StateMachineException("Transition needs a handler or a next state: "+self._pair_str(state, event))
+
+            i = state*self.num_events + event
+            if table[i] is not None:
+                raise StateMachineException("Duplicate transition for "+self._pair_str(state, event))
+            # a handler that picks the next state is left to return it, whatever was declared
+            table[i] = (handler, None if isinstance(state_next, tuple) else state_next)
+
+        missing = self.missing(table)
+        if missing:
+            if default is None:
+                raise StateMachineException("Uncovered (state,event) pairs: "+
+                                            ", ".join([self._pair_str(s, e) for (s, e) in missing]))
+            for (state, event) in missing:
+                table[state*self.num_events + event] = (default, None)
+
+        self._table = table
+        no_transition = (self._no_transition, None)
+        self._rows = tuple(tuple(entry or no_transition for entry in table[s*self.num_events:(s+1)*self.num_events])
+                           for s in range(self.num_states))
+
+    def _pair_str(self, state, event):
+        return "("+self.state_str.get(state, str(state))+","+self.event_str.get(event, str(event))+")"
+
+    def missing(self, table=None):
+        """Return a list of the (state,event) pairs that have no explicit transition."""
+        if table is None:
+            table = [None] * len(self._table)
+            for (state, event, handler, state_next) in self.transitions:
+                table[state*self.num_events + event] = True
+        return [(s, e) for s in self.state_str for e in self.event_str
+                if table[s*self.num_events + e] is None]
+
+    def _no_transition(self, state, event, event_ms, event_data):
+        raise StateMachineException("No transition for "+self._pair_str(state, event))
+
+    def process(self, state, event, event_ms, event_data):
+        """Perform the transition for (state,event) and return the next state."""
+        try:
+            (handler, state_next) = self._rows[state][event]
+        except IndexError:
+            self._no_transition(state, event, event_ms, event_data)
+        if handler is not None:
+            state_ret = handler(state, event, event_ms, event_data)
+            if state_next is None:
+                return state_ret
+        return state_next
+
+    def to_dot(self, name="StateMachine", self_loops=False, error_handler=None):
+        """
+        Return the transition table as a Graphviz DOT graph, e.g. to regenerate the state
+        diagram with:  dot -Tpng -o StateDiagram.png
+        self_loops - also draw transitions that neither run a handler nor change the state
+        error_handler - (optional) handler of the pairs that should never happen, whose
+                        transitions aren't drawn
+        """
+        lines = ["digraph "+name+" {", "    rankdir=LR;", "    node [shape=box, style=rounded];"]
+        for (state, s) in self.state_str.items():
+            lines.append('    "'+s+'";')
+        for (state, event, handler, state_next) in self.transitions:
+            if (handler is None) and (state_next == state) and not self_loops:
+                continue
+            if (handler is not None) and (handler is error_handler):
+                continue
+            label = self.event_str[event]
+            if handler is not None:
+                label += "\\n/ "+getattr(handler, "__name__", "handler")+"()"
+            if state_next is None:
+                # decided at run-time by the handler, and not declared
+                lines.append('    "'+self.state_str[state]+'" -> "?" [label="'+label+'", style=dashed];')
+            elif isinstance(state_next, tuple):
+                # one of these, decided at run-time by the handler
+                for s in state_next:
+                    lines.append('    "'+self.state_str[state]+'" -> "'+self.state_str[s]+
+                                 '" [label="'+label+'", style=dashed];')
+            else:
+                lines.append('    "'+self.state_str[state]+'" -> "'+self.state_str[state_next]+
+                             '" [label="'+label+'"];')
+        lines.append("}")
+        return "\n".join(lines) + "\n"
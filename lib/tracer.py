@@ -0,0 +1,138 @@
+# tracer.py -- binary trace recorder for the Eventer's dispatch loop
+#
+# Printing a line per event over the USB serial console takes msecs per event, which is
+#   enough to change the timing of the very things that need tracing.  TraceRecorder instead
+#   packs one fixed-size record per dispatched event (when it was queued, the state it was
+#   dispatched in, the event, its data, the state it left the machine in and how long the
+#   handler took) into a ring buffer allocated up-front, which costs a few usecs and nothing
+#   on the heap.  The ring keeps the most recent records, like a flight recorder, until they
+#   are dumped on demand with dump(); or, given a sink (e.g. a file on flash), whole blocks of
+#   records are written out from the loop's idle time with flush().
+#
+# Dumps are a sequence of chunks, each a CHUNK_FMT header followed by its records, oldest
+#   first.  Records are numbered from 0 since the recorder was created, so gaps left by
+#   records that were overwritten before being written out show up when decoding.  The
+#   tools/trace_decode.py script turns dumps back into text, CSV or Chrome trace JSON.
+#
+# States and events must be ints that fit in 16 bits.  Event data is recorded if it's an
+#   int (that fits in 32 bits) or a single character (e.g. a key), otherwise only the fact
+#   that there was some is.
+
+import struct
+
+CHUNK_MAGIC   = b"EVTR"
+CHUNK_VERSION = 1
+CHUNK_FMT     = "<4sHHII"           # magic, version, record size, first record number, records
+CHUNK_SIZE    = struct.calcsize(CHUNK_FMT)
+
+RECORD_FMT    = "<IIiHHHH"          # ticks_ms, handler us, data, state, new state, event, flags
+RECORD_SIZE   = struct.calcsize(RECORD_FMT)
+
+# flags: what the record's data field holds
+DATA_NONE  = 0
+DATA_INT   = 1
+DATA_CHAR  = 2                      # ord() of a single character
+DATA_OTHER = 3                      # there was data, but it wasn't recorded
+
+class TraceRecorder:
+    """
+    Fixed-capacity ring buffer of dispatch records.  record() never allocates, so it's cheap
+    enough to leave on in production.
+    """
+
+    def __init__(self, size=128, sink=None, block=32):
+        """
+        size - number of records kept [type: int]
+        sink - (optional) stream with a write() method (e.g. a file opened "wb") that flush()
+               writes blocks of records to.  If None, records are only written by dump().
+        block - (optional) number of records flush() writes to the sink at a time [type: int]
+        """
+        self.size     = size
+        self.sink     = sink
+        self.block    = min(block, size)
+        self.enabled  = True
+        self.recorded = 0               # records ever made; the next one's number
+        self.lost     = 0               # records overwritten before flush() could write them
+        self._buf     = bytearray(size * RECORD_SIZE)
+        self._mv      = memoryview(self._buf)
+        self._head    = 0               # slot the next record goes in
+        self._count   = 0               # records held
+        self._unsent  = 0               # records held that flush() hasn't written yet
+        self._hdr     = bytearray(CHUNK_SIZE)
+
+    def __len__(self):
+        return self._count
+
+    def record(self, event_ms, state, event, data, state_new, handler_us):
+        """Record the dispatch of one event, overwriting the oldest record if the ring is full."""
+        if not self.enabled:
+            return
+        if data is None:
+            flags = DATA_NONE
+            d = 0
+        elif isinstance(data, int) and -0x80000000 <= data <= 0x7fffffff:
+            flags = DATA_INT
+            d = data
+        elif isinstance(data, str) and len(data) == 1:
+            flags = DATA_CHAR
+            d = ord(data)
+        else:
+            flags = DATA_OTHER
+            d = 0
+
+        i = self._head
+        struct.pack_into(RECORD_FMT, self._buf, i * RECORD_SIZE,
+                         event_ms, handler_us, d, state, state_new, event, flags)
+        i += 1
+        self._head = 0 if i == self.size else i
+        if self._count < self.size:
+            self._count += 1
+        self.recorded += 1
+        if self.sink is not None:
+            if self._unsent == self.size:
+                self.lost += 1
+            else:
+                self._unsent += 1
+
+    def clear(self):
+        self._count  = 0
+        self._unsent = 0
+
+    def _write(self, stream, held, n):
+        # write n records as one chunk, starting from the one held records back from the newest
+        first = self._head - held
+        if first < 0:
+            first += self.size
+        struct.pack_into(CHUNK_FMT, self._hdr, 0, CHUNK_MAGIC, CHUNK_VERSION, RECORD_SIZE,
+                         self.recorded - held, n)
+        stream.write(self._hdr)
+        end = first + n
+        if end <= self.size:
+            stream.write(self._mv[first * RECORD_SIZE:end * RECORD_SIZE])
+        else:
+            stream.write(self._mv[first * RECORD_SIZE:])
+            stream.write(self._mv[:(end - self.size) * RECORD_SIZE])
+
+    def dump(self, stream):
+        """
+        Write all of the records held to stream as one chunk, oldest first.  The records are
+        kept, so a later dump includes them again.  Returns the number of records written.
+        """
+        n = self._count
+        self._write(stream, n, n)
+        return n
+
+    def flush(self, force=False):
+        """
+        Write the records not yet written to the sink, in chunks of block records.  Unless
+        force is True, a partial block is left for next time.  Returns the number written.
+        """
+        if self.sink is None:
+            return 0
+        written = 0
+        while self._unsent and (force or self._unsent >= self.block):
+            n = min(self._unsent, self.block)
+            self._write(self.sink, self._unsent, n)
+            self._unsent -= n
+            written += n
+        return written
@@ -0,0 +1,111 @@
+# usonic_filter.py -- fixed-memory filters for cleaning up ultrasonic range readings
+#
+# Spurious echoes show up as single wild readings, which are enough to flip a zone and
+#   queue an enter/exit event.  These filters sit between the ranging driver and the zone
+#   classifier of an ultrasonic eventoid.  Each stage has update(mm), which returns the
+#   filtered value or None if the sample should be ignored, and reset().  All storage is
+#   allocated up-front, so nothing is allocated per sample.
+
+from array import array
+
+class MedianFilter:
+    """Rolling median over the last `window` samples (odd windows work best)."""
+
+    def __init__(self, window=5):
+        self.window  = window
+        self._ring   = array("i", [0] * window)    # samples in arrival order
+        self._sorted = array("i", [0] * window)    # the same samples, sorted
+        self._next   = 0
+        self._count  = 0
+
+    def reset(self):
+        self._next  = 0
+        self._count = 0
+
+    def update(self, mm):
+        ring   = self._ring
+        srt    = self._sorted
+        n      = self._count
+        if n == self.window:
+            # drop the oldest sample from the sorted copy
+            old = ring[self._next]
+            i = 0
+            while srt[i] != old:
+                i += 1
+            while i < n - 1:
+                srt[i] = srt[i + 1]
+                i += 1
+            n -= 1
+        # insertion sort the new sample in
+        i = n
+        while (i > 0) and (srt[i - 1] > mm):
+            srt[i] = srt[i - 1]
+            i -= 1
+        srt[i] = mm
+        n += 1
+
+        ring[self._next] = mm
+        self._next = (self._next + 1) % self.window
+        self._count = n
+        return srt[n >> 1]
+
+class EmaFilter:
+    """Integer exponential moving average with a weight of 1/2**shift for each new sample."""
+
+    def __init__(self, shift=2):
+        self.shift = shift
+        self._acc  = None      # average, scaled up by 2**shift
+
+    def reset(self):
+        self._acc = None
+
+    def update(self, mm):
+        shift = self.shift
+        if self._acc is None:
+            self._acc = mm << shift
+        else:
+            self._acc += mm - (self._acc >> shift)
+        return self._acc >> shift
+
+class OutlierReject:
+    """
+    Drop samples more than max_step_mm away from the last accepted one.  If max_rejects
+    samples in a row are dropped, the reading really has moved, so it's accepted.
+    """
+
+    def __init__(self, max_step_mm=200, max_rejects=2):
+        self.max_step_mm = max_step_mm
+        self.max_rejects = max_rejects
+        self.rejected    = 0        # total samples rejected
+        self._last       = None
+        self._run        = 0
+
+    def reset(self):
+        self._last = None
+        self._run  = 0
+
+    def update(self, mm):
+        last = self._last
+        if (last is not None) and (abs(mm - last) > self.max_step_mm) and (self._run < self.max_rejects):
+            self._run += 1
+            self.rejected += 1
+            return None
+        self._last = mm
+        self._run  = 0
+        return mm
+
+class FilterChain:
+    """Runs a sample through each stage in turn, stopping if any stage drops it."""
+
+    def __init__(self, *stages):
+        self.stages = stages
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def update(self, mm):
+        for stage in self.stages:
+            if (mm := stage.update(mm)) is None:
+                return None
+        return mm
@@ -0,0 +1,84 @@
+# usonic_irq.py -- split-phase, interrupt-timed driver for HC-SR04 ultrasonic rangers
+#
+# A drop-in for the blocking hc_sr04_edushields driver as far as the ultrasonic eventoids
+#   are concerned, except that range_mm() never waits for the echo: it fires a trigger pulse
+#   and returns, and the echo's rising and falling edges are timestamped by a Pin IRQ.  A
+#   later call to range_mm() returns the measurement once it's complete, so a poll costs a
+#   few microseconds instead of the ~15ms (or the whole timeout) of the blocking driver.
+
+from machine import Pin
+import time
+
+US_PER_MM_X100 = const(582)       # round trip time of sound is 5.82us/mm
+
+class HCSR04Irq:
+
+    def __init__(self, trigger_pin, echo_pin, interval_ms=60, timeout_us=30000):
+        """
+        trigger_pin, echo_pin - GPIO numbers of the TRIG and ECHO lines
+        interval_ms - minimum time between pings (the HC-SR04 wants >= 60ms)
+        timeout_us - give up on a ping whose echo hasn't ended after this long
+        """
+        self.trigger     = Pin(trigger_pin, Pin.OUT, value=0)
+        self.echo        = Pin(echo_pin, Pin.IN)
+        self.interval_ms = interval_ms
+        self.timeout_ms  = (timeout_us + 999) // 1000
+
+        self._t_trigger  = time.ticks_ms()   # when the ping in flight was sent
+        self._in_flight  = False
+        self._t_rise     = 0
+        self._width_us   = -1
+        self._ready      = False
+
+        self.echo.irq(trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, handler=self._isr_echo)
+
+    def _isr_echo(self, pin):
+        t = time.ticks_us()
+        if pin.value():
+            self._t_rise = t
+        elif self._in_flight:
+            self._width_us  = time.ticks_diff(t, self._t_rise)
+            self._ready     = True
+            self._in_flight = False
+
+    def _ping(self, t):
+        self._ready     = False
+        self._in_flight = True
+        self._t_trigger = t
+        self.trigger.value(1)
+        time.sleep_us(10)
+        self.trigger.value(0)
+
+    def range_mm(self):
+        """
+        Non-blocking: return the distance in mm if a measurement has completed since the last
+        call, -1 if the last ping timed out, or None if there's nothing new yet.  Sends the
+        next ping when the previous one is done and interval_ms has passed.
+        """
+        if self._ready:
+            self._ready = False
+            return (self._width_us * 100) // US_PER_MM_X100
+
+        t = time.ticks_ms()
+        if self._in_flight:
+            if time.ticks_diff(t, self._t_trigger) < self.timeout_ms:
+                return None
+            self._in_flight = False
+            return -1
+
+        if time.ticks_diff(t, self._t_trigger) >= self.interval_ms:
+            self._ping(t)
+        return None
+
+    def discard(self):
+        """Drop any measurement that's ready or in flight, e.g. one taken a while ago."""
+        self._in_flight = False
+        self._ready     = False
+
+    def next_deadline(self):
+        """ticks_ms() value at which range_mm() next has something to do."""
+        if self._ready:
+            return time.ticks_ms()
+        if self._in_flight:
+            return time.ticks_add(self._t_trigger, self.timeout_ms)
+        return time.ticks_add(self._t_trigger, self.interval_ms)
@@ -0,0 +1,15 @@
+# sim -- host-side simulator for the eventer library and the HydroHomie firmware
+#
+# Provides fake machine/micropython/time modules running on a virtual clock, models of the
+#   dispenser's peripherals, and a runner for the unmodified firmware.  Typical use:
+#
+#     import sim
+#     s = sim.install()                # before importing anything from lib/
+#     from eventer import Eventer
+#     ...
+#     s.clock.advance(250000)         # let 250ms of simulated time pass
+#
+# or, for the whole dispenser, see sim.hydrohomie.
+
+from .clock import Clock, SimulationEnd, TICKS_PERIOD
+from .core import Simulation, install, uninstall, current
@@ -0,0 +1,41 @@
+# aio.py -- CPython asyncio event loop running on the simulation's virtual clock
+#
+# asyncio waits for its next timer in its selector's select(timeout).  SimSelector does that
+#   wait on the virtual clock instead, returning early only once an IRQ handler has run (which
+#   may have set a ThreadSafeFlag), and SimEventLoop tells the time from the virtual clock, so
+#   asyncio code -- uasyncio code, on the Pico -- runs in simulated time like everything else.
+#   install() makes asyncio.run() use it.
+
+import asyncio, math, selectors
+
+from . import core
+
+class SimSelector(selectors.SelectSelector):
+    """Waits on the virtual clock.  Nothing simulated uses file descriptors, so none are ever ready."""
+
+    def select(self, timeout=None):
+        sim = core.current()
+        if timeout is not None and timeout <= 0:
+            sim.clock.run_due()
+            return []
+        # like WFI, only an interrupt (or the timeout) ends the wait
+        sim.idle_calls += 1
+        clock = sim.clock
+        t_end = clock.now_us + (1 << 62 if timeout is None else math.ceil(timeout * 1000000))
+        irqs  = sim.irq_count
+        while (clock.now_us < t_end) and (sim.irq_count == irqs):
+            clock.wait_for_event(t_end - clock.now_us)
+        return []
+
+class SimEventLoop(asyncio.SelectorEventLoop):
+
+    def __init__(self):
+        super().__init__(SimSelector())
+
+    def time(self):
+        return core.current().clock.now_us / 1000000
+
+class SimEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+
+    def new_event_loop(self):
+        return SimEventLoop()
@@ -0,0 +1,101 @@
+# clock.py -- virtual clock and event scheduler for the host-side simulator
+#
+# Simulated time only moves when the firmware waits (time.sleep*(), machine.idle(),
+#   machine.lightsleep(), blocking device calls) or reads the ticks counters, which are
+#   charged a small CPU cost so that busy loops make progress too.  Waiting jumps straight
+#   to the next scheduled hardware event, so long idle stretches cost nothing to simulate.
+
+import heapq
+
+TICKS_PERIOD = 1 << 30        # same as the rp2 port
+TICKS_MASK   = TICKS_PERIOD - 1
+
+class SimulationEnd(Exception):
+    """Raised out of the firmware when the clock reaches the simulation's time limit."""
+    pass
+
+class Clock:
+
+    def __init__(self, start_ms=0, ticks_cost_us=1):
+        """
+        start_ms - value of ticks_ms() at the start of the simulation; set it close to
+                   TICKS_PERIOD to exercise ticks wraparound
+        ticks_cost_us - simulated CPU time charged for every ticks_ms()/ticks_us() call
+        """
+        self.now_us        = 0
+        self.start_us      = start_ms * 1000
+        self.ticks_cost_us = ticks_cost_us
+        self.limit_us      = None
+        self._events       = []   # heap of [at_us, seq, func, arg]
+        self._seq          = 0
+
+    def ms(self):
+        """Elapsed simulated time in msecs (not wrapped)."""
+        return self.now_us // 1000
+
+    def ticks_ms(self):
+        self.charge(self.ticks_cost_us)
+        return ((self.start_us + self.now_us) // 1000) & TICKS_MASK
+
+    def ticks_us(self):
+        self.charge(self.ticks_cost_us)
+        return (self.start_us + self.now_us) & TICKS_MASK
+
+    def schedule(self, delay_us, func, arg=None):
+        """Call func(arg) delay_us from now.  Returns a handle that can be passed to cancel()."""
+        return self.schedule_at(self.now_us + max(0, int(delay_us)), func, arg)
+
+    def schedule_at(self, at_us, func, arg=None):
+        entry = [int(at_us), self._seq, func, arg]
+        self._seq += 1
+        heapq.heappush(self._events, entry)
+        return entry
+
+    def cancel(self, entry):
+        if entry is not None:
+            entry[2] = None
+
+    def next_event_us(self):
+        """Absolute time of the next scheduled event, or None."""
+        events = self._events
+        while events and events[0][2] is None:
+            heapq.heappop(events)
+        return events[0][0] if events else None
+
+    def run_due(self):
+        """Run every event that is due now."""
+        self.advance_to(self.now_us)
+
+    def advance_to(self, t_us):
+        """Move the clock forwards to t_us, running every event scheduled up to then in order."""
+        events = self._events
+        while events and events[0][0] <= t_us:
+            (at_us, _, func, arg) = heapq.heappop(events)
+            if func is None:
+                continue
+            if at_us > self.now_us:
+                self._set_now(at_us)
+            func(arg)
+        if t_us > self.now_us:
+            self._set_now(t_us)
+
+    def advance(self, us):
+        self.advance_to(self.now_us + max(0, int(us)))
+
+    def charge(self, us):
+        """Account for CPU time spent by the firmware."""
+        if us:
+            self.advance(us)
+
+    def wait_for_event(self, max_us):
+        """Advance to the next scheduled event, but no further than max_us from now."""
+        t_next = self.next_event_us()
+        t_end  = self.now_us + max_us
+        self.advance_to(t_end if (t_next is None) or (t_next > t_end) else t_next)
+
+    def _set_now(self, t_us):
+        limit = self.limit_us
+        if (limit is not None) and (t_us >= limit):
+            self.now_us = limit
+            raise SimulationEnd()
+        self.now_us = t_us
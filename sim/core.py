@@ -0,0 +1,183 @@
+# core.py -- the Simulation object that the fake MicroPython modules talk to
+#
+# A Simulation owns the virtual clock, the state of every GPIO pin, the PWM slices and the
+#   devices on the I2C buses.  install() makes it the current simulation and puts the fake
+#   machine/micropython/time modules (and stand-ins for the device libraries the firmware
+#   imports) into sys.modules, so that lib/ and the firmware can be imported unchanged.
+#   It also points asyncio at an event loop on the virtual clock (see aio.py).
+
+import sys, os, builtins, traceback
+
+from .clock import Clock, SimulationEnd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LIB_DIR  = os.path.join(ROOT_DIR, "lib")
+
+_current = None
+
+def current():
+    if _current is None:
+        raise RuntimeError("no simulation installed, call sim.install() first")
+    return _current
+
+class PinState:
+    """Electrical state of one GPIO, shared by every machine.Pin object created for it."""
+
+    def __init__(self, sim, id):
+        self.sim          = sim
+        self.id           = id
+        self.mode         = 0       # machine.Pin.IN
+        self.pull         = None
+        self.out          = 0       # value last written to the output latch
+        self.ext          = None    # level driven by an external device, or None if undriven
+        self.irq_handler  = None
+        self.irq_trigger  = 0
+        self.irq_arg      = None
+        self.listeners    = []      # device callbacks, called as f(pin_state, level) on changes
+        self.duty         = None    # duty_u16 while the pin is driven by a PWM slice
+        self.level        = 0
+        self.level        = self._compute()
+        self._mode_seen   = self.mode
+
+    def _compute(self):
+        from . import fake_machine
+        if self.mode == fake_machine.Pin.OUT:
+            return self.out
+        if self.duty is not None:
+            return 1 if self.duty else 0
+        if self.ext is not None:
+            return self.ext
+        if self.pull == fake_machine.Pin.PULL_UP:
+            return 1
+        return 0
+
+    def update(self, force=False):
+        """
+        Recompute the pin level after anything changed.  IRQs fire on edges; listeners are
+        also told about mode changes, since e.g. a row line that goes from OUT-low to IN
+        stops sinking current even though its level doesn't change, and (with force) about
+        changes of PWM duty.
+        """
+        from . import fake_machine
+        level = self._compute()
+        if (level == self.level) and (self.mode == self._mode_seen) and not force:
+            return
+        edge = level != self.level
+        self.level      = level
+        self._mode_seen = self.mode
+        if edge and (self.irq_handler is not None):
+            trigger = fake_machine.Pin.IRQ_RISING if level else fake_machine.Pin.IRQ_FALLING
+            if self.irq_trigger & trigger:
+                self.sim.irq(self.irq_handler, self.irq_arg)
+        for f in self.listeners:
+            f(self, level)
+
+    def drive(self, level):
+        """Called by devices to drive the pin externally (None releases it)."""
+        self.ext = level
+        self.update()
+
+class Simulation:
+
+    def __init__(self, start_ms=0, ticks_cost_us=1):
+        self.clock       = Clock(start_ms, ticks_cost_us)
+        self.pins        = {}
+        self.pwms        = {}      # pin id -> fake PWM
+        self.i2c_devices = {}      # (bus, addr) -> device with a write(bytes) method
+        self.i2c_bytes   = 0       # total bytes written on any I2C bus (address bytes included)
+        self.irq_depth   = 0       # machine.disable_irq() nesting
+        self.irq_pending = []
+        self.irq_count   = 0
+        self.irq_errors  = []      # exceptions raised by IRQ handlers (they don't stop the firmware)
+        self.idle_calls  = 0
+
+    def pin(self, id):
+        """The PinState for a GPIO number, created on first use."""
+        p = self.pins.get(id)
+        if p is None:
+            p = self.pins[id] = PinState(self, id)
+        return p
+
+    def irq(self, handler, arg):
+        """Run an interrupt handler now, or as soon as interrupts are re-enabled."""
+        if self.irq_depth:
+            self.irq_pending.append((handler, arg))
+            return
+        self.irq_count += 1
+        try:
+            handler(arg)
+        except SimulationEnd:
+            raise
+        except Exception as e:
+            # MicroPython reports uncaught exceptions in IRQ handlers and carries on
+            self.irq_errors.append(e)
+            if len(self.irq_errors) <= 3:
+                print("Uncaught exception in IRQ callback handler (simulated)", file=sys.stderr)
+                traceback.print_exception(type(e), e, e.__traceback__, file=sys.stderr)
+
+    def enable_irq(self):
+        self.irq_depth = 0
+        while self.irq_pending and not self.irq_depth:
+            (handler, arg) = self.irq_pending.pop(0)
+            self.irq(handler, arg)
+
+_FAKE_MODULES = {
+    "time":               "fake_time",
+    "machine":            "fake_machine",
+    "micropython":        "fake_micropython",
+    "utime":              "fake_time",
+    "hc_sr04_edushields": "fake_hcsr04",
+    "lcd_api":            "fake_lcd_api",
+    "pico_i2c_lcd":       "fake_pico_i2c_lcd",
+    "neopixel":           "fake_neopixel",
+}
+
+_saved_modules = None
+
+def install(simulation=None):
+    """
+    Make simulation (or a new Simulation) the current one, and install the fake modules
+    and lib/ on the import path.  Returns the Simulation.
+    """
+    global _current, _saved_modules
+    import importlib
+
+    if simulation is None:
+        simulation = Simulation()
+    _current = simulation
+
+    if _saved_modules is None:
+        _saved_modules = { name: sys.modules.get(name) for name in _FAKE_MODULES }
+        _saved_modules["builtins.const"] = getattr(builtins, "const", None)
+        # in order: the device driver stand-ins import the fake machine and time modules
+        for (name, fake) in _FAKE_MODULES.items():
+            sys.modules[name] = importlib.import_module("sim." + fake)
+        builtins.const = sys.modules["micropython"].const   # MicroPython has const() built in
+        import asyncio
+        from .aio import SimEventLoopPolicy
+        _saved_modules["asyncio.policy"] = asyncio.get_event_loop_policy()
+        asyncio.set_event_loop_policy(SimEventLoopPolicy())  # asyncio.run() on the virtual clock
+
+    if LIB_DIR not in sys.path:
+        sys.path.insert(0, LIB_DIR)
+    return simulation
+
+def uninstall():
+    """Restore the real modules that install() replaced."""
+    global _current, _saved_modules
+    if _saved_modules is None:
+        return
+    import asyncio
+    asyncio.set_event_loop_policy(_saved_modules.pop("asyncio.policy"))
+    const = _saved_modules.pop("builtins.const")
+    if const is None:
+        del builtins.const
+    else:
+        builtins.const = const
+    for (name, mod) in _saved_modules.items():
+        if mod is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = mod
+    _saved_modules = None
+    _current = None
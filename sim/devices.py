@@ -0,0 +1,275 @@
+# devices.py -- models of the peripherals attached to the simulated Pico
+#
+# Each model hooks the simulated pins (and I2C bus) the way the real part is wired, so the
+#   firmware talks to it through the unmodified machine.Pin/I2C APIs.
+
+import math
+
+from .fake_machine import Pin
+
+US_PER_MM_ROUND_TRIP = 5.82     # 2 / speed of sound (343 m/s)
+
+class UltrasonicModel:
+    """
+    HC-SR04: a >=10us pulse on TRIG makes ECHO go high for as long as the ping's round
+    trip takes.  distance is a number of mm, None (nothing in range: ECHO times out), or a
+    function of the simulated time in ms returning either of those.
+    """
+
+    BURST_US   = 450          # delay between the trigger and the start of the echo pulse
+    TIMEOUT_US = 38000        # echo pulse width when nothing reflects the ping
+    MAX_MM     = 4000
+
+    def __init__(self, sim, trig_pin, echo_pin, distance=None):
+        self.sim      = sim
+        self.distance = distance
+        self.trig     = sim.pin(trig_pin)
+        self.echo     = sim.pin(echo_pin)
+        self.pings    = 0
+        self._trig_rise_us = None
+        self._busy    = False
+        self.trig.listeners.append(self._on_trig)
+
+    def distance_now(self):
+        d = self.distance
+        if callable(d):
+            d = d(self.sim.clock.ms())
+        return d
+
+    def _on_trig(self, pin, level):
+        now = self.sim.clock.now_us
+        if level:
+            self._trig_rise_us = now
+            return
+        if (self._trig_rise_us is None) or self._busy or (now - self._trig_rise_us < 10):
+            return
+        self._trig_rise_us = None
+        self._busy = True
+        self.pings += 1
+
+        d = self.distance_now()
+        width = self.TIMEOUT_US if (d is None) or (d > self.MAX_MM) else int(max(d, 20) * US_PER_MM_ROUND_TRIP)
+        clock = self.sim.clock
+        clock.schedule(self.BURST_US, self._echo, 1)
+        clock.schedule(self.BURST_US + width, self._echo, 0)
+
+    def _echo(self, level):
+        self.echo.drive(level)
+        if level == 0:
+            self._busy = False
+
+class KeypadModel:
+    """
+    Matrix keypad: a pressed key connects its row and column lines, so a column follows
+    whichever row it's connected to that is actively driven.
+    """
+
+    def __init__(self, sim, row_pins, col_pins, keys):
+        self.sim     = sim
+        self.rows    = [sim.pin(n) for n in row_pins]
+        self.cols    = [sim.pin(n) for n in col_pins]
+        self.keys    = keys
+        self.pressed = set()        # (row, col)
+        self._where  = { keys[r][c]: (r, c) for r in range(len(keys)) for c in range(len(keys[r])) }
+        for p in self.rows:
+            p.listeners.append(self._on_row)
+
+    def _on_row(self, pin, level):
+        self._update()
+
+    def _update(self):
+        for (c, col) in enumerate(self.cols):
+            level = None
+            for (r, row) in enumerate(self.rows):
+                if ((r, c) in self.pressed) and (row.mode == Pin.OUT):
+                    level = row.out if level is None else (level | row.out)
+            if level != col.ext:
+                col.drive(level)
+
+    def press(self, key):
+        self.pressed.add(self._where[key])
+        self._update()
+
+    def release(self, key):
+        self.pressed.discard(self._where[key])
+        self._update()
+
+    def tap(self, key, at_ms, hold_ms=100):
+        """Schedule a press of key at simulated time at_ms, held for hold_ms."""
+        clock = self.sim.clock
+        clock.schedule_at(at_ms * 1000, lambda _: self.press(key))
+        clock.schedule_at((at_ms + hold_ms) * 1000, lambda _: self.release(key))
+
+class FlowSensorModel:
+    """
+    Hall-effect turbine flow sensor on the pump's output.  The pump delivers ml_per_s while
+    its pin is driven high or PWMed at full duty, proportionally less at lower duties (and
+    nothing at or below stall_duty, 0..1), and the flow follows any change with a time
+    constant of tau_ms (the motor and the water in the tube spinning up and coasting down).
+    The sensor emits pulses_per_ml pulses per ml.
+
+    The flow is integrated in STEP_US steps, with each pulse placed at the time within its
+    step that the volume crossed the next pulse.
+    """
+
+    STEP_US  = 1000
+    PULSE_US = 100
+
+    def __init__(self, sim, pulse_pin, pump_pin, ml_per_s=30.0, pulses_per_ml=2.46, tau_ms=0,
+                 stall_duty=0.0):
+        self.sim           = sim
+        self.pin           = sim.pin(pulse_pin)
+        self.pump          = sim.pin(pump_pin)
+        self.ml_per_s      = ml_per_s
+        self.pulses_per_ml = pulses_per_ml
+        self.tau_ms        = tau_ms
+        self.stall_duty    = stall_duty
+        self.pulses        = 0
+        self.rate          = 0.0        # ml/s flowing right now
+        self._cmd          = 0.0        # ml/s the pump is being driven to deliver
+        self._ml           = 0.0
+        self._entry        = None
+        self.pump.listeners.append(self._on_pump)
+
+    def pumping(self):
+        return self._entry is not None
+
+    def volume_ml(self):
+        """Water actually dispensed so far."""
+        return self._ml
+
+    def _command(self):
+        pump = self.pump
+        if (pump.duty is None) or (pump.mode != Pin.ALT):     # plain GPIO
+            return self.ml_per_s if pump.level else 0.0
+        frac = pump.duty / 65535
+        if frac <= self.stall_duty:
+            return 0.0
+        return self.ml_per_s * (frac - self.stall_duty) / (1 - self.stall_duty)
+
+    def _on_pump(self, pin, level):
+        self._cmd = self._command()
+        if (self._entry is None) and (self._cmd > 0):
+            self._entry = self.sim.clock.schedule(0, self._step, None)
+
+    def _step(self, _):
+        clock = self.sim.clock
+        dt    = self.STEP_US / 1e6
+        r0    = self.rate
+        cmd   = self._cmd
+        r1    = cmd if not self.tau_ms else cmd + (r0 - cmd) * math.exp(-self.STEP_US / 1000 / self.tau_ms)
+        ml0   = self._ml
+        ml1   = ml0 + (r0 + r1) / 2 * dt
+
+        # pulses due during the coming step
+        n = int(ml1 * self.pulses_per_ml)
+        for k in range(self.pulses + 1, n + 1):
+            frac = (k / self.pulses_per_ml - ml0) / (ml1 - ml0)
+            at   = int(frac * self.STEP_US)
+            clock.schedule(at, self._edge, 1)
+            clock.schedule(at + self.PULSE_US // 2, self._edge, 0)
+        self.pulses = max(self.pulses, n)
+        self._ml    = ml1
+        self.rate   = r1
+
+        if (cmd == 0) and (r1 < 0.01):
+            self.rate   = 0.0
+            self._entry = None
+        else:
+            self._entry = clock.schedule(self.STEP_US, self._step, None)
+
+    def _edge(self, level):
+        self.pin.drive(level)
+
+class Hd44780Model:
+    """
+    HD44780 character LCD behind a PCF8574 I2C backpack (the usual wiring used by
+    pico_i2c_lcd: P0=RS, P1=RW, P2=E, P3=backlight, P4-P7=D4-D7), decoded down to its
+    display RAM so tests can read back what's on the screen.
+    """
+
+    def __init__(self, sim, bus, addr, num_rows=4, num_cols=20):
+        self.num_rows   = num_rows
+        self.num_cols   = num_cols
+        self.row_offsets = (0x00, 0x40, num_cols, 0x40 + num_cols)
+        self.ddram      = bytearray(b" " * 128)
+        self.addr       = 0
+        self.cgram_mode = False
+        self.four_bit   = False
+        self.display_on = False
+        self.cursor     = False
+        self.blink      = False
+        self.backlight  = False
+        self.commands   = 0
+        self.data       = 0
+        self.clears     = 0
+        self._prev      = 0
+        self._nibble    = None
+        sim.i2c_devices[(bus, addr)] = self
+
+    def write(self, buf):
+        for b in buf:
+            self.backlight = bool(b & 0x08)
+            if (self._prev & 0x04) and not (b & 0x04):     # E falling edge latches a nibble
+                self._strobe(self._prev >> 4, self._prev & 0x01)
+            self._prev = b
+
+    def _strobe(self, nibble, rs):
+        if not self.four_bit:
+            # still in 8-bit mode after reset: each strobe is a whole (high nibble) command
+            if (nibble << 4) & 0xf0 == 0x20:
+                self.four_bit = True
+            self._nibble = None
+            return
+        if self._nibble is None:
+            self._nibble = nibble
+            return
+        byte = (self._nibble << 4) | nibble
+        self._nibble = None
+        if rs:
+            self._write_data(byte)
+        else:
+            self._command(byte)
+
+    def _command(self, c):
+        self.commands += 1
+        if c & 0x80:
+            self.addr = c & 0x7f
+            self.cgram_mode = False
+        elif c & 0x40:
+            self.cgram_mode = True
+        elif c & 0x20:
+            pass
+        elif c & 0x10:
+            pass
+        elif c & 0x08:
+            self.display_on = bool(c & 0x04)
+            self.cursor     = bool(c & 0x02)
+            self.blink      = bool(c & 0x01)
+        elif c & 0x04:
+            pass
+        elif c & 0x02:
+            self.addr = 0
+        elif c & 0x01:
+            self.clears += 1
+            self.ddram[:] = b" " * 128
+            self.addr = 0
+
+    def _write_data(self, byte):
+        self.data += 1
+        if self.cgram_mode:
+            return
+        self.ddram[self.addr] = byte
+        self.addr = (self.addr + 1) & 0x7f
+
+    def cursor_pos(self):
+        """(col, row) of the cursor, or None if it's not on a visible cell."""
+        for (row, off) in enumerate(self.row_offsets[:self.num_rows]):
+            if off <= self.addr < off + self.num_cols:
+                return (self.addr - off, row)
+        return None
+
+    def text(self):
+        """The characters on each row of the display."""
+        return [self.ddram[off:off + self.num_cols].decode("latin-1")
+                for off in self.row_offsets[:self.num_rows]]
@@ -0,0 +1,36 @@
+# fake_hcsr04.py -- stand-in for the hc_sr04_edushields driver, talking to the simulated pins
+#
+# Like the real driver, range_mm() blocks: it pulses TRIG and busy-waits on ECHO with
+#   machine.time_pulse_us(), so the simulated time it takes depends on the distance.
+
+import time
+from machine import Pin, time_pulse_us
+
+class HCSR04:
+
+    def __init__(self, trigger_pin, echo_pin, echo_timeout_us=30000):
+        self.echo_timeout_us = echo_timeout_us
+        self.trigger = Pin(trigger_pin, Pin.OUT, value=0)
+        self.echo    = Pin(echo_pin, Pin.IN)
+
+    def _pulse(self):
+        self.trigger.value(0)
+        time.sleep_us(5)
+        self.trigger.value(1)
+        time.sleep_us(10)
+        self.trigger.value(0)
+        return time_pulse_us(self.echo, 1, self.echo_timeout_us)
+
+    def range_mm(self):
+        """Distance in mm, or -1 if the echo timed out."""
+        pulse_us = self._pulse()
+        if pulse_us < 0:
+            return -1
+        return pulse_us * 100 // 582
+
+    def distance_mm(self):
+        return self.range_mm()
+
+    def distance_cm(self):
+        mm = self.range_mm()
+        return mm / 10 if mm >= 0 else mm
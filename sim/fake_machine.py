@@ -0,0 +1,227 @@
+# fake_machine.py -- simulated subset of MicroPython's machine module (rp2 flavour)
+#
+# Pin, PWM, I2C and Timer objects are thin handles onto state kept in the current
+#   Simulation, so that devices (sim.devices) can observe and drive the same pins.
+
+from . import core
+
+class Pin:
+    IN         = 0
+    OUT        = 1
+    OPEN_DRAIN = 2
+    ALT        = 3
+    PULL_UP    = 1
+    PULL_DOWN  = 2
+    IRQ_FALLING = 4
+    IRQ_RISING  = 8
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self._state = core.current().pin(id)
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        st = self._state
+        if value is not None:
+            st.out = 1 if value else 0
+        if mode != -1:
+            st.mode = mode
+        if pull != -1:
+            st.pull = pull
+        st.update()
+
+    def __repr__(self):
+        return "Pin(GPIO%d, mode=%s)" % (self._state.id, ("IN", "OUT", "OPEN_DRAIN", "ALT")[self._state.mode])
+
+    def value(self, x=None):
+        st = self._state
+        if x is None:
+            return st.level
+        st.out = 1 if x else 0
+        st.update()
+
+    __call__ = value
+
+    def on(self):   self.value(1)
+    def off(self):  self.value(0)
+    def high(self): self.value(1)
+    def low(self):  self.value(0)
+
+    def toggle(self):
+        self.value(1 - self._state.out)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        st = self._state
+        st.irq_handler = handler
+        st.irq_trigger = trigger
+        st.irq_arg     = self
+
+    def id(self):
+        return self._state.id
+
+class PWM:
+
+    def __init__(self, pin, freq=None, duty_u16=None):
+        self.pin   = pin
+        self._freq = 0
+        self._duty = 0
+        self.log   = []           # (ms, freq, duty_u16) every time the output changes
+        self.listeners = []       # called as f(pwm) whenever freq or duty change
+        core.current().pwms[pin.id()] = self
+        self._state = pin._state
+        self._state.mode = Pin.ALT
+        self._state.duty = 0
+        self._state.update()
+        if freq is not None:
+            self.freq(freq)
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def _changed(self):
+        self.log.append((core.current().clock.ms(), self._freq, self._duty))
+        for f in self.listeners:
+            f(self)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = int(value)
+        self._changed()
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        self._duty = int(value)
+        self._state.duty = self._duty
+        self._state.update(force=True)
+        self._changed()
+
+    def duty_ns(self, value=None):
+        period_ns = 1000000000 // self._freq if self._freq else 0
+        if value is None:
+            return (self._duty * period_ns) >> 16
+        self.duty_u16((value << 16) // period_ns if period_ns else 0)
+
+    def deinit(self):
+        self._duty = 0
+        self._state.duty = None
+        self._state.mode = Pin.IN
+        self._state.update(force=True)
+        self._changed()
+
+class I2C:
+    """I2C controller.  Writes go to the device registered at (bus, addr) in the Simulation,
+       and the time each transfer takes on the wire is charged to the clock."""
+
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.id       = id
+        self.freq     = freq
+        self.bytes    = 0     # bytes written on this bus, including address bytes
+
+    def scan(self):
+        return sorted(addr for (bus, addr) in core.current().i2c_devices if bus == self.id)
+
+    def writeto(self, addr, buf, stop=True):
+        sim = core.current()
+        dev = sim.i2c_devices.get((self.id, addr))
+        n = len(buf) + 1
+        self.bytes    += n
+        sim.i2c_bytes += n
+        sim.clock.charge((n * 9 * 1000000) // self.freq)     # 9 clocks per byte (8 + ACK)
+        if dev is None:
+            raise OSError(5)      # EIO: no ACK
+        dev.write(bytes(buf))
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        sim = core.current()
+        dev = sim.i2c_devices.get((self.id, addr))
+        sim.clock.charge(((nbytes + 1) * 9 * 1000000) // self.freq)
+        if dev is None:
+            raise OSError(5)
+        return dev.read(nbytes)
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, freq=-1, period=-1, callback=None):
+        self._entry = None
+        if (callback is not None) or (period != -1) or (freq != -1):
+            self.init(mode=mode, freq=freq, period=period, callback=callback)
+
+    def init(self, mode=PERIODIC, freq=-1, period=-1, callback=None, tick_hz=1000):
+        self.deinit()
+        if freq != -1:
+            period_us = 1000000 // freq
+        else:
+            period_us = (period * 1000000) // tick_hz
+        self._mode      = mode
+        self._period_us = max(1, period_us)
+        self._callback  = callback
+        self._entry = core.current().clock.schedule(self._period_us, self._fire)
+
+    def _fire(self, _):
+        sim = core.current()
+        if self._mode == Timer.PERIODIC:
+            self._entry = sim.clock.schedule(self._period_us, self._fire)
+        else:
+            self._entry = None
+        if self._callback is not None:
+            sim.irq(self._callback, self)
+
+    def deinit(self):
+        if self._entry is not None:
+            core.current().clock.cancel(self._entry)
+            self._entry = None
+
+def disable_irq():
+    sim = core.current()
+    sim.irq_depth += 1
+    return sim.irq_depth - 1
+
+def enable_irq(state=0):
+    sim = core.current()
+    if state:
+        sim.irq_depth = state
+    else:
+        sim.enable_irq()
+
+def idle():
+    """WFI: sleep until the next interrupt, which is at most the 1ms system tick away."""
+    sim = core.current()
+    sim.idle_calls += 1
+    sim.clock.wait_for_event(1000)
+
+def lightsleep(ms=None):
+    """Sleep until ms have passed or something is scheduled to happen."""
+    sim = core.current()
+    sim.idle_calls += 1
+    sim.clock.wait_for_event(ms * 1000 if ms is not None else 1 << 62)
+
+def deepsleep(ms=None):
+    lightsleep(ms)
+
+def time_pulse_us(pin, pulse_level, timeout_us=1000000):
+    """Wait for pin to go to pulse_level, then time how long it stays there (-2/-1 on timeout)."""
+    clock = core.current().clock
+    t_end = clock.now_us + timeout_us
+    while pin.value() != pulse_level:
+        if clock.now_us >= t_end:
+            return -2
+        clock.wait_for_event(t_end - clock.now_us)
+    t_start = clock.now_us
+    t_end   = t_start + timeout_us
+    while pin.value() == pulse_level:
+        if clock.now_us >= t_end:
+            return -1
+        clock.wait_for_event(t_end - clock.now_us)
+    return clock.now_us - t_start
+
+def freq(hz=None):
+    return 125000000
+
+def unique_id():
+    return b"\x00sim-pico"
+
+def reset():
+    raise SystemExit("machine.reset()")
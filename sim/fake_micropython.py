@@ -0,0 +1,27 @@
+# fake_micropython.py -- the parts of MicroPython's micropython module used by the firmware
+
+from . import core
+
+def const(x):
+    return x
+
+def native(f):
+    return f
+
+viper = native
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+def schedule(func, arg):
+    """Run func(arg) "soon" -- as the next thing the clock does, outside of any IRQ."""
+    core.current().clock.schedule(0, func, arg)
+
+def mem_info(verbose=False):
+    pass
+
+def opt_level(level=None):
+    return 0
+
+def kbd_intr(chr):
+    pass
@@ -0,0 +1,23 @@
+# fake_neopixel.py -- stand-in for the pi_pico_neopixel driver used by sm_light
+
+class Neopixel:
+
+    def __init__(self, num_leds, state_machine, pin, mode="RGB", delay=0.0001):
+        self.num_leds = num_leds
+        self.pixels   = [(0, 0, 0)] * num_leds
+        self._brightness = 255
+        self.shown    = None
+
+    def brightness(self, brightness=None):
+        if brightness is None:
+            return self._brightness
+        self._brightness = max(1, min(255, int(brightness)))
+
+    def set_pixel(self, pixel_num, rgb_w, how_bright=None):
+        self.pixels[pixel_num] = rgb_w
+
+    def fill(self, rgb_w, how_bright=None):
+        self.pixels = [rgb_w] * self.num_leds
+
+    def show(self):
+        self.shown = (self._brightness, list(self.pixels))
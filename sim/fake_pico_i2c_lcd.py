@@ -0,0 +1,62 @@
+# fake_pico_i2c_lcd.py -- stand-in for the pico_i2c_lcd driver (HD44780 via a PCF8574 backpack)
+#
+# Every command or data byte goes out as four single-byte I2C writes (two nibbles, each
+#   strobed with E), and clear/home wait 5ms, just like the real driver.
+
+import time
+from lcd_api import LcdApi
+
+MASK_RS = 0x01
+MASK_RW = 0x02
+MASK_E  = 0x04
+SHIFT_BACKLIGHT = 3
+SHIFT_DATA      = 4
+
+class I2cLcd(LcdApi):
+
+    def __init__(self, i2c, i2c_addr, num_lines, num_columns):
+        self.i2c = i2c
+        self.i2c_addr = i2c_addr
+        self.i2c.writeto(self.i2c_addr, bytes([0]))
+        time.sleep_ms(20)
+        self.hal_write_init_nibble(self.LCD_FUNCTION_RESET)
+        time.sleep_ms(5)
+        self.hal_write_init_nibble(self.LCD_FUNCTION_RESET)
+        time.sleep_ms(1)
+        self.hal_write_init_nibble(self.LCD_FUNCTION_RESET)
+        time.sleep_ms(1)
+        self.hal_write_init_nibble(self.LCD_FUNCTION)
+        time.sleep_ms(1)
+        LcdApi.__init__(self, num_lines, num_columns)
+        cmd = self.LCD_FUNCTION
+        if num_lines > 1:
+            cmd |= self.LCD_FUNCTION_2LINES
+        self.hal_write_command(cmd)
+
+    def hal_write_init_nibble(self, nibble):
+        byte = ((nibble >> 4) & 0x0f) << SHIFT_DATA
+        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
+        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+
+    def hal_backlight_on(self):
+        self.i2c.writeto(self.i2c_addr, bytes([1 << SHIFT_BACKLIGHT]))
+
+    def hal_backlight_off(self):
+        self.i2c.writeto(self.i2c_addr, bytes([0]))
+
+    def _write(self, byte, rs):
+        bl = self.backlight << SHIFT_BACKLIGHT
+        hi = rs | bl | (((byte >> 4) & 0x0f) << SHIFT_DATA)
+        lo = rs | bl | ((byte & 0x0f) << SHIFT_DATA)
+        self.i2c.writeto(self.i2c_addr, bytes([hi | MASK_E]))
+        self.i2c.writeto(self.i2c_addr, bytes([hi]))
+        self.i2c.writeto(self.i2c_addr, bytes([lo | MASK_E]))
+        self.i2c.writeto(self.i2c_addr, bytes([lo]))
+
+    def hal_write_command(self, cmd):
+        self._write(cmd, 0)
+        if cmd <= 3:
+            time.sleep_ms(5)      # clear and home are slow
+
+    def hal_write_data(self, data):
+        self._write(data, MASK_RS)
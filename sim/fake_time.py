@@ -0,0 +1,37 @@
+# fake_time.py -- MicroPython's time module, running on the simulation's virtual clock
+#
+# Anything that isn't MicroPython-specific (time.time(), perf_counter(), ...) is passed
+#   through to CPython's real time module.
+
+import time as _real_time
+
+from . import core
+from .clock import TICKS_PERIOD, TICKS_MASK
+
+def ticks_ms():
+    return core.current().clock.ticks_ms()
+
+def ticks_us():
+    return core.current().clock.ticks_us()
+
+def ticks_cpu():
+    return core.current().clock.ticks_us()
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MASK
+
+def ticks_diff(ticks1, ticks2):
+    half = TICKS_PERIOD >> 1
+    return ((ticks1 - ticks2 + half) & TICKS_MASK) - half
+
+def sleep_us(us):
+    core.current().clock.advance(us)
+
+def sleep_ms(ms):
+    core.current().clock.advance(ms * 1000)
+
+def sleep(s):
+    core.current().clock.advance(s * 1000000)
+
+def __getattr__(name):
+    return getattr(_real_time, name)
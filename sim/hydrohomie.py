@@ -0,0 +1,149 @@
+# hydrohomie.py -- run the HydroHomie firmware, unmodified, against simulated hardware
+#
+# The keypad, HC-SR04, flow sensor/pump and LCD are wired to the same GPIOs as on the
+#   real dispenser.  Actions (key taps, placing and removing a vessel) are scheduled on the
+#   virtual clock up-front, then the firmware runs until the requested simulated time.
+#
+# Run a single 16oz fill and print what happened:
+#     python -m sim.hydrohomie
+# Profile it with the usual CPython tools:
+#     python -m cProfile -s cumtime -m sim.hydrohomie
+
+import io, os, sys, contextlib
+
+from . import core
+from .clock import SimulationEnd
+from .devices import UltrasonicModel, KeypadModel, FlowSensorModel, Hd44780Model
+
+FIRMWARE = os.path.join(core.ROOT_DIR, "HydroHomie_106Project_V1.2.3.py")
+
+KEYS = [['1', '2', '3', 'A'],
+        ['4', '5', '6', 'B'],
+        ['7', '8', '9', 'C'],
+        ['*', '0', '#', 'D']]
+
+ROW_PINS  = (9, 8, 7, 6)
+COL_PINS  = (5, 4, 3, 2)
+PIN_TRIG  = 11
+PIN_ECHO  = 10
+PIN_FLOW  = 12
+PIN_PUMP  = 16
+I2C_BUS   = 0
+I2C_ADDR  = 0x27
+
+ML_PER_OZ = 29.574
+
+BACKGROUND_MM = 400         # what the HC-SR04 sees with no vessel: the drip tray
+
+# Flow sensor calibration matching the firmware's FLOW_PULSES_PER_L.  (It used to count
+#   pulses for only half of each 250ms sample and divide by 2.46 pulses/ml, hence the 4.92.)
+PULSES_PER_ML = 4.92
+
+class HydroHomieSim:
+
+    def __init__(self, start_ms=0, pump_ml_per_s=30.0, pulses_per_ml=PULSES_PER_ML, trace=False, firmware=FIRMWARE,
+                 pump_tau_ms=0, pump_stall_duty=0.0):
+        """
+        start_ms - initial ticks_ms() value (use something near 2**30 to test wraparound)
+        pump_ml_per_s - flow rate of the simulated pump (at full duty)
+        pulses_per_ml - flow sensor calibration
+        pump_tau_ms, pump_stall_duty - how sluggish the pump is, see FlowSensorModel
+        trace - let the firmware's console output through (otherwise it's kept in .output)
+        """
+        self.sim      = core.install(core.Simulation(start_ms))
+        self.keypad   = KeypadModel(self.sim, ROW_PINS, COL_PINS, KEYS)
+        self.usonic   = UltrasonicModel(self.sim, PIN_TRIG, PIN_ECHO, distance=BACKGROUND_MM)
+        self.flow     = FlowSensorModel(self.sim, PIN_FLOW, PIN_PUMP, ml_per_s=pump_ml_per_s,
+                                        pulses_per_ml=pulses_per_ml, tau_ms=pump_tau_ms,
+                                        stall_duty=pump_stall_duty)
+        self.lcd      = Hd44780Model(self.sim, I2C_BUS, I2C_ADDR, 4, 20)
+        self.trace    = trace
+        self.firmware = firmware
+        self.output   = ""
+        self.globals  = None
+        self.pump_log = []          # (ms, level) every time the pump switches on or off
+        self.sim.pin(PIN_PUMP).listeners.append(self._log_pump)
+
+    def _log_pump(self, pin, level):
+        if (not self.pump_log) or (self.pump_log[-1][1] != level):
+            self.pump_log.append((self.sim.clock.ms(), level))
+
+    def at(self, ms, func, *args):
+        """Call func(*args) at simulated time ms."""
+        self.sim.clock.schedule_at(ms * 1000, lambda _: func(*args))
+
+    def tap(self, key, at_ms, hold_ms=200):
+        self.keypad.tap(key, at_ms, hold_ms)
+
+    def enter(self, keys, at_ms, gap_ms=600, hold_ms=100):
+        """
+        Tap each key in turn starting at at_ms.  Returns the time after the last tap.
+        NB: the firmware debounces each key over two scans of the keypad, so holds shorter
+            than about 2*4*KEYPAD_ROW_MSECS can be missed.
+        """
+        for key in keys:
+            self.tap(key, at_ms, hold_ms)
+            at_ms += gap_ms
+        return at_ms
+
+    def place_vessel(self, at_ms, distance_mm=100):
+        self.at(at_ms, setattr, self.usonic, "distance", distance_mm)
+
+    def remove_vessel(self, at_ms):
+        self.at(at_ms, setattr, self.usonic, "distance", BACKGROUND_MM)
+
+    def run(self, until_ms):
+        """Boot the firmware and run it until simulated time until_ms."""
+        self.sim.clock.limit_us = until_ms * 1000
+        with open(self.firmware) as f:
+            code = compile(f.read(), self.firmware, "exec")
+        self.globals = { "__name__": "__main__", "__file__": self.firmware }
+
+        out = sys.stdout if self.trace else io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                exec(code, self.globals)
+        except SimulationEnd:
+            pass
+        if not self.trace:
+            self.output = out.getvalue()
+        return self
+
+    @property
+    def eventer(self):
+        return self.globals["eventer"]
+
+    def state_name(self):
+        eventer = self.eventer
+        return eventer.state_str.get(eventer.state, str(eventer.state))
+
+    def dispensed_oz(self):
+        return self.flow.volume_ml() / ML_PER_OZ
+
+def fill(keys="16D", vessel_at_ms=6000, remove_at_ms=None, until_ms=None, **kwargs):
+    """
+    Simulate one dispense: wake the dispenser with *, enter keys, place a vessel, and
+    optionally take it away again.  Returns the HydroHomieSim after it has run.
+    """
+    hh = HydroHomieSim(**kwargs)
+    hh.tap("*", 1000, 300)
+    hh.enter(keys, 2000)
+    hh.place_vessel(vessel_at_ms)
+    if remove_at_ms is not None:
+        hh.remove_vessel(remove_at_ms)
+    if until_ms is None:
+        until_ms = (remove_at_ms if remove_at_ms is not None else vessel_at_ms + 60000) + 1000
+    return hh.run(until_ms)
+
+if __name__ == "__main__":
+    import time
+    t0 = time.perf_counter()
+    hh = fill("16D", vessel_at_ms=6000, remove_at_ms=30000)
+    t1 = time.perf_counter()
+    print("simulated %.1fs in %.3fs of CPU" % (hh.sim.clock.ms() / 1000, t1 - t0))
+    print("requested 16 oz, dispensed %.2f oz" % hh.dispensed_oz())
+    print("pump switched:", hh.pump_log)
+    print("final state:", hh.state_name())
+    print("loop:", hh.eventer.loop_stats())
+    print("I2C bytes written:", hh.sim.i2c_bytes)
+    print("IRQ handler errors:", len(hh.sim.irq_errors))
@@ -1,9 +1,7 @@
 #!/usr/bin/python
 #flowsensor.py
-from machine import Pin
+from machine import Pin, disable_irq, enable_irq
 import time
-global flowTime
-global totalFlow
 
 FLOW_PIN = const(15)
 FLOW_TIME_INC = 0.25
@@ -13,6 +11,7 @@ flowPin.on()
 
 flowTime = 0
 totalFlow = 0
+count = 0
 def flow(pin):
     global count
     count += 1
@@ -21,11 +20,14 @@ def flow(pin):
 flowPin.irq(trigger=Pin.IRQ_RISING, handler=flow)
 
 while True:
-    count = 0
     time.sleep(FLOW_TIME_INC)
+    irq_state = disable_irq()       # take the count and restart it without losing pulses
+    pulses = count
+    count = 0
+    enable_irq(irq_state)
     # Calculates waterflow within the past .25 seconds from time.sleep
-    flowRate = (count * 2.25)
+    flowRate = (pulses * 2.25)
     flowTime += FLOW_TIME_INC
-    #instantFlow = flowRate * FLOW_TIME_INC
-    totalFlow += flowRate
-    print("flowRate is {:.3f} ml/s Time elasped is {:.2f} Total flow is {:.3f} mL".format(flowRate, flowTime, instantFlow, totalFlow))
+    instantFlow = flowRate * FLOW_TIME_INC
+    totalFlow += instantFlow
+    print("flowRate is {:.3f} ml/s Time elasped is {:.2f} Flow this interval is {:.3f} mL Total flow is {:.3f} mL".format(flowRate, flowTime, instantFlow, totalFlow))
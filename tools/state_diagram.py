@@ -0,0 +1,41 @@
+# state_diagram.py -- write the firmware's state diagram, from its transition table, as Graphviz DOT
+#
+# Boots the firmware in the simulator just long enough for it to build its StateMachine, then
+#   writes state_machine.to_dot(), leaving out the transitions to bad_event (the pairs that
+#   should never happen).  StateDiagram.dot at the top of the repository is made with this, so
+#   re-run it whenever TRANSITIONS changes.  To render it, with Graphviz installed:
+#     dot -Tpng -o StateDiagram.png StateDiagram.dot
+#
+# Run on the host from the top of the repository:
+#     python tools/state_diagram.py [-o StateDiagram.dot] [--firmware F] [--self-loops]
+
+import os, sys, argparse
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DOT_FILE = os.path.join(ROOT_DIR, "StateDiagram.dot")
+
+def to_dot(firmware=None, self_loops=False):
+    """Return the DOT graph of the firmware's state_machine."""
+    sys.path.insert(0, ROOT_DIR)
+    import sim
+    sim.install(sim.Simulation())
+    from sim import hydrohomie
+
+    hh = hydrohomie.HydroHomieSim(firmware=firmware or hydrohomie.FIRMWARE)
+    hh.run(100)                         # booted, and into the loop
+    g = hh.globals
+    return g["state_machine"].to_dot("HydroHomie", self_loops=self_loops, error_handler=g.get("bad_event"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the firmware's state diagram as Graphviz DOT")
+    parser.add_argument("-o", "--output", default=DOT_FILE, help="where to write it, - for stdout")
+    parser.add_argument("--firmware", help="firmware to take TRANSITIONS from")
+    parser.add_argument("--self-loops", action="store_true",
+                        help="also draw events that are ignored (no handler, same state)")
+    args = parser.parse_args()
+    dot = to_dot(args.firmware, args.self_loops)
+    if args.output == "-":
+        sys.stdout.write(dot)
+    else:
+        with open(args.output, "w", newline="") as f:
+            f.write(dot)
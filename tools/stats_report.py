@@ -0,0 +1,84 @@
+# stats_report.py -- rank where the Eventer's loop time goes, from Eventer.stats()
+#
+# Reads the stats of a run on the Pico, saved with
+#     import json; json.dump(eventer.stats(), open("stats.json", "w"))
+#   or, with no file given, runs a simulated 16oz dispense with stats enabled and reports on
+#   that.  Polls and handlers are ranked together by the total time they took, and queue
+#   residency by event, by its worst case.  Percentiles are the upper bounds of the
+#   histogram buckets they fall in.
+#
+# Run on the host from the top of the repository:
+#     python tools/stats_report.py [stats.json] [--json]
+
+import os, sys, json
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def percentile(h, q):
+    """Upper bound (us) of the bucket holding the q'th (0..1) quantile of histogram dict h."""
+    if h["count"] == 0:
+        return 0
+    want = q * h["count"]
+    seen = 0
+    for (i, n) in enumerate(h["buckets"]):
+        seen += n
+        if seen >= want:
+            return 0 if i == 0 else min((1 << i) - 1, h["max_us"])
+    return h["max_us"]
+
+def simulate():
+    """Return the stats of a simulated 16oz dispense."""
+    sys.path.insert(0, ROOT_DIR)
+    import sim
+    sim.install(sim.Simulation())
+    import eventer as eventer_module
+    from sim import hydrohomie
+
+    loop = eventer_module.Eventer.loop
+    def loop_with_stats(self, process_func, state):
+        self.stats_enable()
+        return loop(self, process_func, state)
+    eventer_module.Eventer.loop = loop_with_stats
+    try:
+        hh = hydrohomie.fill("16D", vessel_at_ms=6000, remove_at_ms=30000)
+    finally:
+        eventer_module.Eventer.loop = loop
+    return hh.eventer.stats()
+
+def rows(stats):
+    """Return [(kind, name, histogram)] for every poll and handler, biggest total first."""
+    r = [("poll", name, h) for (name, h) in stats["polls"].items()] + \
+        [("handler", name, h) for (name, h) in stats["handlers"].items()]
+    return sorted(r, key=lambda row: row[2]["total_us"], reverse=True)
+
+def report(stats, out=sys.stdout):
+    ranked = rows(stats)
+    grand = sum(h["total_us"] for (_, _, h) in ranked) or 1
+    out.write("hot spots, by total time\n")
+    out.write("  kind     name                                         calls     total us      %   mean us  p50 us  p99 us   max us\n")
+    for (kind, name, h) in ranked:
+        n = h["count"]
+        out.write("  %-7s  %-42s %7d  %11d  %5.1f  %8.1f  %6d  %6d  %7d\n" %
+                  (kind, name, n, h["total_us"], 100.0 * h["total_us"] / grand,
+                   h["total_us"] / n if n else 0.0, percentile(h, 0.5), percentile(h, 0.99), h["max_us"]))
+
+    out.write("\nqueue residency, by worst case\n")
+    out.write("  event                         events   mean us  p50 us  p99 us   max us\n")
+    for (name, h) in sorted(stats["residency"].items(), key=lambda item: item[1]["max_us"], reverse=True):
+        n = h["count"]
+        out.write("  %-28s %7d  %8.1f  %6d  %6d  %7d\n" % (name, n, h["total_us"] / n if n else 0.0,
+                  percentile(h, 0.5), percentile(h, 0.99), h["max_us"]))
+
+    out.write("\nqueue: %s\nloop:  %s\n" % (stats["queue"], stats["loop"]))
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if args:
+        with open(args[0]) as f:
+            stats = json.load(f)
+    else:
+        stats = simulate()
+    if "--json" in sys.argv:
+        json.dump(stats, sys.stdout, indent=1)
+    else:
+        report(stats)
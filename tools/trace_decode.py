@@ -0,0 +1,166 @@
+# trace_decode.py -- turn TraceRecorder dumps into text, CSV or Chrome trace JSON
+#
+# The state and event names are taken from the STATE_STR and EVENT_STR dicts in the
+#   firmware, which is read (not run) to find them and the const()s they're keyed by.
+#   Timestamps are unwrapped across ticks_ms() wraparound and made relative to the first
+#   record.  The Chrome format opens in chrome://tracing or https://ui.perfetto.dev, with
+#   each handler as a slice on one track and the time spent in each state on another.
+#
+# Run on the host from the top of the repository:
+#     python tools/trace_decode.py trace.bin [--format text|csv|chrome] [--firmware F] [-o out]
+
+import os, sys, ast, csv, json, struct, argparse
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_DIR, "lib"))
+
+from tracer import CHUNK_MAGIC, CHUNK_VERSION, CHUNK_FMT, CHUNK_SIZE, RECORD_FMT, RECORD_SIZE, \
+                   DATA_NONE, DATA_INT, DATA_CHAR
+
+FIRMWARE     = os.path.join(ROOT_DIR, "HydroHomie_106Project_V1.2.3.py")
+TICKS_PERIOD = 1 << 30              # MicroPython's ticks_ms() wraps at 2**30
+
+def load_names(firmware=FIRMWARE):
+    """Return (STATE_STR, EVENT_STR) from the firmware source, either of them {} if not found."""
+    with open(firmware) as f:
+        tree = ast.parse(f.read(), firmware)
+    consts = {}
+    names  = {}
+    for node in tree.body:
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1 and
+                isinstance(node.targets[0], ast.Name)):
+            continue
+        target = node.targets[0].id
+        value  = node.value
+        if isinstance(value, ast.Call) and getattr(value.func, "id", None) == "const" and \
+           isinstance(value.args[0], ast.Constant):
+            consts[target] = value.args[0].value
+        elif target in ("STATE_STR", "EVENT_STR") and isinstance(value, ast.Dict):
+            d = {}
+            for (k, v) in zip(value.keys, value.values):
+                key = consts.get(k.id) if isinstance(k, ast.Name) else getattr(k, "value", None)
+                if key is not None and isinstance(v, ast.Constant):
+                    d[key] = v.value
+            names[target] = d
+    return (names.get("STATE_STR", {}), names.get("EVENT_STR", {}))
+
+def read_records(data):
+    """
+    Parse a dump into a list of dicts, one per record, in order.  Records missing between
+    chunks (overwritten before they were written out) are reported as a "lost" count on
+    the record that follows them.
+    """
+    records = []
+    expect  = None
+    off     = 0
+    while off + CHUNK_SIZE <= len(data):
+        (magic, version, rec_size, first, n) = struct.unpack_from(CHUNK_FMT, data, off)
+        if magic != CHUNK_MAGIC or version != CHUNK_VERSION or rec_size != RECORD_SIZE:
+            raise ValueError("not a trace chunk at offset %d" % off)
+        off += CHUNK_SIZE
+        if off + n * RECORD_SIZE > len(data):
+            n = (len(data) - off) // RECORD_SIZE      # truncated, e.g. copied mid-write
+        for i in range(n):
+            (ms, us, d, state, state_new, event, flags) = struct.unpack_from(RECORD_FMT, data, off)
+            off += RECORD_SIZE
+            seq = first + i
+            if expect is not None and seq < expect:
+                continue                            # a dump overlapping an earlier one
+            if flags == DATA_NONE:
+                value = None
+            elif flags == DATA_INT:
+                value = d
+            elif flags == DATA_CHAR:
+                value = chr(d)
+            else:
+                value = "..."
+            records.append({ "seq": seq, "ticks_ms": ms, "handler_us": us, "data": value,
+                             "state": state, "state_new": state_new, "event": event,
+                             "lost": 0 if expect is None else seq - expect })
+            expect = seq + 1
+    return records
+
+def unwrap(records):
+    """Add each record's msecs since the first one ("ms"), across ticks_ms() wraparound."""
+    ms = 0
+    prev = None
+    for r in records:
+        if prev is not None:
+            d = (r["ticks_ms"] - prev) % TICKS_PERIOD
+            if d >= TICKS_PERIOD // 2:
+                d -= TICKS_PERIOD                   # queued before the previous one was
+            ms += d
+        prev = r["ticks_ms"]
+        r["ms"] = ms
+    return records
+
+def _name(names, value):
+    return names.get(value, str(value))
+
+def to_text(records, state_str, event_str, out):
+    for r in records:
+        if r["lost"]:
+            out.write("... %d records lost ...\n" % r["lost"])
+        data = "" if r["data"] is None else ":" + str(r["data"])
+        out.write("%10d  %-22s %s%s -> %s  (%d us)\n" % (r["ms"], _name(state_str, r["state"]),
+                  _name(event_str, r["event"]), data, _name(state_str, r["state_new"]), r["handler_us"]))
+
+def to_csv(records, state_str, event_str, out):
+    w = csv.writer(out)
+    w.writerow(("seq", "ms", "ticks_ms", "state", "event", "data", "state_new", "handler_us", "lost"))
+    for r in records:
+        w.writerow((r["seq"], r["ms"], r["ticks_ms"], _name(state_str, r["state"]),
+                    _name(event_str, r["event"]), "" if r["data"] is None else r["data"],
+                    _name(state_str, r["state_new"]), r["handler_us"], r["lost"]))
+
+def to_chrome(records, state_str, event_str, out):
+    # NB: records only have the time each event was queued, so handlers are drawn starting
+    #     then, rather than when they were dispatched
+    events = [{ "name": "process_name", "ph": "M", "pid": 1, "args": { "name": "eventer" } },
+              { "name": "thread_name", "ph": "M", "pid": 1, "tid": 1, "args": { "name": "handlers" } },
+              { "name": "thread_name", "ph": "M", "pid": 1, "tid": 2, "args": { "name": "state" } }]
+    state = state_start = None
+    for r in records:
+        ts = r["ms"] * 1000
+        events.append({ "name": _name(event_str, r["event"]), "ph": "X", "pid": 1, "tid": 1,
+                        "ts": ts, "dur": r["handler_us"],
+                        "args": { "state": _name(state_str, r["state"]), "data": r["data"],
+                                  "state_new": _name(state_str, r["state_new"]), "seq": r["seq"] } })
+        if r["state"] != state:
+            state = r["state"]
+            state_start = ts
+        if r["state_new"] != state:
+            end = ts + r["handler_us"]
+            events.append({ "name": _name(state_str, state), "ph": "X", "pid": 1, "tid": 2,
+                            "ts": state_start, "dur": end - state_start })
+            state = r["state_new"]
+            state_start = end
+    if records and state is not None:
+        last = records[-1]
+        end = last["ms"] * 1000 + last["handler_us"]
+        events.append({ "name": _name(state_str, state), "ph": "X", "pid": 1, "tid": 2,
+                        "ts": state_start, "dur": max(end - state_start, 1) })
+    json.dump({ "traceEvents": events, "displayTimeUnit": "ms" }, out, indent=0)
+
+FORMATS = { "text": to_text, "csv": to_csv, "chrome": to_chrome }
+
+def decode(data, fmt="text", firmware=FIRMWARE, out=sys.stdout):
+    (state_str, event_str) = load_names(firmware)
+    records = unwrap(read_records(data))
+    FORMATS[fmt](records, state_str, event_str, out)
+    return records
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode a TraceRecorder dump")
+    parser.add_argument("dump")
+    parser.add_argument("--format", choices=tuple(FORMATS), default="text")
+    parser.add_argument("--firmware", default=FIRMWARE, help="where to find STATE_STR/EVENT_STR")
+    parser.add_argument("-o", "--output", help="write here instead of to stdout")
+    args = parser.parse_args()
+    with open(args.dump, "rb") as f:
+        data = f.read()
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            decode(data, args.format, args.firmware, out)
+    else:
+        decode(data, args.format, args.firmware)